@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Lab 04 - TCP 에코 서버 벤치마크 (thread / selector / asyncio)
+
+tcp_server.py를 모드별로 띄우고, 연결 N개(1 / 100 / 10,000)가 동시에
+"한 줄 보내고 에코 받기"를 duration초 동안 반복한다.
+부하기는 asyncio 프로세스 하나 — 세 모드를 같은 클라이언트로 비교한다.
+
+실행:
+    python3 tcp_benchmark.py
+    python3 tcp_benchmark.py --connections 1 100 --duration 5 --modes selector asyncio
+"""
+
+import argparse
+import asyncio
+import os
+import resource
+import socket
+import subprocess
+import sys
+import time
+
+HOST = 'localhost'
+SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tcp_server.py")
+
+
+def raise_fd_limit():
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    target = 65536 if hard == resource.RLIM_INFINITY else hard
+    if soft != resource.RLIM_INFINITY and soft < target:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+
+
+def start_server(mode: str, port: int) -> subprocess.Popen:
+    """서버를 자식 프로세스로 띄우고 포트가 열릴 때까지 기다린다 (로그는 버림)"""
+    proc = subprocess.Popen([sys.executable, SERVER, "--mode", mode, "--port", str(port)],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection((HOST, port), timeout=0.2).close()
+            return proc
+        except OSError:
+            time.sleep(0.05)
+    proc.kill()
+    raise RuntimeError(f"{mode} 서버가 {port}에서 열리지 않음")
+
+
+def percentile(sorted_values: list[float], p: float) -> float:
+    if not sorted_values:
+        return float("nan")
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p))]
+
+
+async def run_load(port: int, connections: int, duration: float, connect_timeout: float) -> dict:
+    # ── 연결 단계: 동시 connect 수를 제한하고 전체 시간 안에 못 붙은 연결은 실패로 센다
+    gate = asyncio.Semaphore(500)
+
+    async def connect():
+        async with gate:
+            return await asyncio.open_connection(HOST, port)
+
+    start = time.monotonic()
+    tasks = [asyncio.create_task(connect()) for _ in range(connections)]
+    done, pending = await asyncio.wait(tasks, timeout=connect_timeout)
+    for t in pending:
+        t.cancel()
+    streams = [t.result() for t in done if not t.cancelled() and t.exception() is None]
+    connect_time = time.monotonic() - start
+
+    # ── 왕복 단계: 연결마다 보내고 → 에코를 받을 때까지 기다리기를 반복
+    latencies: list[float] = []
+    errors = 0
+    deadline = time.monotonic() + duration
+
+    async def pinger(i: int, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        nonlocal errors
+        line = f"ping {i}\n".encode()
+        expected = b"[ECHO] " + line
+        while time.monotonic() < deadline:
+            sent = time.perf_counter()
+            writer.write(line)
+            try:
+                reply = await asyncio.wait_for(reader.readline(), deadline - time.monotonic() + 5)
+            except (asyncio.TimeoutError, ConnectionError):
+                errors += 1
+                return
+            if reply != expected:
+                errors += 1
+                return
+            latencies.append(time.perf_counter() - sent)
+
+    start = time.monotonic()
+    await asyncio.gather(*(pinger(i, r, w) for i, (r, w) in enumerate(streams)))
+    elapsed = time.monotonic() - start
+    for _, w in streams:
+        w.close()
+
+    latencies.sort()
+    return {
+        "connected": len(streams), "connect_time": connect_time, "errors": errors,
+        "rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50": percentile(latencies, 0.50), "p99": percentile(latencies, 0.99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lab 04 - TCP 에코 서버 벤치마크")
+    parser.add_argument("--modes", nargs="+", default=["thread", "selector", "asyncio"],
+                        choices=["thread", "selector", "asyncio"])
+    parser.add_argument("--connections", type=int, nargs="+", default=[1, 100, 10_000])
+    parser.add_argument("--duration", type=float, default=3.0, help="연결 수마다 왕복 측정 시간(초)")
+    parser.add_argument("--connect-timeout", type=float, default=15.0,
+                        help="이 시간 안에 연결되지 않으면 실패로 센다")
+    parser.add_argument("--port", type=int, default=19001)
+    args = parser.parse_args()
+    raise_fd_limit()
+
+    print(f"\n[TCP 에코 벤치마크] 왕복 {args.duration:.0f}초, 연결 시도 제한 {args.connect_timeout:.0f}초")
+    print(f"  {'모드':<10}{'연결':>8}{'성공':>8}{'연결 시간':>10}{'왕복/초':>12}"
+          f"{'p50':>10}{'p99':>10}{'오류':>6}")
+    for mode in args.modes:
+        for n in args.connections:
+            port = args.port
+            args.port += 1          # 이전 서버의 TIME_WAIT/종료와 겹치지 않게 포트를 바꾼다
+            proc = start_server(mode, port)
+            try:
+                r = asyncio.run(run_load(port, n, args.duration, args.connect_timeout))
+            finally:
+                proc.kill()
+                proc.wait()
+            print(f"  {mode:<10}{n:>8,}{r['connected']:>8,}{r['connect_time']:>9.2f}s"
+                  f"{r['rps']:>12,.0f}{r['p50'] * 1000:>8.2f}ms{r['p99'] * 1000:>8.2f}ms"
+                  f"{r['errors']:>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,7 +3,9 @@
 Lab 04 - TCP 에코 서버
 
 실행:
-    python3 tcp_server.py
+    python3 tcp_server.py                    # 연결마다 스레드 하나
+    python3 tcp_server.py --mode selector    # 스레드 하나 + selectors(epoll) 이벤트 루프
+    python3 tcp_server.py --mode asyncio     # asyncio.Protocol (uvloop이 있으면 사용)
 
 포트: 9001 (TCP)
 
@@ -11,8 +13,12 @@ Lab 04 - TCP 에코 서버
   - accept() 루프로 여러 클라이언트 순차 처리
   - TCP 소켓 생명주기 (bind → listen → accept → recv/send → close)
   - SO_REUSEADDR 옵션 (TIME_WAIT 중에도 포트 재사용)
+  - 논블로킹 소켓 + 멀티플렉싱으로 연결 1만 개 처리 (C10K), 쓰기 배압
 """
 
+import argparse
+import asyncio
+import selectors
 import socket
 import threading
 import time
@@ -49,7 +55,247 @@ def handle_client(conn: socket.socket, addr: tuple):
         print(f"  [{addr[0]}:{addr[1]}] 소켓 닫힘 → TIME_WAIT 상태로 전환")
 
 
+# ── 멀티플렉싱 서버 (--mode selector) ─────────────────────
+#
+# 스레드 방식은 연결마다 스레드 하나 — 스택(가상 메모리 8MB) + 컨텍스트 스위칭 때문에
+# 수천 개부터 스레드 생성이 실패하거나 느려진다. 논블로킹 소켓을 selectors(Linux는 epoll)에
+# 등록해 두면 스레드 하나가 "지금 읽기/쓰기 가능한" 소켓만 받아 처리한다.
+#
+# 응답은 연결별 출력 버퍼에 쌓고 send()가 받아 준 만큼만 뺀다 (나머지는 EVENT_WRITE로 나중에).
+# 상대가 읽지 않아 버퍼가 HIGH_WATER를 넘으면 그 연결의 읽기를 멈춘다 (쓰기 배압) —
+# 안 그러면 에코할 데이터가 서버 메모리에 끝없이 쌓인다. LOW_WATER 아래로 빠지면 다시 읽는다.
+
+RECV_SIZE = 64 * 1024
+HIGH_WATER = 256 * 1024
+LOW_WATER = 64 * 1024
+
+
+def echo_lines(inbuf: bytearray) -> bytes:
+    """inbuf에서 완성된 줄을 꺼내 '[ECHO] 줄' 응답으로 (줄바꿈 없이 HIGH_WATER를 넘으면 그대로 에코)"""
+    end = inbuf.rfind(b"\n")
+    if end < 0:
+        if len(inbuf) < HIGH_WATER:
+            return b""
+        end = len(inbuf) - 1
+    lines = inbuf[:end + 1]
+    del inbuf[:end + 1]
+    return b"".join(b"[ECHO] " + line.strip() + b"\n" for line in lines.splitlines())
+
+
+class EchoStats:
+    """이벤트 루프 서버 공통 통계. 연결마다 로그를 찍으면 1만 개에서 출력이 병목 → 요약 한 줄"""
+
+    def __init__(self):
+        self.connections = 0
+        self.peak = 0
+        self.accepted = 0
+        self.bytes_in = 0
+        self.paused = 0             # 배압으로 읽기를 멈춘 횟수
+        self._reported = None
+
+    def opened(self):
+        self.connections += 1
+        self.accepted += 1
+        self.peak = max(self.peak, self.connections)
+
+    def report(self):
+        """지난 보고 이후 바뀐 게 있으면 한 줄 출력"""
+        summary = (self.connections, self.peak, self.accepted, self.bytes_in, self.paused)
+        if summary != self._reported:
+            self._reported = summary
+            print(f"  [{datetime.now().strftime('%H:%M:%S')}] 연결 {self.connections:,}개 "
+                  f"(최대 {self.peak:,}, 누적 {self.accepted:,}), "
+                  f"수신 {self.bytes_in:,} bytes, 읽기 중단 {self.paused}회")
+
+
+class EchoConnection:
+    """연결 하나의 상태: 줄 단위로 모으는 입력 버퍼 + 아직 못 보낸 출력 버퍼"""
+    __slots__ = ("sock", "addr", "inbuf", "outbuf", "closing", "events")
+
+    def __init__(self, sock: socket.socket, addr: tuple):
+        self.sock = sock
+        self.addr = addr
+        self.inbuf = bytearray()
+        self.outbuf = bytearray()
+        self.closing = False        # FIN 받음 → 남은 출력만 보내고 닫는다
+        self.events = selectors.EVENT_READ
+
+
+class SelectorEchoServer:
+    """스레드 하나로 모든 연결을 처리하는 에코 서버"""
+
+    def __init__(self, server_sock: socket.socket):
+        self.server_sock = server_sock
+        self.sel = selectors.DefaultSelector()
+        self.stats = EchoStats()
+
+    def serve_forever(self):
+        self.server_sock.setblocking(False)
+        self.sel.register(self.server_sock, selectors.EVENT_READ, None)
+        print(f"[selector] {type(self.sel).__name__} 이벤트 루프 시작 (스레드 1개)")
+        last_report = time.monotonic()
+        while True:
+            for key, mask in self.sel.select(timeout=1.0):
+                if key.data is None:
+                    self._accept()
+                else:
+                    self._service(key.data, mask)
+            now = time.monotonic()
+            if now - last_report >= 1.0:
+                last_report = now
+                self.stats.report()
+
+    def _accept(self):
+        # 한 번 깨어날 때 backlog에 쌓인 연결을 모두 받는다
+        while True:
+            try:
+                conn, addr = self.server_sock.accept()
+            except BlockingIOError:
+                return
+            except OSError as e:        # EMFILE 등 — 이번 이벤트는 건너뛰고 계속 서비스
+                print(f"  accept 실패: {e}")
+                return
+            conn.setblocking(False)
+            self.sel.register(conn, selectors.EVENT_READ, EchoConnection(conn, addr))
+            self.stats.opened()
+
+    def _service(self, c: EchoConnection, mask: int):
+        try:
+            if mask & selectors.EVENT_READ:
+                data = c.sock.recv(RECV_SIZE)
+                if not data:
+                    c.closing = True            # FIN → 남은 응답을 보낸 뒤 닫기
+                else:
+                    self.stats.bytes_in += len(data)
+                    c.inbuf += data
+                    c.outbuf += echo_lines(c.inbuf)
+            if c.outbuf:
+                # 바로 보내 본다 (대부분 한 번에 나가서 EVENT_WRITE 등록이 필요 없다)
+                sent = c.sock.send(c.outbuf)
+                del c.outbuf[:sent]
+        except BlockingIOError:
+            pass
+        except OSError:         # RST, EPIPE, ETIMEDOUT, ECONNABORTED … — 이 연결만 닫는다
+            self._close(c)
+            return
+        if c.closing and not c.outbuf:
+            self._close(c)
+            return
+        self._update_interest(c)
+
+    def _update_interest(self, c: EchoConnection):
+        events = 0
+        if not c.closing:
+            reading = c.events & selectors.EVENT_READ
+            pending = len(c.outbuf)
+            if pending < LOW_WATER or (reading and pending < HIGH_WATER):
+                events |= selectors.EVENT_READ
+            elif reading:
+                self.stats.paused += 1
+        if c.outbuf:
+            events |= selectors.EVENT_WRITE
+        if events != c.events:
+            c.events = events
+            self.sel.modify(c.sock, events, c)
+
+    def _close(self, c: EchoConnection):
+        self.sel.unregister(c.sock)
+        c.sock.close()
+        self.stats.connections -= 1
+
+
+# ── asyncio Protocol 서버 (--mode asyncio) ────────────────
+#
+# selector 모드의 루프를 asyncio 이벤트 루프가 대신 돌린다. StreamReader/Writer는 읽을 때마다
+# 코루틴 전환과 버퍼 복사가 붙지만, Protocol은 루프가 data_received()를 콜백으로 바로 부른다.
+# transport.write()는 못 보낸 만큼 transport 버퍼에 쌓고, 버퍼가 high water를 넘으면
+# pause_writing(), low water 아래로 빠지면 resume_writing()을 부른다 → 그동안 읽기를 멈춘다.
+# uvloop(libuv 기반 루프)이 설치돼 있으면 그 위에서 돈다 (--no-uvloop로 끔).
+
+class EchoProtocol(asyncio.Protocol):
+    """연결 하나 = Protocol 인스턴스 하나"""
+
+    def __init__(self, stats: EchoStats):
+        self.stats = stats
+        self.inbuf = bytearray()
+        self.transport: asyncio.Transport | None = None
+
+    def connection_made(self, transport: asyncio.Transport):
+        self.transport = transport
+        transport.set_write_buffer_limits(high=HIGH_WATER, low=LOW_WATER)
+        self.stats.opened()
+
+    def data_received(self, data: bytes):
+        self.stats.bytes_in += len(data)
+        self.inbuf += data
+        out = echo_lines(self.inbuf)
+        if out:
+            self.transport.write(out)
+
+    def eof_received(self):
+        return False        # FIN → 남은 출력을 보낸 뒤 transport가 닫는다
+
+    def pause_writing(self):
+        self.stats.paused += 1
+        self.transport.pause_reading()
+
+    def resume_writing(self):
+        self.transport.resume_reading()
+
+    def connection_lost(self, exc: Exception | None):
+        self.stats.connections -= 1
+
+
+async def serve_asyncio(server_sock: socket.socket):
+    loop = asyncio.get_running_loop()
+    stats = EchoStats()
+    # create_server(sock=)는 listen()을 다시 부르므로 backlog를 여기서도 넘긴다
+    server = await loop.create_server(lambda: EchoProtocol(stats), sock=server_sock,
+                                      backlog=socket.SOMAXCONN)
+    print(f"[asyncio] {type(loop).__module__}.{type(loop).__name__} 이벤트 루프 시작 (스레드 1개)")
+    async with server:
+        while True:
+            await asyncio.sleep(1.0)
+            stats.report()
+
+
+def event_loop_factory(use_uvloop: bool):
+    """uvloop이 있으면 그 루프, 없으면 None (asyncio 기본 루프)"""
+    if not use_uvloop:
+        return None
+    try:
+        import uvloop
+    except ImportError:
+        return None
+    return uvloop.new_event_loop
+
+
+def raise_fd_limit():
+    """연결 1만 개 = 소켓 fd 1만 개. soft limit(보통 1024)을 hard limit까지 올린다"""
+    try:
+        import resource
+    except ImportError:   # Windows
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    target = 65536 if hard == resource.RLIM_INFINITY else hard
+    if soft != resource.RLIM_INFINITY and soft < target:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+        except (ValueError, OSError):
+            pass
+
+
 def main():
+    parser = argparse.ArgumentParser(description="Lab 04 - TCP 에코 서버")
+    parser.add_argument("--mode", choices=["thread", "selector", "asyncio"], default="thread",
+                        help="thread: 연결마다 스레드, selector: 스레드 하나 + epoll 이벤트 루프, "
+                             "asyncio: asyncio.Protocol")
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--no-uvloop", action="store_true",
+                        help="asyncio 모드에서 uvloop이 설치돼 있어도 기본 루프 사용")
+    args = parser.parse_args()
+    port = args.port
+
     # 소켓 생성
     server_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
 
@@ -59,31 +305,53 @@ def main():
     print(f"SO_REUSEADDR 설정 완료 (TIME_WAIT 중 포트 재사용 허용)")
 
     # 포트 바인딩
-    server_sock.bind((HOST, PORT))
-    print(f"bind: {HOST}:{PORT}")
+    server_sock.bind((HOST, port))
+    print(f"bind: {HOST}:{port}")
 
-    # 리슨 큐 설정 (backlog=5)
-    server_sock.listen(5)
-    print(f"listen: backlog=5 (대기 연결 최대 5개)")
+    if args.mode == "thread":
+        # 리슨 큐 설정 (backlog=5)
+        server_sock.listen(5)
+        print(f"listen: backlog=5 (대기 연결 최대 5개)")
+    else:
+        # 연결이 한꺼번에 몰려오므로 커널 최대치까지 (net.core.somaxconn)
+        raise_fd_limit()
+        server_sock.listen(socket.SOMAXCONN)
+        print(f"listen: backlog={socket.SOMAXCONN} (somaxconn까지)")
 
     print(f"""
 ╔═════════════════════════════════════════╗
 ║         TCP 에코 서버 시작              ║
 ╠═════════════════════════════════════════╣
-║  주소: {HOST}:{PORT}                       ║
+║  주소: {HOST}:{port}                       ║
+║  모드: {args.mode:<33}║
 ║                                         ║
 ║  테스트:                                ║
 ║    python3 tcp_client.py                ║
-║    nc localhost {PORT}                    ║
-║    telnet localhost {PORT}                ║
+║    nc localhost {port}                    ║
+║    telnet localhost {port}                ║
 ║                                         ║
 ║  소켓 상태 확인 (별도 터미널):           ║
-║    ss -tnp | grep {PORT}                  ║
+║    ss -tnp | grep {port}                  ║
 ║                                         ║
 ║  종료: Ctrl+C                           ║
 ╚═════════════════════════════════════════╝
 """)
 
+    if args.mode != "thread":
+        try:
+            if args.mode == "selector":
+                SelectorEchoServer(server_sock).serve_forever()
+            else:
+                loop_factory = event_loop_factory(not args.no_uvloop)
+                with asyncio.Runner(loop_factory=loop_factory) as runner:
+                    runner.run(serve_asyncio(server_sock))
+        except KeyboardInterrupt:
+            print("\n\n서버 종료 중...")
+        finally:
+            server_sock.close()
+            print("서버 소켓 닫힘")
+        return
+
     try:
         while True:
             # 연결 수락 (블로킹)
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Lab 09 - Circuit Breaker 벤치마크
+
+window:   슬라이딩 윈도우 기록/실패율 비용 (윈도우 10 / 100 / 10,000개)
+          예전 방식(list.append + pop(0), 실패율은 매번 다시 합산)과 비교
+overhead: CLOSED 상태에서 call()/acall()이 직접 호출보다 더 쓰는 시간 (ns/호출)
+
+실행:
+    python3 cb_benchmark.py window
+    python3 cb_benchmark.py window --sizes 10 10000 --calls 200000
+    python3 cb_benchmark.py overhead
+"""
+
+import argparse
+import asyncio
+import random
+import time
+
+from circuit_breaker import CircuitBreaker, CountWindow, SUCCESS
+
+
+# ── 예전 방식 (비교 기준) ─────────────────────────────────
+
+class LegacyWindow:
+    """예전 CircuitBreaker._results: 리스트 끝에 추가하고 넘치면 맨 앞을 pop(0)"""
+
+    def __init__(self, size: int):
+        self.size = size
+        self._results: list[bool] = []     # True = 성공
+
+    def record(self, failed: bool, slow: bool = False):
+        self._results.append(not failed)
+        if len(self._results) > self.size:
+            self._results.pop(0)
+
+    def failure_rate(self) -> float:
+        if not self._results:
+            return 0.0
+        return sum(1 for r in self._results if not r) / len(self._results)
+
+
+# ── 윈도우 벤치마크 ───────────────────────────────────────
+
+def measure_window(window, outcomes: list[bool], calls: int) -> float:
+    """호출마다 기록 + 실패율 조회 (트립 판단과 같은 패턴), 초당 호출 수"""
+    n = len(outcomes)
+    start = time.perf_counter()
+    for i in range(calls):
+        window.record(outcomes[i % n])
+        window.failure_rate()
+    return calls / (time.perf_counter() - start)
+
+
+def measure_call(window, outcomes: list[bool], calls: int) -> float:
+    """CircuitBreaker.call 전체 (OPEN으로 넘어가지 않게 임계값은 충분히 크게)"""
+    cb = CircuitBreaker(failure_threshold=calls + 1, window_size=window.size)
+    cb._window = window
+    n = len(outcomes)
+    it = iter(range(calls))
+
+    def service():
+        if outcomes[next(it) % n]:
+            raise ValueError("fail")
+
+    start = time.perf_counter()
+    for _ in range(calls):
+        try:
+            cb.call(service)
+        except ValueError:
+            pass
+    return calls / (time.perf_counter() - start)
+
+
+def bench_window(sizes: list[int], calls: int, failure_ratio: float):
+    outcomes = [random.random() < failure_ratio for _ in range(4096)]
+    print(f"\n[슬라이딩 윈도우] 호출 {calls:,}회, 실패율 {failure_ratio * 100:.0f}%")
+    print(f"  {'윈도우':>8}  {'측정':<22}{'예전 (calls/s)':>16}{'현재 (calls/s)':>16}{'배율':>9}")
+    for size in sizes:
+        # 윈도우를 먼저 가득 채워 둔다 (pop(0) 비용은 가득 찬 뒤부터 드러남)
+        for label, measure in [("기록 + 실패율", measure_window),
+                               ("CircuitBreaker.call", measure_call)]:
+            windows = []
+            for cls in (LegacyWindow, CountWindow):
+                w = cls(size)
+                for i in range(size):
+                    w.record(outcomes[i % len(outcomes)])
+                windows.append(w)
+            # 예전 방식은 윈도우 크기에 비례해 느려지므로 호출 수를 줄여 측정 시간을 맞춘다
+            legacy_calls = max(1000, calls * 10 // max(size, 10))
+            before = measure(windows[0], outcomes, min(calls, legacy_calls))
+            now = measure(windows[1], outcomes, calls)
+            print(f"  {size:>8,}  {label:<22}{before:>16,.0f}{now:>16,.0f}{now / before:>8.1f}x")
+
+
+# ── CLOSED 오버헤드 ───────────────────────────────────────
+
+def ns_per_call(fn, calls: int, repeat: int = 5) -> float:
+    """fn(calls)를 repeat번 돌려 가장 빠른 회차의 호출당 ns"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        fn(calls)
+        best = min(best, (time.perf_counter_ns() - start) / calls)
+    return best
+
+
+def bench_overhead(calls: int):
+    def service():
+        return None
+
+    async def aservice():
+        return None
+
+    def direct(n):
+        for _ in range(n):
+            service()
+
+    def guarded(cb):
+        def run(n):
+            call = cb.call
+            for _ in range(n):
+                call(service)
+        return run
+
+    def adirect(n):
+        async def run():
+            for _ in range(n):
+                await aservice()
+        asyncio.run(run())
+
+    def aguarded(cb):
+        def run(n):
+            async def loop():
+                acall = cb.acall
+                for _ in range(n):
+                    await acall(aservice)
+            asyncio.run(loop())
+        return run
+
+    plain = CircuitBreaker(log=False)
+    listened = CircuitBreaker(log=False)
+    listened.subscribe(SUCCESS, lambda cb, duration: None)    # 빈 리스너 — 디스패치 비용만
+    windowed = CircuitBreaker(log=False, window_seconds=60, failure_rate_threshold=0.5,
+                              slow_call_duration=1.0, slow_rate_threshold=0.5)
+
+    base = ns_per_call(direct, calls)
+    abase = ns_per_call(adirect, calls)
+    print(f"\n[CLOSED 오버헤드] 호출 {calls:,}회 × 5번 중 최솟값")
+    print(f"  {'경로':<40}{'ns/호출':>10}{'오버헤드':>10}")
+    print(f"  {'직접 호출 service()':<40}{base:>10.0f}{'':>10}")
+    for label, cb in [("cb.call (기본, 개수 윈도우)", plain),
+                      ("cb.call + SUCCESS 리스너", listened),
+                      ("cb.call (시간 윈도우 + 비율/느린 호출)", windowed)]:
+        t = ns_per_call(guarded(cb), calls)
+        print(f"  {label:<40}{t:>10.0f}{t - base:>10.0f}")
+    print(f"  {'직접 await aservice()':<40}{abase:>10.0f}{'':>10}")
+    t = ns_per_call(aguarded(plain), calls)
+    print(f"  {'await cb.acall':<40}{t:>10.0f}{t - abase:>10.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lab 09 - Circuit Breaker 벤치마크")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("window", help="슬라이딩 윈도우 기록/실패율 비용")
+    p.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 10_000])
+    p.add_argument("--calls", type=int, default=200_000, help="윈도우 크기별 호출 수")
+    p.add_argument("--failure-ratio", type=float, default=0.3)
+
+    p = sub.add_parser("overhead", help="CLOSED 상태 call()/acall() 호출당 오버헤드")
+    p.add_argument("--calls", type=int, default=200_000)
+
+    args = parser.parse_args()
+    if args.command == "window":
+        bench_window(args.sizes, args.calls, args.failure_ratio)
+    elif args.command == "overhead":
+        bench_overhead(args.calls)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,9 @@
 Lab 09 - Circuit Breaker 패턴 구현 & 시뮬레이션
 
 상태: CLOSED → OPEN → HALF_OPEN → CLOSED
+거부된 호출: fallback / 마지막 정상 응답(TTL + LRU) / CircuitOpenError
+BreakerRegistry(shared=True): 워커 프로세스끼리 브레이커 상태 공유
+Bulkhead / AsyncBulkhead / ThreadPoolBulkhead: 의존성마다 동시 호출 수 제한
 
 실행:
     python3 circuit_breaker.py
@@ -10,7 +13,13 @@ Lab 09 - Circuit Breaker 패턴 구현 & 시뮬레이션
 
 import time
 import random
+import asyncio
+import inspect
+import functools
 import threading
+import multiprocessing
+import concurrent.futures
+from collections import OrderedDict
 from enum import Enum
 
 
@@ -20,99 +29,926 @@ class State(Enum):
     HALF_OPEN = "HALF_OPEN (시험)"
 
 
+# ── 슬라이딩 윈도우 ───────────────────────────────────────
+
+FAILED, SLOW = 1, 2     # 윈도우 칸에 기록하는 비트
+
+
+class CountWindow:
+    """최근 size개 호출 결과의 링 버퍼 — 기록/실패율 모두 O(1), 기록할 때 할당 없음
+
+    list.append + pop(0)은 매번 원소 전체를 당기고(O(size)) 실패율은 매번 다시 센다.
+    고정 크기 bytearray(FAILED | SLOW 비트)에 덮어쓰면서 실패/느린 호출 수를 누적해 두면
+    윈도우가 10,000개여도 비용이 같다.
+    """
+    __slots__ = ("size", "_buf", "_pos", "count", "failures", "slow")
+
+    def __init__(self, size: int):
+        if size < 1:
+            raise ValueError(f"window size must be >= 1 (got {size})")
+        self.size = size
+        self._buf = bytearray(size)
+        self._pos = 0
+        self.count = 0          # 채워진 칸 수 (≤ size)
+        self.failures = 0
+        self.slow = 0
+
+    def record(self, failed: bool, slow: bool = False):
+        i = self._pos
+        if self.count == self.size:
+            old = self._buf[i]                  # 밀려나는 가장 오래된 결과
+            self.failures -= old & FAILED
+            self.slow -= old >> 1
+        else:
+            self.count += 1
+        self._buf[i] = failed | slow << 1
+        self.failures += failed
+        self.slow += slow
+        self._pos = i + 1 if i + 1 < self.size else 0
+
+    def failure_rate(self) -> float:
+        return self.failures / self.count if self.count else 0.0
+
+    def slow_rate(self) -> float:
+        return self.slow / self.count if self.count else 0.0
+
+    def reset(self):
+        self._buf[:] = bytes(self.size)
+        self._pos = self.count = self.failures = self.slow = 0
+
+
+class TimeWindow:
+    """최근 seconds초 호출 결과 — buckets개 시간 칸(기본 60초 / 1초 칸)의 링
+
+    호출 수가 아니라 시간으로 자르므로 트래픽이 적을 때도 오래된 결과가 남지 않는다.
+    칸마다 (호출, 실패, 느린 호출) 수만 두고 합계를 누적해 두어 기록/조회 모두 O(1)
+    (오래 조용했다면 지나간 칸을 비우는 데 최대 buckets번).
+    """
+    __slots__ = ("seconds", "_width", "_calls", "_failures", "_slow",
+                 "_tick", "count", "failures", "slow", "clock")
+
+    def __init__(self, seconds: float = 60.0, buckets: int = 60, clock=time.monotonic):
+        if seconds <= 0 or buckets < 1:
+            raise ValueError(f"window needs seconds > 0 and buckets >= 1 "
+                             f"(got {seconds}, {buckets})")
+        self.seconds = seconds
+        self._width = seconds / buckets
+        self._calls = [0] * buckets
+        self._failures = [0] * buckets
+        self._slow = [0] * buckets
+        self.clock = clock
+        self._tick = int(clock() / self._width)    # 마지막으로 본 칸 번호
+        self.count = self.failures = self.slow = 0
+
+    def _advance(self):
+        """지금 시각까지 밀려난 칸을 비우고 합계에서 뺀다. 현재 칸 위치를 돌려준다"""
+        tick = int(self.clock() / self._width)
+        n = len(self._calls)
+        if tick != self._tick:
+            for t in range(max(self._tick + 1, tick - n + 1), tick + 1):
+                i = t % n
+                self.count -= self._calls[i]
+                self.failures -= self._failures[i]
+                self.slow -= self._slow[i]
+                self._calls[i] = self._failures[i] = self._slow[i] = 0
+            self._tick = tick
+        return tick % n
+
+    def record(self, failed: bool, slow: bool = False):
+        i = self._advance()
+        self._calls[i] += 1
+        self._failures[i] += failed
+        self._slow[i] += slow
+        self.count += 1
+        self.failures += failed
+        self.slow += slow
+
+    def failure_rate(self) -> float:
+        self._advance()
+        return self.failures / self.count if self.count else 0.0
+
+    def slow_rate(self) -> float:
+        self._advance()
+        return self.slow / self.count if self.count else 0.0
+
+    def reset(self):
+        n = len(self._calls)
+        self._calls[:] = self._failures[:] = self._slow[:] = [0] * n
+        self.count = self.failures = self.slow = 0
+
+
+# ── 이벤트 ───────────────────────────────────────────────
+#
+# 리스너는 항상 lock 밖에서, 호출한 스레드(또는 이벤트 루프)에서 바로 불린다 — 짧게 끝낼 것
+#   STATE_CHANGE  fn(cb, 이전 상태, 새 상태, 사유)
+#   SUCCESS       fn(cb, 걸린 시간(초) | None)
+#   FAILURE       fn(cb, 걸린 시간(초) | None)
+#   REJECTED      fn(cb, 거부할 때의 상태)
+
+STATE_CHANGE, SUCCESS, FAILURE, REJECTED = "state_change", "success", "failure", "rejected"
+EVENTS = (STATE_CHANGE, SUCCESS, FAILURE, REJECTED)
+
+
+def print_transition(cb: "CircuitBreaker", old: State, new: State, reason: str):
+    """기본 STATE_CHANGE 리스너 — 콘솔에 전환 한 줄"""
+    label = f"[CB {cb.name}]" if cb.name else "[CB]"
+    print(f"  {label} {old.name} → {new.name} {reason}")
+
+
+# ── 거부된 호출의 대안 (fallback / 마지막 정상 응답) ──────
+
+class CircuitOpenError(Exception):
+    """서킷이 호출을 거부함 (OPEN, 또는 HALF_OPEN 시험 자리 없음). retry_after초 뒤 다시 시도"""
+
+    def __init__(self, name: str, state: State, retry_after: float):
+        self.name = name
+        self.state = state
+        self.retry_after = retry_after
+        label = f"CircuitBreaker {name}" if name else "CircuitBreaker"
+        if state == State.HALF_OPEN:
+            super().__init__(f"{label} HALF_OPEN (시험 호출 대기 중)")
+        else:
+            super().__init__(f"{label} OPEN ({retry_after:.1f}초 후 재시도)")
+
+
+class LastKnownGood:
+    """호출 인자별 마지막 성공 결과 — TTL + LRU (최대 size개)
+
+    서킷이 열려 있는 동안 같은 인자로 온 호출에 예외 대신 ttl초 안쪽의 마지막 정상 응답을 준다.
+    인자가 해시 불가능하면 저장하지 않는다.
+    """
+
+    def __init__(self, size: int = 1024, ttl: float = 60.0, clock=time.monotonic):
+        self.size = size
+        self.ttl = ttl
+        self.clock = clock
+        self._entries: OrderedDict = OrderedDict()    # key → (저장 시각, 결과), 오른쪽이 최근
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(func, args: tuple, kwargs: dict):
+        """캐시 키. 위치/키워드 인자 중 하나라도 해시 불가능하면 None (저장도 조회도 안 함)"""
+        try:
+            key = (func, args, frozenset(kwargs.items())) if kwargs else (func, args)
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def put(self, key, value):
+        if key is None:
+            return
+        with self._lock:
+            self._entries[key] = (self.clock(), value)
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def get(self, key):
+        """(있음, 결과). ttl이 지난 항목은 지우고 없음으로"""
+        with self._lock:
+            entry = self._entries.get(key) if key is not None else None
+            if entry is None:
+                self.misses += 1
+                return False, None
+            stored, value = entry
+            if self.clock() - stored > self.ttl:
+                del self._entries[key]
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, value
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# ── Circuit Breaker ──────────────────────────────────────
+
 class CircuitBreaker:
-    """Circuit Breaker 구현"""
+    """Circuit Breaker 구현
+
+    함수를 감싸 부르려면 call(func, ...), 코루틴이면 await acall(func, ...), 데코레이터는 @cb.
+    호출을 직접 다루는 쪽(로드 밸런서)은 allow_request() → record_success()/record_failure().
+
+    CLOSED → OPEN 조건 (어느 하나라도)
+      - failure_threshold번 연속 실패
+      - 윈도우에 min_calls개 이상 쌓였고 실패율 ≥ failure_rate_threshold
+      - 윈도우에 min_calls개 이상 쌓였고 느린 호출 비율 ≥ slow_rate_threshold
+        (slow_call_duration초 이상 걸린 호출 — 실패 없이 느려지기만 하는 의존성도 끊는다)
+    윈도우는 window_seconds를 주면 시간 기준(TimeWindow), 아니면 최근 window_size개(CountWindow).
+
+    CLOSED에서 allow_request()는 lock 없이 상태만 보고 통과시킨다 (호출당 비용 대부분은
+    결과 기록의 lock 한 번). 전환 로그/통계 수집은 subscribe()한 리스너가 lock 밖에서 처리한다.
+
+    call()/acall()이 거부될 때: cache_size > 0이면 같은 인자의 마지막 정상 응답(cache_ttl초 이내),
+    없으면 fallback(*args, **kwargs)의 결과, 둘 다 없으면 CircuitOpenError.
+    """
 
     def __init__(self,
                  failure_threshold: int = 5,
                  success_threshold: int = 2,
                  timeout: float = 10.0,
-                 window_size: int = 10):
+                 window_size: int = 10,
+                 half_open_interval: float = 0.0,
+                 name: str = "",
+                 on_state_change=None,
+                 window_seconds: float | None = None,
+                 failure_rate_threshold: float | None = None,
+                 slow_call_duration: float | None = None,
+                 slow_rate_threshold: float | None = None,
+                 min_calls: int = 10,
+                 half_open_max_calls: int = 0,
+                 log: bool = True,
+                 clock=time.monotonic,
+                 ignore_exceptions: tuple = (),
+                 fallback=None,
+                 cache_size: int = 0,
+                 cache_ttl: float = 60.0):
         self.failure_threshold = failure_threshold   # 연속 실패 횟수
         self.success_threshold = success_threshold   # HALF_OPEN 성공 횟수
         self.timeout = timeout                       # OPEN → HALF_OPEN 대기 시간
         self.window_size = window_size               # 슬라이딩 윈도우 크기
+        self.half_open_interval = half_open_interval # HALF_OPEN 시험 호출 간격 (0 = 제한 없음)
+        self.half_open_max_calls = half_open_max_calls  # HALF_OPEN 동시 시험 호출 수 (0 = 제한 없음)
+        self.name = name
+        self.failure_rate_threshold = failure_rate_threshold  # 윈도우 실패율 (None = 안 봄)
+        self.slow_call_duration = slow_call_duration # 이 시간(초) 이상이면 느린 호출 (생성 시 고정)
+        self.slow_rate_threshold = slow_rate_threshold        # 윈도우 느린 호출 비율 (None = 안 봄)
+        self.min_calls = min_calls                   # 비율로 판단하기 전 최소 호출 수
+        self.clock = clock                           # 단조 시계 — 시스템 시각이 바뀌어도 timeout 유지
+        self.ignore_exceptions = ignore_exceptions   # 성공도 실패도 아닌 예외 (예: BulkheadFullError)
+        self.fallback = fallback                     # 거부된 호출 대신 부를 함수 (같은 인자)
+        self.cache = LastKnownGood(cache_size, cache_ttl, clock) if cache_size else None
+        self.fallbacks = 0                           # fallback으로 응답한 횟수
+
+        self._lock = threading.Lock()
+        self._window = self._new_window(window_size, window_seconds)
+        self._init_state()
+
+        # 이벤트 → 리스너 튜플 (copy-on-write — 부를 때 lock이 필요 없다)
+        self._listeners: dict[str, tuple] = {kind: () for kind in EVENTS}
+        self._timed = slow_call_duration is not None  # call()이 걸린 시간을 잴 필요가 있는가
+        if log:
+            self.subscribe(STATE_CHANGE, print_transition)
+        if on_state_change is not None:     # fn(이전 상태, 새 상태)
+            self.subscribe(STATE_CHANGE, lambda cb, old, new, reason: on_state_change(old, new))
+
+    def _new_window(self, window_size: int, window_seconds: float | None):
+        if window_seconds:
+            return TimeWindow(window_seconds, clock=self.clock)
+        return CountWindow(window_size)
 
+    def _init_state(self):
         self._state = State.CLOSED
         self._failures = 0
         self._successes = 0
-        self._open_time = 0
-        self._results: list[bool] = []
-        self._lock = threading.Lock()
-        self.stats = {"allowed": 0, "rejected": 0, "success": 0, "failure": 0}
+        self._trials = 0            # HALF_OPEN에서 진행 중인 시험 호출
+        self._open_time = 0.0
+        self._next_trial = 0.0
+        # 카운터: CLOSED의 allowed는 lock 없이 올린다 (스레드가 겹치면 드물게 빠질 수 있는 통계용 값)
+        self.allowed = self.rejected = self.succeeded = self.failed = 0
 
     @property
     def state(self) -> State:
         return self._state
 
+    @property
+    def stats(self) -> dict:
+        return {"allowed": self.allowed, "rejected": self.rejected,
+                "success": self.succeeded, "failure": self.failed}
+
+    # ── 리스너 ──
+
+    def subscribe(self, kind: str, fn):
+        if kind not in self._listeners:
+            raise ValueError(f"unknown event {kind!r} (expected one of {EVENTS})")
+        with self._lock:
+            self._listeners = {**self._listeners, kind: self._listeners[kind] + (fn,)}
+            if kind in (SUCCESS, FAILURE):
+                self._timed = True
+
+    def unsubscribe(self, kind: str, fn):
+        with self._lock:
+            self._listeners = {**self._listeners,
+                               kind: tuple(f for f in self._listeners[kind] if f != fn)}
+
+    def _emit(self, kind: str, *args):
+        for fn in self._listeners[kind]:
+            fn(self, *args)
+
+    # ── 상태 전환 ──
+
+    def _transition(self, new: State, reason: str):
+        """상태 전환 (lock 안에서). lock 밖에서 알릴 (이전, 새 상태, 사유)를 돌려준다"""
+        old, self._state = self._state, new
+        if new == State.OPEN:
+            self._open_time = self.clock()
+        elif new == State.HALF_OPEN:
+            self._successes = 0
+            self._trials = 0
+            self._next_trial = 0.0
+        else:
+            self._window.reset()        # 장애 전 결과로 곧바로 다시 열리지 않게
+        return old, new, reason
+
+    def _notify(self, change):
+        if change is not None:
+            self._emit(STATE_CHANGE, *change)
+
     def _failure_rate(self) -> float:
-        if not self._results:
-            return 0.0
-        return sum(1 for r in self._results if not r) / len(self._results)
+        return self._window.failure_rate()
+
+    def _rate_exceeded(self) -> str | None:
+        """윈도우 비율 임계값을 넘었으면 사유 문자열 (lock 안에서)"""
+        if self.failure_rate_threshold is None and self.slow_rate_threshold is None:
+            return None
+        w = self._window
+        if w.count < self.min_calls:
+            return None
+        if self.failure_rate_threshold is not None:
+            rate = w.failure_rate()
+            if rate >= self.failure_rate_threshold:
+                return f"❌ (실패율 {rate * 100:.0f}%, {w.count}회 중)"
+        if self.slow_rate_threshold is not None:
+            rate = w.slow_rate()
+            if rate >= self.slow_rate_threshold:
+                return f"🐢 (느린 호출 {rate * 100:.0f}%, {w.count}회 중)"
+        return None
+
+    # ── 호출 ──
+
+    def _open_error(self) -> CircuitOpenError:
+        state = self._state
+        retry_after = (0.0 if state == State.HALF_OPEN else
+                       max(0.0, self.timeout - (self.clock() - self._open_time)))
+        return CircuitOpenError(self.name, state, retry_after)
+
+    def _rejected(self, func, args: tuple, kwargs: dict):
+        """거부된 호출의 대안: 마지막 정상 응답 → fallback → CircuitOpenError"""
+        if self.cache is not None:
+            found, value = self.cache.get(LastKnownGood.key(func, args, kwargs))
+            if found:
+                return value
+        if self.fallback is None:
+            raise self._open_error()
+        self.fallbacks += 1
+        return self.fallback(*args, **kwargs)
 
     def call(self, func, *args, **kwargs):
         """Circuit Breaker를 통해 함수 호출"""
-        with self._lock:
-            if self._state == State.OPEN:
-                # OPEN 상태: 일정 시간 후 HALF_OPEN으로 전환
-                if time.time() - self._open_time > self.timeout:
-                    self._state = State.HALF_OPEN
-                    self._successes = 0
-                    print(f"  [CB] OPEN → HALF_OPEN (시험 시작)")
-                else:
-                    self.stats["rejected"] += 1
-                    remaining = self.timeout - (time.time() - self._open_time)
-                    raise Exception(f"CircuitBreaker OPEN ({remaining:.1f}초 후 재시도)")
-
-            self.stats["allowed"] += 1
+        if self._state is State.CLOSED:     # allow_request()의 빠른 길을 그대로 펼친 것
+            self.allowed += 1
+        elif not self.allow_request():
+            return self._rejected(func, args, kwargs)
 
-        # 실제 함수 호출 (lock 밖에서)
+        # 실제 함수 호출 (lock 밖에서). 시간은 쓰는 곳(느린 호출 판정, 리스너)이 있을 때만 잰다
+        start = self.clock() if self._timed else None
         try:
             result = func(*args, **kwargs)
-            self._on_success()
-            return result
-        except Exception as e:
-            self._on_failure()
+        except self.ignore_exceptions:
+            self.release()
+            raise
+        except Exception:
+            self.record_failure(None if start is None else self.clock() - start)
+            raise
+        except BaseException:       # KeyboardInterrupt 등 — 결과가 아니므로 허가만 반납
+            self.release()
+            raise
+        self.record_success(None if start is None else self.clock() - start)
+        if self.cache is not None:
+            self.cache.put(LastKnownGood.key(func, args, kwargs), result)
+        return result
+
+    async def acall(self, func, *args, **kwargs):
+        """코루틴 함수 호출. lock은 카운터/윈도우를 갱신하는 동안만 잡으므로 이벤트 루프를 막지 않는다"""
+        if self._state is State.CLOSED:
+            self.allowed += 1
+        elif not self.allow_request():
+            result = self._rejected(func, args, kwargs)
+            return await result if inspect.isawaitable(result) else result   # async fallback
+
+        start = self.clock() if self._timed else None
+        try:
+            result = await func(*args, **kwargs)
+        except self.ignore_exceptions:
+            self.release()
+            raise
+        except Exception:
+            self.record_failure(None if start is None else self.clock() - start)
             raise
+        except BaseException:       # 취소(CancelledError) — 실패로 세지 않고 시험 자리만 돌려준다
+            self.release()
+            raise
+        self.record_success(None if start is None else self.clock() - start)
+        if self.cache is not None:
+            self.cache.put(LastKnownGood.key(func, args, kwargs), result)
+        return result
+
+    def __call__(self, func):
+        """데코레이터: @cb — 코루틴 함수는 acall, 일반 함수는 call로 감싼다"""
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def guarded(*args, **kwargs):
+                return await self.acall(func, *args, **kwargs)
+        else:
+            @functools.wraps(func)
+            def guarded(*args, **kwargs):
+                return self.call(func, *args, **kwargs)
+        return guarded
 
-    def _on_success(self):
+    def poll(self):
+        """OPEN 유지 시간이 지났으면 HALF_OPEN으로 (호출이 오지 않는 쪽은 타이머로 부른다)"""
+        change = None
         with self._lock:
-            self.stats["success"] += 1
-            self._results.append(True)
-            if len(self._results) > self.window_size:
-                self._results.pop(0)
+            if self._state == State.OPEN and self.clock() - self._open_time > self.timeout:
+                change = self._transition(State.HALF_OPEN, "(시험 시작)")
+        self._notify(change)
+
+    def is_call_permitted(self) -> bool:
+        """allow_request()가 지금 True를 줄 상태인가 — 시험 자리 예약도 카운터도 건드리지 않는다
+        (후보 여러 개를 살펴보고 하나만 고를 때: 고른 쪽만 allow_request로 예약)"""
+        state = self._state
+        if state is State.CLOSED:
+            return True
+        now = self.clock()
+        if state is State.OPEN:
+            return now - self._open_time > self.timeout     # 다음 호출에서 HALF_OPEN
+        return (now >= self._next_trial and
+                (not self.half_open_max_calls or self._trials < self.half_open_max_calls))
+
+    def allow_request(self) -> bool:
+        """지금 호출해도 되는가. True면 결과를 record_success/record_failure(또는 release)로 알려야 한다
+
+        CLOSED: lock 없이 바로 통과
+        OPEN: timeout이 지나기 전까지 거부
+        HALF_OPEN: half_open_interval마다, 동시에 half_open_max_calls개까지만 시험 호출
+                   (몰려온 요청이 한꺼번에 시험하지 않도록)
+        """
+        if self._state is State.CLOSED:
+            self.allowed += 1
+            return True
 
+        self.poll()
+        with self._lock:
+            allowed = self._state == State.CLOSED
             if self._state == State.HALF_OPEN:
-                self._successes += 1
-                if self._successes >= self.success_threshold:
-                    self._state = State.CLOSED
-                    self._failures = 0
-                    print(f"  [CB] HALF_OPEN → CLOSED ✅ (서비스 복구)")
-            elif self._state == State.CLOSED:
+                now = self.clock()
+                allowed = (now >= self._next_trial and
+                           (not self.half_open_max_calls or
+                            self._trials < self.half_open_max_calls))
+                if allowed:
+                    self._next_trial = now + self.half_open_interval
+                    self._trials += 1
+            if allowed:
+                self.allowed += 1
+            else:
+                self.rejected += 1
+            state = self._state
+        if not allowed and self._listeners[REJECTED]:
+            self._emit(REJECTED, state)
+        return allowed
+
+    def release(self):
+        """결과 없이 허가를 반납 (취소된 호출) — HALF_OPEN 시험 자리만 돌려준다"""
+        with self._lock:
+            if self._trials:
+                self._trials -= 1
+
+    def record_success(self, duration: float | None = None):
+        """성공 기록. duration(초)을 주면 slow_call_duration과 비교해 느린 호출도 센다"""
+        change = None
+        slow = (duration is not None and self.slow_call_duration is not None
+                and duration >= self.slow_call_duration)
+        with self._lock:
+            self.succeeded += 1
+            self._window.record(False, slow)
+
+            if self._state is State.CLOSED:
                 self._failures = 0
+                if slow:
+                    reason = self._rate_exceeded()
+                    if reason:
+                        change = self._transition(State.OPEN, reason)
+            elif self._state is State.HALF_OPEN:
+                if self._trials:
+                    self._trials -= 1
+                if slow:
+                    change = self._transition(State.OPEN, "🐢 (여전히 느림)")
+                else:
+                    self._successes += 1
+                    if self._successes >= self.success_threshold:
+                        self._failures = 0
+                        change = self._transition(State.CLOSED, "✅ (서비스 복구)")
+        if change is not None:
+            self._emit(STATE_CHANGE, *change)
+        if self._listeners[SUCCESS]:
+            self._emit(SUCCESS, duration)
 
-    def _on_failure(self):
+    def record_failure(self, duration: float | None = None):
+        change = None
+        slow = (duration is not None and self.slow_call_duration is not None
+                and duration >= self.slow_call_duration)
         with self._lock:
-            self.stats["failure"] += 1
-            self._results.append(False)
-            if len(self._results) > self.window_size:
-                self._results.pop(0)
+            self.failed += 1
+            self._window.record(True, slow)
             self._failures += 1
 
-            if self._state == State.HALF_OPEN:
-                self._state = State.OPEN
-                self._open_time = time.time()
-                print(f"  [CB] HALF_OPEN → OPEN ❌ (여전히 장애)")
-            elif (self._state == State.CLOSED and
-                  self._failures >= self.failure_threshold):
-                self._state = State.OPEN
-                self._open_time = time.time()
-                print(f"  [CB] CLOSED → OPEN ❌ ({self._failures}회 연속 실패)")
+            if self._state is State.HALF_OPEN:
+                if self._trials:
+                    self._trials -= 1
+                change = self._transition(State.OPEN, "❌ (여전히 장애)")
+            elif self._state is State.CLOSED:
+                if self._failures >= self.failure_threshold:
+                    change = self._transition(State.OPEN, f"❌ ({self._failures}회 연속 실패)")
+                else:
+                    reason = self._rate_exceeded()
+                    if reason:
+                        change = self._transition(State.OPEN, reason)
+        if change is not None:
+            self._emit(STATE_CHANGE, *change)
+        if self._listeners[FAILURE]:
+            self._emit(FAILURE, duration)
 
     def show_status(self):
         rate = self._failure_rate()
-        print(f"  상태: {self._state.value}  실패율: {rate*100:.1f}%  "
-              f"허용: {self.stats['allowed']}  거부: {self.stats['rejected']}")
+        slow = (f"  느린 호출: {self._window.slow_rate()*100:.1f}%"
+                if self.slow_call_duration is not None else "")
+        print(f"  상태: {self._state.value}  실패율: {rate*100:.1f}%{slow}  "
+              f"허용: {self.allowed}  거부: {self.rejected}")
+
+
+# ── 브레이커 레지스트리 (프로세스 간 공유) ────────────────
+#
+# 워커 프로세스마다 브레이커가 따로 있으면 죽은 의존성을 워커마다 다시 발견한다
+# (워커 N개 × failure_threshold번의 타임아웃). 상태·카운터·윈도우를 fork 전에 만든
+# 공유 메모리(RawArray — 익명 mmap)의 칸 하나에 두고 프로세스 간 락으로 보호하면
+# 한 워커가 OPEN으로 바꾸는 순간 모든 워커가 차단한다.
+# 시각은 time.monotonic() — 같은 호스트의 프로세스끼리는 같은 시계를 본다.
+# 리스너는 프로세스마다 따로라서 다른 워커가 일으킨 전환은 알림이 오지 않는다 (state를 다시 읽을 것).
+#
+# 칸 하나: [이름 64B][int64 16칸][float64 4칸][윈도우 window_bytes]
+
+NAME_BYTES = 64
+(S_STATE, S_FAILURES, S_SUCCESSES, S_TRIALS, S_ALLOWED, S_REJECTED, S_SUCCEEDED, S_FAILED,
+ W_POS, W_COUNT, W_FAILURES, W_SLOW, W_SIZE) = range(13)
+F_OPEN_TIME, F_NEXT_TRIAL, F_WINDOW_SECONDS = range(3)
+INT_CELLS, FLOAT_CELLS = 16, 4
+HEADER_BYTES = NAME_BYTES + 8 * (INT_CELLS + FLOAT_CELLS)
+
+STATES = (State.CLOSED, State.OPEN, State.HALF_OPEN)
+STATE_CODE = {s: i for i, s in enumerate(STATES)}
+
+
+class _Cell:
+    """공유 메모리 칸 하나에 묶인 속성 — obj._ints[index] (또는 _floats)를 읽고 쓴다"""
+
+    def __init__(self, index: int, view: str = "_ints"):
+        self.index = index
+        self.view = view
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        return getattr(obj, self.view)[self.index]
+
+    def __set__(self, obj, value):
+        getattr(obj, self.view)[self.index] = value
+
+
+class SharedCountWindow(CountWindow):
+    """CountWindow — 링 버퍼와 합계를 공유 메모리 칸에 둔다"""
+    __slots__ = ("_ints",)
+    _pos, count, failures, slow = (_Cell(W_POS), _Cell(W_COUNT),
+                                   _Cell(W_FAILURES), _Cell(W_SLOW))
+
+    def __init__(self, size: int, ints: memoryview, mem: memoryview, fresh: bool):
+        self.size = size
+        self._ints = ints
+        self._buf = mem[:size]
+        if fresh:
+            self.reset()
+
+
+class SharedTimeWindow(TimeWindow):
+    """TimeWindow — 시간 칸(호출/실패/느린 호출)과 합계를 공유 메모리 칸에 둔다"""
+    __slots__ = ("_ints", "_cells")
+    _tick, count, failures, slow = (_Cell(W_POS), _Cell(W_COUNT),
+                                    _Cell(W_FAILURES), _Cell(W_SLOW))
+
+    def __init__(self, seconds: float, buckets: int, ints: memoryview, mem: memoryview,
+                 fresh: bool, clock=time.monotonic):
+        self.seconds = seconds
+        self._width = seconds / buckets
+        self.clock = clock
+        self._ints = ints
+        self._cells = mem[:3 * 8 * buckets].cast("q")
+        self._calls = self._cells[:buckets]
+        self._failures = self._cells[buckets:2 * buckets]
+        self._slow = self._cells[2 * buckets:]
+        if fresh:
+            self.reset()
+
+    def reset(self):
+        self._cells[:] = memoryview(bytes(8 * len(self._cells))).cast("q")
+        self._tick = int(self.clock() / self._width)
+        self.count = self.failures = self.slow = 0
+
+
+class SharedCircuitBreaker(CircuitBreaker):
+    """상태/카운터/윈도우가 공유 메모리 칸에 있는 CircuitBreaker (BreakerRegistry(shared=True)가 만든다)
+
+    fresh=False면 다른 프로세스가 이미 쓰고 있는 칸에 붙는다 — 값을 초기화하지 않고
+    윈도우 설정이 같은지만 확인한다.
+    """
+    _failures, _successes, _trials = _Cell(S_FAILURES), _Cell(S_SUCCESSES), _Cell(S_TRIALS)
+    allowed, rejected = _Cell(S_ALLOWED), _Cell(S_REJECTED)
+    succeeded, failed = _Cell(S_SUCCEEDED), _Cell(S_FAILED)
+    _open_time = _Cell(F_OPEN_TIME, "_floats")
+    _next_trial = _Cell(F_NEXT_TRIAL, "_floats")
+
+    def __init__(self, slot: memoryview, lock, fresh: bool, **options):
+        self._ints = slot[NAME_BYTES:NAME_BYTES + 8 * INT_CELLS].cast("q")
+        self._floats = slot[NAME_BYTES + 8 * INT_CELLS:HEADER_BYTES].cast("d")
+        self._window_mem = slot[HEADER_BYTES:]
+        self._fresh = fresh
+        super().__init__(**options)
+        self._lock = lock           # 프로세스 간 락 (스레드끼리도 그대로 동작)
+
+    @property
+    def _state(self) -> State:
+        return STATES[self._ints[S_STATE]]
+
+    @_state.setter
+    def _state(self, state: State):
+        self._ints[S_STATE] = STATE_CODE[state]
+
+    def _new_window(self, window_size: int, window_seconds: float | None):
+        buckets = 60 if window_seconds else window_size
+        need = 3 * 8 * buckets if window_seconds else window_size
+        if need > len(self._window_mem):
+            raise ValueError(f"window needs {need} bytes, registry slot has {len(self._window_mem)}")
+        config = (buckets, float(window_seconds or 0.0))
+        if self._fresh:
+            self._ints[W_SIZE], self._floats[F_WINDOW_SECONDS] = config
+        elif (self._ints[W_SIZE], self._floats[F_WINDOW_SECONDS]) != config:
+            raise ValueError(f"breaker {self.name!r} already registered with a different window")
+        if window_seconds:
+            return SharedTimeWindow(window_seconds, buckets, self._ints, self._window_mem,
+                                    self._fresh, clock=self.clock)
+        return SharedCountWindow(window_size, self._ints, self._window_mem, self._fresh)
+
+    def _init_state(self):
+        if self._fresh:
+            super()._init_state()
+
+
+class BreakerRegistry:
+    """이름 → CircuitBreaker (의존성마다 하나). 같은 이름으로 get()하면 같은 브레이커
+
+    shared=True: 상태를 공유 메모리에 두어 fork한 모든 워커가 같은 브레이커를 본다.
+    반드시 fork 전에 만들 것. 이름표도 공유 메모리에 있으므로 fork 뒤에 처음 get()한
+    이름도 워커끼리 같은 칸을 쓴다 (칸은 capacity개, 칸마다 윈도우 window_bytes).
+    """
+
+    def __init__(self, shared: bool = False, capacity: int = 64, window_bytes: int = 4096):
+        self.shared = shared
+        self._breakers: dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+        if shared:
+            ctx = multiprocessing.get_context("fork")
+            self.capacity = capacity
+            self._slot_bytes = HEADER_BYTES + window_bytes
+            self._array = ctx.RawArray("B", capacity * self._slot_bytes)
+            self._locks = [ctx.Lock() for _ in range(capacity)]
+            self._names_lock = ctx.Lock()
+
+    def get(self, name: str, **options) -> CircuitBreaker:
+        """name의 브레이커 (처음이면 options로 생성). 리스너(on_state_change 등)는 이 프로세스에만 붙는다"""
+        with self._lock:
+            cb = self._breakers.get(name)
+            if cb is None:
+                cb = self._breakers[name] = self._create(name, options)
+            return cb
+
+    def _create(self, name: str, options: dict) -> CircuitBreaker:
+        if not self.shared:
+            return CircuitBreaker(name=name, **options)
+        key = name.encode()
+        if not 0 < len(key) <= NAME_BYTES:
+            raise ValueError(f"shared breaker name must be 1..{NAME_BYTES} bytes (got {name!r})")
+        mem = memoryview(self._array).cast("B")
+        size = self._slot_bytes
+        # 빈 칸 찾기와 새 칸 초기화를 이름표 락 안에서 끝낸다 (반쯤 초기화된 칸에 다른 워커가 붙지 않도록)
+        with self._names_lock:
+            for i in range(self.capacity):
+                slot = mem[i * size:(i + 1) * size]
+                stored = bytes(slot[:NAME_BYTES]).rstrip(b"\0")
+                if stored == key or not stored:
+                    cb = SharedCircuitBreaker(slot, self._locks[i], fresh=not stored,
+                                              name=name, **options)
+                    slot[:NAME_BYTES] = key.ljust(NAME_BYTES, b"\0")
+                    return cb
+        raise RuntimeError(f"breaker registry is full ({self.capacity} slots)")
+
+    def discard(self, name: str):
+        """이 프로세스의 목록에서 뺀다 (다음 get()은 새 리스너로 다시 만든다 — 공유 칸은 그대로)"""
+        with self._lock:
+            self._breakers.pop(name, None)
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._breakers.values()))
+
+    def __len__(self) -> int:
+        return len(self._breakers)
+
+
+# ── 벌크헤드 (동시 호출 격리) ─────────────────────────────
+#
+# 서킷 브레이커는 "실패/느림이 쌓인 뒤"에 끊는다. 그 전까지 느린 의존성 하나가
+# 워커 스레드를 전부 붙잡으면 다른 요청까지 멈춘다 (demonstrate_cascading_failure).
+# 벌크헤드는 의존성마다 동시에 쓸 수 있는 자리를 정해 두어 배의 격벽처럼 피해를 가둔다.
+#
+#   max_concurrent : 동시에 실행할 수 있는 호출 수
+#   max_queue      : 자리가 없을 때 기다릴 수 있는 호출 수 (넘치면 즉시 BulkheadFullError)
+#   max_wait       : 대기열에서 기다리는 최대 시간 (None = 자리가 날 때까지)
+#
+# 브레이커와 함께 쓸 때는 바깥에 브레이커를 둔다 — OPEN이면 대기열에 들어가지도 않는다.
+#   cb = CircuitBreaker(ignore_exceptions=(BulkheadFullError,))   # 자리 부족은 의존성 장애가 아님
+#   cb.call(bulkhead.call, func, ...)
+
+class BulkheadFullError(Exception):
+    """벌크헤드에 자리가 없어 호출을 거절 (대기열 가득 참 / max_wait 초과)"""
+
+
+class _BulkheadBase:
+    def __init__(self, max_concurrent: int, max_queue: int, max_wait: float | None, name: str):
+        if max_concurrent < 1 or max_queue < 0:
+            raise ValueError(f"bulkhead needs max_concurrent >= 1 and max_queue >= 0 "
+                             f"(got {max_concurrent}, {max_queue})")
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.name = name
+        self.active = 0         # 실행 중
+        self.waiting = 0        # 대기열
+        self.accepted = 0
+        self.rejected = 0       # 대기열 가득 참 → 즉시 거절
+        self.timed_out = 0      # max_wait 동안 자리가 나지 않아 거절
+
+    def _full(self) -> BulkheadFullError:
+        self.rejected += 1
+        return BulkheadFullError(f"bulkhead {self.name!r} full "
+                                 f"({self.active} running, {self.waiting} queued)")
+
+    def _expired(self) -> BulkheadFullError:
+        self.timed_out += 1
+        return BulkheadFullError(f"bulkhead {self.name!r}: no slot within {self.max_wait}s")
+
+    def stats(self) -> dict:
+        return {"active": self.active, "waiting": self.waiting, "accepted": self.accepted,
+                "rejected": self.rejected, "timed_out": self.timed_out}
+
+
+class Bulkhead(_BulkheadBase):
+    """세마포어 벌크헤드 — 호출자 스레드가 직접 실행하되 동시에 max_concurrent개까지만"""
+
+    def __init__(self, max_concurrent: int = 10, max_queue: int = 0,
+                 max_wait: float | None = None, name: str = ""):
+        super().__init__(max_concurrent, max_queue, max_wait, name)
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            # 기다리는 호출이 있으면 새로 온 호출이 새치기하지 않도록 대기열 뒤에 선다
+            if self.active < self.max_concurrent and not self.waiting:
+                self.active += 1
+                self.accepted += 1
+                return
+            if self.waiting >= self.max_queue:
+                raise self._full()
+            self.waiting += 1
+            try:
+                ok = self._cond.wait_for(lambda: self.active < self.max_concurrent, self.max_wait)
+            finally:
+                self.waiting -= 1
+            if not ok:
+                raise self._expired()
+            self.active += 1
+            self.accepted += 1
+
+    def release(self):
+        with self._cond:
+            self.active -= 1
+            self._cond.notify()
+
+    def call(self, func, *args, **kwargs):
+        self.acquire()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self.release()
+
+
+class AsyncBulkhead(_BulkheadBase):
+    """asyncio 세마포어 벌크헤드 — 코루틴 호출을 동시에 max_concurrent개까지만 (루프 하나 안에서)"""
+
+    def __init__(self, max_concurrent: int = 10, max_queue: int = 0,
+                 max_wait: float | None = None, name: str = ""):
+        super().__init__(max_concurrent, max_queue, max_wait, name)
+        self._sem = asyncio.Semaphore(max_concurrent)
+
+    async def acall(self, func, *args, **kwargs):
+        if self._sem.locked():
+            if self.waiting >= self.max_queue:
+                raise self._full()
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._sem.acquire(), self.max_wait)
+            except TimeoutError:
+                raise self._expired() from None
+            finally:
+                self.waiting -= 1
+        else:
+            await self._sem.acquire()       # 자리가 있으므로 바로 돌아온다
+        self.active += 1
+        self.accepted += 1
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            self.active -= 1
+            self._sem.release()
+
+
+class ThreadPoolBulkhead(_BulkheadBase):
+    """전용 스레드 풀 벌크헤드 — 호출자 대신 풀 스레드 max_concurrent개가 실행
+
+    호출자는 결과를 기다리거나(call) await한다(acall — 이벤트 루프에서 블로킹 함수를 부를 때).
+    대기열에서 max_wait초를 넘긴 작업은 실행하지 않고 BulkheadFullError로 끝낸다
+    (풀 스레드가 모두 멈춰 있어도 호출자는 max_wait 뒤에 풀려난다).
+    """
+
+    def __init__(self, max_concurrent: int = 10, max_queue: int = 0,
+                 max_wait: float | None = None, name: str = ""):
+        super().__init__(max_concurrent, max_queue, max_wait, name)
+        self._pool = concurrent.futures.ThreadPoolExecutor(
+            max_concurrent, thread_name_prefix=f"bulkhead-{name}" if name else "bulkhead")
+        self._lock = threading.Lock()
+
+    def submit(self, func, *args, **kwargs) -> concurrent.futures.Future:
+        with self._lock:
+            if self.active + self.waiting >= self.max_concurrent + self.max_queue:
+                raise self._full()
+            self.waiting += 1
+        return self._pool.submit(self._run, time.monotonic(), func, args, kwargs)
+
+    def _run(self, queued_at: float, func, args, kwargs):
+        with self._lock:
+            self.waiting -= 1
+            if self.max_wait is not None and time.monotonic() - queued_at > self.max_wait:
+                raise self._expired()
+            self.active += 1
+            self.accepted += 1
+        try:
+            return func(*args, **kwargs)
+        finally:
+            with self._lock:
+                self.active -= 1
+
+    def _withdraw(self, fut: concurrent.futures.Future) -> BulkheadFullError | None:
+        """max_wait 안에 풀 스레드가 집어 가지 않은 작업을 취소 (이미 실행 중이면 None)"""
+        if not fut.cancel():
+            return None
+        with self._lock:
+            self.waiting -= 1
+            return self._expired()
+
+    def call(self, func, *args, **kwargs):
+        fut = self.submit(func, *args, **kwargs)
+        if self.max_wait is not None:
+            # 풀 스레드가 전부 멈춰 있으면 대기열 검사(_run)까지 가지도 못하므로 호출자 쪽에서 끊는다
+            try:
+                return fut.result(timeout=self.max_wait)
+            except concurrent.futures.TimeoutError:
+                if (err := self._withdraw(fut)) is not None:
+                    raise err from None
+        return fut.result()
+
+    async def acall(self, func, *args, **kwargs):
+        fut = self.submit(func, *args, **kwargs)
+        wrapped = asyncio.wrap_future(fut)
+        if self.max_wait is not None:
+            done, _ = await asyncio.wait({wrapped}, timeout=self.max_wait)
+            if not done and (err := self._withdraw(fut)) is not None:
+                raise err
+        return await wrapped
+
+    def shutdown(self, wait: bool = True):
+        self._pool.shutdown(wait)
 
 
 # ── 불안정한 서비스 시뮬레이터 ───────────────────────────
@@ -233,10 +1069,173 @@ def demonstrate_cascading_failure():
     요청 1~5:  실패 → 5번째에 Circuit OPEN
     요청 6~N:  즉시 거부(fallback 응답) → 스레드 낭비 없음
     10초 후:   HALF_OPEN → 복구 확인
+
+  [실패 없이 느리기만 하다면?]
+    연속 실패 기준으로는 끝내 열리지 않는다 (응답은 결국 오니까)
+    → 느린 호출 비율(slow_call_duration 이상 걸린 호출)로 판단해야 한다
 """)
 
+    # 느려진 PG사 (실패는 없고 응답만 200ms) — 시간으로 축소해 실제로 돌려 본다
+    def slow_pg():
+        time.sleep(0.2)
+        return "OK"
+
+    def run(cb, n=20):
+        start, served, rejected = time.monotonic(), 0, 0
+        for _ in range(n):
+            try:
+                cb.call(slow_pg) if cb else slow_pg()
+                served += 1
+            except Exception:
+                rejected += 1       # 실제 서비스라면 여기서 fallback 응답
+        return time.monotonic() - start, served, rejected
+
+    print("  느려진 PG사(200ms)에 요청 20개:")
+    elapsed, served, _ = run(None)
+    print(f"    Circuit Breaker 없음:      {elapsed:.1f}초 동안 스레드 점유 (응답 {served}개)")
+    elapsed, served, _ = run(CircuitBreaker(failure_threshold=5))
+    print(f"    연속 실패 기준만:          {elapsed:.1f}초 — 실패가 없어 열리지 않음")
+    cb = CircuitBreaker(failure_threshold=5, window_seconds=60,
+                        slow_call_duration=0.1, slow_rate_threshold=0.5, min_calls=5)
+    elapsed, served, rejected = run(cb)
+    print(f"    느린 호출 비율 50% (5회~): {elapsed:.1f}초 — {served}개 후 OPEN, "
+          f"{rejected}개 즉시 거부")
+
+
+def demonstrate_fallback(calls: int = 10_000):
+    """OPEN 동안 거부된 호출: 예외 vs fallback vs 마지막 정상 응답 (호출당 시간)"""
+    print("\n" + "=" * 60)
+    print(" OPEN 상태의 거부된 호출: 예외 대신 쓸모 있는 응답")
+    print("=" * 60)
+
+    profiles_down = False
+
+    def get_profile(user_id: int) -> dict:
+        if profiles_down:
+            raise Exception("Service Unavailable (503)")
+        return {"user": user_id, "tier": "gold" if user_id % 2 else "silver"}
+
+    def default_profile(user_id: int) -> dict:
+        return {"user": user_id, "tier": "basic (기본값)"}
+
+    cb = CircuitBreaker(failure_threshold=3, timeout=60, name="profile",
+                        fallback=default_profile, cache_size=1000, cache_ttl=30)
+    for user_id in (1, 2, 3):
+        cb.call(get_profile, user_id)      # 정상일 때의 응답이 캐시에 남는다
+    profiles_down = True
+    for _ in range(3):
+        try:
+            cb.call(get_profile, 99)
+        except Exception:
+            pass
+
+    print()
+    for user_id in (1, 2, 4):
+        source = "마지막 정상 응답" if user_id <= 3 else "fallback"
+        print(f"  user {user_id}: {cb.call(get_profile, user_id)}  ← {source}")
+
+    bare = CircuitBreaker(failure_threshold=1, timeout=60, log=False)
+    try:
+        bare.call(get_profile, 99)
+    except Exception:
+        pass
+    for label, breaker, user_id in [("CircuitOpenError", bare, 1),
+                                    ("fallback", cb, 4),
+                                    ("마지막 정상 응답", cb, 1)]:
+        start = time.perf_counter()
+        for _ in range(calls):
+            try:
+                breaker.call(get_profile, user_id)
+            except CircuitOpenError:
+                pass
+        per_call = (time.perf_counter() - start) / calls * 1e6
+        print(f"  거부된 호출 → {label:<18} {per_call:5.1f}µs/호출")
+
+
+def demonstrate_bulkhead(threads: int = 16, requests: int = 64):
+    """API 워커 스레드를 느린 PG사 호출과 빠른 조회가 나눠 쓸 때: 벌크헤드 없음 vs 4자리 벌크헤드"""
+    print("\n" + "=" * 60)
+    print(" 벌크헤드: 느린 의존성이 차지할 수 있는 워커 수 제한")
+    print("=" * 60)
+
+    def slow_pg():
+        time.sleep(0.5)
+
+    def fast_lookup():
+        time.sleep(0.01)
+
+    def run(bulkhead):
+        fast, rejected = [], 0
+
+        def handle(i, queued_at):
+            nonlocal rejected
+            if i % 2:
+                fast_lookup()
+                fast.append(time.monotonic() - queued_at)
+            elif bulkhead is None:
+                slow_pg()
+            else:
+                try:
+                    bulkhead.call(slow_pg)
+                except BulkheadFullError:
+                    rejected += 1       # 실제 서비스라면 fallback 응답
+
+        with concurrent.futures.ThreadPoolExecutor(threads) as api_workers:
+            for i in range(requests):
+                api_workers.submit(handle, i, time.monotonic())
+        fast.sort()
+        return fast[len(fast) // 2], fast[-1], rejected
+
+    print(f"  API 워커 {threads}개, 요청 {requests}개 (절반은 PG사 500ms, 절반은 조회 10ms)")
+    p50, worst, _ = run(None)
+    print(f"    벌크헤드 없음:   조회 p50 {p50 * 1000:4.0f}ms, 최대 {worst * 1000:4.0f}ms")
+    bulkhead = Bulkhead(max_concurrent=4, name="payment-pg")
+    p50, worst, rejected = run(bulkhead)
+    print(f"    PG사 4자리까지: 조회 p50 {p50 * 1000:4.0f}ms, 최대 {worst * 1000:4.0f}ms "
+          f"(PG사 호출 {rejected}개 즉시 거절)")
+
+
+def demonstrate_shared_registry(workers: int = 4, calls: int = 10):
+    """워커 프로세스 여럿이 같은 죽은 의존성을 부를 때: 워커별 브레이커 vs 공유 레지스트리"""
+    print("\n" + "=" * 60)
+    print(" 멀티 프로세스: 워커별 브레이커 vs 공유 레지스트리")
+    print("=" * 60)
+    ctx = multiprocessing.get_context("fork")
+
+    def dead_dependency():
+        time.sleep(0.05)            # 타임아웃까지 기다렸다가 실패
+        raise Exception("Timeout")
+
+    for shared in (False, True):
+        registry = BreakerRegistry(shared=shared, capacity=4)
+        hits = ctx.Value("i", 0)    # 실제로 의존성까지 간 호출 (타임아웃을 겪은 호출)
+
+        def worker():
+            cb = registry.get("payment-pg", failure_threshold=5, timeout=60, log=False)
+            for _ in range(calls):
+                if cb.allow_request():
+                    with hits.get_lock():
+                        hits.value += 1
+                    try:
+                        dead_dependency()
+                    except Exception:
+                        cb.record_failure()
+
+        procs = [ctx.Process(target=worker) for _ in range(workers)]
+        start = time.monotonic()
+        for p in procs:
+            p.start()
+        for p in procs:
+            p.join()
+        label = "공유 레지스트리" if shared else "워커별 브레이커"
+        print(f"  {label}: 워커 {workers}개 × {calls}회 → 타임아웃 {hits.value}번 "
+              f"({time.monotonic() - start:.2f}초)")
+
 
 if __name__ == "__main__":
     simulate_circuit_breaker()
     demonstrate_cascading_failure()
+    demonstrate_fallback()
+    demonstrate_bulkhead()
+    demonstrate_shared_registry()
     print("✅ Lab 09 Circuit Breaker 완료!")
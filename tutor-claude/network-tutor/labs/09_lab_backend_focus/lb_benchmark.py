@@ -0,0 +1,525 @@
+#!/usr/bin/env python3
+"""
+Lab 09 - 로드 밸런서 벤치마크
+
+pick: 백엔드 선택 마이크로 벤치마크 (백엔드 10 / 1,000 / 10,000개)
+      예전 방식(요청마다 healthy 리스트 재생성)과 비교
+ring: 일관 해시 — 백엔드 제외/복구 시 옮겨 가는 키 비율
+metrics: 요청 카운터(begin/end_request)·지연 히스토그램 비용과 스레드 경쟁 시 정확성
+load: 더미 백엔드 + LB를 별도 프로세스로 띄우고 asyncio 클라이언트로 부하
+      closed-loop(동시 요청 수 고정) / open-loop(초당 요청 수 고정) — 알고리즘별 처리량·지연·분산
+
+실행:
+    python3 lb_benchmark.py pick
+    python3 lb_benchmark.py ring --backends 10
+    python3 lb_benchmark.py metrics --threads 8
+    python3 lb_benchmark.py load --mode async --concurrency 64 --duration 10
+    python3 lb_benchmark.py load --rps 500 --algos round_robin least_conn --json out.json
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import multiprocessing
+import random
+import signal
+import statistics
+import sys
+import threading
+import time
+from collections import Counter, deque
+
+from load_balancer import (AsyncLBServer, Backend, ConsistentHash, HealthySet,
+                           LatencyHistogram, LBHandler, LBServer, LoadBalancer, RequestInfo,
+                           raise_fd_limit, start_dummy_backend, start_workers)
+
+ALGORITHMS = ["round_robin", "weighted", "weighted_random", "least_conn",
+              "p2c", "peak_ewma", "least_latency", "consistent_hash"]
+
+
+# ── 예전 방식 (비교 기준) ─────────────────────────────────
+
+def legacy_round_robin():
+    index = 0
+
+    def pick(backends):
+        nonlocal index
+        healthy = [b for b in backends if b.healthy]
+        if not healthy:
+            return None
+        b = healthy[index % len(healthy)]
+        index += 1
+        return b
+    return pick
+
+
+def legacy_weighted():
+    queue = deque()
+
+    def pick(backends):
+        healthy = [b for b in backends if b.healthy]
+        if not healthy:
+            return None
+        if not queue:
+            for b in healthy:
+                queue.extend([b] * b.weight)
+            random.shuffle(queue)
+        return queue.popleft() if queue else healthy[0]
+    return pick
+
+
+def legacy_least_conn():
+    def pick(backends):
+        healthy = [b for b in backends if b.healthy]
+        if not healthy:
+            return None
+        return min(healthy, key=lambda b: b.active_connections)
+    return pick
+
+
+# ── pick 벤치마크 ─────────────────────────────────────────
+
+def make_backends(n: int, unhealthy_ratio: float = 0.1) -> list[Backend]:
+    backends = [Backend("10.0.0.1", 10000 + i, weight=1 + i % 3) for i in range(n)]
+    for b in backends[::int(1 / unhealthy_ratio)]:
+        b.healthy = False
+    return backends
+
+
+def measure(pick, duration: float, in_flight: int) -> float:
+    """duration 동안 pick → 연결 +1 → (in_flight개 뒤) 연결 -1 을 반복, 초당 pick 수 반환"""
+    outstanding = deque()
+    count = 0
+    start = time.perf_counter()
+    deadline = start + duration
+    while True:
+        for _ in range(1000):
+            b = pick()
+            b.begin_request()
+            outstanding.append(b)
+            if len(outstanding) > in_flight:
+                outstanding.popleft().end_request()
+        count += 1000
+        now = time.perf_counter()
+        if now >= deadline:
+            return count / (now - start)
+
+
+def bench_pick(sizes: list[int], duration: float, in_flight: int):
+    print(f"\n[pick 벤치마크] 백엔드의 10% 장애, 동시 처리 중 요청 {in_flight}개 유지")
+    print(f"  {'알고리즘':<17}{'백엔드':>8}{'예전 (picks/s)':>18}{'현재 (picks/s)':>18}{'배율':>9}")
+    for algo, legacy in [("round_robin", legacy_round_robin),
+                         ("weighted", legacy_weighted),
+                         ("weighted_random", None),
+                         ("least_conn", legacy_least_conn),
+                         ("p2c", None),
+                         ("peak_ewma", None),
+                         ("least_latency", None),
+                         ("consistent_hash", None)]:
+        for n in sizes:
+            backends = make_backends(n)
+            lb = LoadBalancer(port=0, backends=backends, algo=algo, verbose=False)
+            if algo == "consistent_hash":
+                reqs = itertools.cycle([RequestInfo("GET", f"/item/{i}", "127.0.0.1", [])
+                                        for i in range(4096)])
+                now = measure(lambda: lb.pick(next(reqs)), duration, in_flight)
+            else:
+                now = measure(lb.pick, duration, in_flight)
+
+            if legacy is None:
+                print(f"  {algo:<17}{n:>8,}{'-':>18}{now:>18,.0f}{'':>9}")
+                continue
+            legacy_backends = make_backends(n)
+            legacy_pick = legacy()
+            before = measure(lambda: legacy_pick(legacy_backends), duration, in_flight)
+            print(f"  {algo:<17}{n:>8,}{before:>18,.0f}{now:>18,.0f}{now / before:>8.1f}x")
+
+
+# ── 일관 해시 링 벤치마크 ─────────────────────────────────
+
+def bench_ring(n: int, keys: int, vnodes: int):
+    """백엔드 하나가 빠졌다 돌아올 때 옮겨 가는 키 비율 + 부하 분포"""
+    backends = [Backend("10.0.0.1", 10000 + i) for i in range(n)]
+    healthy = HealthySet(backends)
+    ch = ConsistentHash(key="path", vnodes=vnodes, load_factor=None)
+    ch.reset(healthy)
+    reqs = [RequestInfo("GET", f"/item/{i}", "127.0.0.1", []) for i in range(keys)]
+
+    def assign():
+        return [ch.pick(healthy, r) for r in reqs]
+
+    start = time.perf_counter()
+    before = assign()
+    elapsed = time.perf_counter() - start
+
+    counts = Counter(before)
+    per = [counts.get(b, 0) for b in backends]
+    print(f"\n[일관 해시 링] 백엔드 {n}개 × 가상 노드 {vnodes}, 키 {keys:,}개")
+    print(f"  조회: {keys / elapsed:,.0f} lookups/s")
+    print(f"  키 분포: 평균 {statistics.mean(per):.0f}, 최소 {min(per)}, 최대 {max(per)} "
+          f"(표준편차 {statistics.pstdev(per) / statistics.mean(per) * 100:.1f}%)")
+
+    victim = backends[n // 2]
+    victim.healthy = False
+    healthy.refresh()
+    ch.on_health_change(victim)
+    after = assign()
+    moved = sum(1 for a, b in zip(before, after) if a is not b)
+    owned = sum(1 for a in before if a is victim)
+    print(f"  {victim.addr} 제외: {moved:,}개 키 이동 ({moved / keys * 100:.2f}%, "
+          f"이상적 1/N = {100 / n:.2f}%) — 원래 그 서버 키 {owned:,}개")
+
+    victim.healthy = True
+    healthy.refresh()
+    ch.on_health_change(victim)
+    restored = assign()
+    back = sum(1 for a, b in zip(before, restored) if a is b)
+    print(f"  {victim.addr} 복구: {back / keys * 100:.2f}% 키가 원래 백엔드로")
+
+
+# ── 요청 카운터 벤치마크 ──────────────────────────────────
+
+def bench_metrics(threads: int, per_thread: int):
+    """요청 하나당 카운터 비용 + 여러 스레드가 같은 백엔드를 두드릴 때 값이 맞는지"""
+    print(f"\n[요청 카운터] 스레드 {threads}개 × 요청 {per_thread:,}개, 같은 백엔드 1개")
+    print(f"  {'방식':<22}{'구독자':>12}{'ns/요청':>10}{'추가':>8}"
+          f"{'active':>9}{'requests':>12}{'errors':>12}")
+
+    def legacy(b):
+        # 예전 방식: 매번 새 락(아무것도 보호 못 함) + 락 밖에서 감소
+        with threading.Lock():
+            b.active_connections += 1
+            b.total_requests += 1
+        b.total_errors += 1
+        b.active_connections -= 1
+
+    def current(b):
+        b.begin_request()
+        b.record_error()
+        b.end_request()
+
+    def run(step, algo):
+        b = Backend("10.0.0.1", 10000)
+        if algo != "-":
+            # 구독자(LeastConnections) 갱신까지 포함한 실제 구성
+            LoadBalancer(port=0, backends=[b], algo=algo, verbose=False)
+
+        def worker():
+            for _ in range(per_thread):
+                step(b)
+
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        start = time.perf_counter()
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join()
+        return (time.perf_counter() - start) / (threads * per_thread) * 1e9, b
+
+    # 스레드 전환을 자주 일으켜 `+=` 사이에 끼어들 기회를 만든다 (기본 5ms면 경쟁이 드물게만 드러남)
+    switch = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        for algo in ["-", "least_conn"]:
+            base = None
+            for name, step in [("예전 (new Lock + +=)", legacy), ("begin/end_request", current)]:
+                ns, b = run(step, algo)
+                added = "" if base is None else f"{ns - base:+.0f}"
+                base = ns if base is None else base
+                print(f"  {name:<22}{algo:>12}{ns:>10.0f}{added:>8}{b.active_connections:>9}"
+                      f"{b.total_requests:>12,}{b.total_errors:>12,}")
+    finally:
+        sys.setswitchinterval(switch)
+    print(f"  (정상: active 0, requests/errors {threads * per_thread:,})")
+
+    # 지연 히스토그램 기록 (요청마다 백엔드 1번 + LB 전체 1번)
+    hist = LatencyHistogram()
+    samples = [random.expovariate(1 / 0.02) for _ in range(4096)]
+    start = time.perf_counter()
+    for _ in range(per_thread // len(samples) + 1):
+        for x in samples:
+            hist.record(x)
+    ns = (time.perf_counter() - start) / hist.count * 1e9
+    print(f"\n  LatencyHistogram.record: {ns:.0f} ns/기록 "
+          f"(p50={hist.quantile(0.5) * 1000:.1f}ms p99={hist.quantile(0.99) * 1000:.1f}ms)")
+
+
+# ── 부하 생성 (end-to-end) ────────────────────────────────
+
+def serve_stack(algo: str, mode: str, port: int, n_backends: int, slow: int, workers: int,
+                lb_options: dict, ready):
+    """자식 프로세스: 더미 백엔드 n개(뒤쪽 slow개는 느림) + LB. 클라이언트와 GIL을 나눠 쓰지 않도록 분리"""
+    backends = [Backend("localhost", port + 1 + i) for i in range(n_backends)]
+    lb = LoadBalancer(port, backends, algo=algo, verbose=False, **lb_options)
+
+    if workers > 1:
+        procs = start_workers(lb, workers, mode, port)
+        # terminate()(SIGTERM)에도 정상 종료 경로를 타야 워커(손자 프로세스)까지 정리된다
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    for i in range(n_backends):
+        start_dummy_backend(port + 1 + i, f"Server-{i}", slow=i >= n_backends - slow)
+
+    if workers > 1:
+        time.sleep(0.3)         # 워커들이 bind할 시간
+        ready.set()
+        for w in procs:
+            w.join()
+    elif mode == "thread":
+        LBHandler.lb = lb
+        server = LBServer(("localhost", port), LBHandler)
+        ready.set()
+        server.serve_forever()
+    else:
+        raise_fd_limit()
+        proxy = AsyncLBServer(lb, port=port)
+
+        async def run():
+            await proxy.start()
+            ready.set()
+            await proxy.serve_forever()
+        asyncio.run(run())
+
+
+class LoadClient:
+    """keep-alive 연결을 재사용하는 최소 HTTP/1.1 GET 클라이언트"""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self._idle: list[tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+
+    async def get(self, path: str) -> tuple[int, str, str]:
+        """(상태 코드, X-Served-By, LB가 직접 답한 에러 응답의 "error" 값 — 아니면 "") 반환"""
+        if self._idle:
+            reader, writer = self._idle.pop()
+        else:
+            reader, writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            writer.write(f"GET {path} HTTP/1.1\r\nHost: {self.host}\r\n\r\n".encode())
+            head = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1").split("\r\n")
+            status = int(head[0].split(" ", 2)[1])
+            headers = {}
+            for line in head[1:]:
+                k, _, v = line.partition(":")
+                headers[k.strip().lower()] = v.strip()
+            body = await reader.readexactly(int(headers.get("content-length", 0)))
+        except BaseException:
+            writer.close()
+            raise
+        if headers.get("connection", "").lower() == "close":
+            writer.close()      # 스레드 모드 LB는 응답마다 연결을 닫는다
+        else:
+            self._idle.append((reader, writer))
+        error = ""
+        if status >= 500 and "x-served-by" not in headers:
+            try:
+                error = json.loads(body).get("error", "")
+            except (ValueError, AttributeError):
+                pass
+        return status, headers.get("x-served-by", "-"), error
+
+    def close(self):
+        for _, writer in self._idle:
+            writer.close()
+
+
+class LoadStats:
+    def __init__(self):
+        self.latencies: list[float] = []
+        self.errors = 0
+        self.dropped = 0        # open-loop: 동시 요청 상한에 걸려 보내지 못한 요청
+        self.shed = 0           # LB가 즉시 503으로 거절 (--adaptive 부하 차단)
+        self.no_backend = 0     # LB가 보낼 백엔드가 없어 503 (헬스체크 탈락 / 서킷 OPEN)
+        self.served = Counter()
+
+    async def one(self, client: LoadClient, path: str, scheduled: float, timeout: float):
+        """요청 하나. 지연은 예정 시각부터 잰다 (open-loop에서 밀린 시간도 지연으로 포함)"""
+        loop = asyncio.get_running_loop()
+        try:
+            status, served_by, error = await asyncio.wait_for(client.get(path), timeout)
+            if status == 503 and error == "Overloaded":
+                self.shed += 1
+            elif status == 503 and error in ("No healthy backends", "No available backends"):
+                self.no_backend += 1
+            elif status >= 500:
+                self.errors += 1
+            self.served[served_by] += 1
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError,
+                asyncio.LimitOverrunError, ValueError, IndexError):
+            self.errors += 1
+        self.latencies.append(loop.time() - scheduled)
+
+
+async def closed_loop(client: LoadClient, stats: LoadStats, concurrency: int,
+                      duration: float, timeout: float):
+    """작업자 concurrency개가 응답을 받자마자 다음 요청 (처리량 한계 측정)"""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + duration
+    counter = itertools.count()
+
+    async def worker():
+        while loop.time() < deadline:
+            await stats.one(client, f"/item/{next(counter) % 1000}", loop.time(), timeout)
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+
+async def open_loop(client: LoadClient, stats: LoadStats, rps: float, duration: float,
+                    max_in_flight: int, timeout: float):
+    """응답과 무관하게 일정한 속도로 요청 (서버가 밀리면 지연이 그대로 드러남)"""
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    in_flight: set[asyncio.Task] = set()
+    for k in range(int(rps * duration)):
+        scheduled = start + k / rps
+        delay = scheduled - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if len(in_flight) >= max_in_flight:
+            stats.dropped += 1
+            continue
+        task = asyncio.create_task(stats.one(client, f"/item/{k % 1000}", scheduled, timeout))
+        in_flight.add(task)
+        task.add_done_callback(in_flight.discard)
+    if in_flight:
+        await asyncio.gather(*in_flight)
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(int(q * len(sorted_values)), len(sorted_values) - 1)]
+
+
+def run_load(algo: str, args) -> dict:
+    ready = multiprocessing.Event()
+    proc = multiprocessing.Process(
+        target=serve_stack,             # daemon이면 워커를 fork할 수 없다 → finally에서 직접 종료
+        args=(algo, args.mode, args.port, args.backends, args.slow, args.workers,
+              {"hedge": args.hedge, "max_retries": args.retries, "adaptive": args.adaptive},
+              ready))
+    proc.start()
+    try:
+        if not ready.wait(10):
+            raise RuntimeError("LB 프로세스가 시작되지 않음")
+
+        async def drive() -> tuple[LoadStats, float]:
+            client = LoadClient("localhost", args.port)
+            stats = LoadStats()
+            start = time.perf_counter()
+            if args.rps:
+                await open_loop(client, stats, args.rps, args.duration, args.concurrency,
+                                args.timeout)
+            else:
+                await closed_loop(client, stats, args.concurrency, args.duration, args.timeout)
+            elapsed = time.perf_counter() - start
+            client.close()
+            return stats, elapsed
+
+        stats, elapsed = asyncio.run(drive())
+    finally:
+        proc.terminate()
+        proc.join()
+
+    lat = sorted(stats.latencies)
+    total = len(lat)
+    return {
+        "algorithm": algo,
+        "requests": total,
+        "errors": stats.errors,
+        "error_rate": stats.errors / total if total else 0.0,
+        "dropped": stats.dropped,
+        "shed": stats.shed,
+        "no_backend": stats.no_backend,
+        "elapsed_s": elapsed,
+        "throughput_rps": total / elapsed if elapsed else 0.0,
+        "latency_ms": {
+            "mean": statistics.fmean(lat) * 1000 if lat else 0.0,
+            "p50": percentile(lat, 0.50) * 1000,
+            "p95": percentile(lat, 0.95) * 1000,
+            "p99": percentile(lat, 0.99) * 1000,
+            "max": lat[-1] * 1000 if lat else 0.0,
+        },
+        "backends": dict(sorted(stats.served.items())),
+    }
+
+
+def bench_load(args):
+    kind = f"open-loop {args.rps:g} req/s" if args.rps else f"closed-loop 동시 {args.concurrency}"
+    print(f"\n[부하 테스트] {args.mode} 데이터 플레인 × 워커 {args.workers}, 백엔드 {args.backends}개 "
+          f"(느림 {args.slow}개), {kind}, {args.duration:g}초"
+          + (", 헤징" if args.hedge else "") + (", 부하 차단" if args.adaptive else ""))
+    print(f"  {'알고리즘':<17}{'요청':>8}{'req/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}"
+          f"{'에러':>7}  백엔드 분산")
+
+    results = []
+    for algo in args.algos:
+        r = run_load(algo, args)
+        results.append(r)
+        lat = r["latency_ms"]
+        share = " ".join(f"{n / r['requests'] * 100:.0f}%" for n in r["backends"].values())
+        print(f"  {algo:<17}{r['requests']:>8,}{r['throughput_rps']:>9,.0f}"
+              f"{lat['p50']:>7.1f}ms{lat['p95']:>7.1f}ms{lat['p99']:>7.1f}ms"
+              f"{r['error_rate'] * 100:>6.1f}%  {share}"
+              + (f"  (보내지 못함 {r['dropped']:,})" if r["dropped"] else "")
+              + (f"  (503 거절 {r['shed']:,})" if r["shed"] else "")
+              + (f"  (백엔드 없음 503 {r['no_backend']:,})" if r["no_backend"] else ""))
+
+    if args.json:
+        config = {k: getattr(args, k) for k in
+                  ("mode", "workers", "backends", "slow", "concurrency", "rps", "duration",
+                   "timeout", "hedge", "retries", "adaptive")}
+        with open(args.json, "w") as f:
+            json.dump({"config": config, "results": results}, f, indent=2, ensure_ascii=False)
+        print(f"\n  JSON 저장: {args.json}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lab 09 - 로드 밸런서 벤치마크")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("pick", help="백엔드 선택 마이크로 벤치마크")
+    p.add_argument("--sizes", type=int, nargs="+", default=[10, 1_000, 10_000])
+    p.add_argument("--duration", type=float, default=0.5, help="측정 시간 (초, 항목별)")
+    p.add_argument("--in-flight", type=int, default=64, help="동시에 처리 중인 요청 수")
+
+    p = sub.add_parser("ring", help="일관 해시 키 재배치/분포 측정")
+    p.add_argument("--backends", type=int, default=10)
+    p.add_argument("--keys", type=int, default=100_000)
+    p.add_argument("--vnodes", type=int, default=160)
+
+    p = sub.add_parser("metrics", help="요청 카운터 비용/정확성 측정")
+    p.add_argument("--threads", type=int, default=8)
+    p.add_argument("--requests", type=int, default=200_000, help="스레드당 요청 수")
+
+    p = sub.add_parser("load", help="end-to-end 부하 테스트 (알고리즘별)")
+    p.add_argument("--mode", choices=["thread", "async"], default="async")
+    p.add_argument("--algos", nargs="+", default=list(ALGORITHMS), choices=list(ALGORITHMS))
+    p.add_argument("--backends", type=int, default=3)
+    p.add_argument("--slow", type=int, default=1, help="느린 백엔드 수 (0.1~0.5초 응답)")
+    p.add_argument("--concurrency", type=int, default=32,
+                   help="closed-loop: 동시 요청 수 / open-loop: 동시 요청 상한")
+    p.add_argument("--rps", type=float, default=0, help="지정하면 open-loop (초당 요청 수)")
+    p.add_argument("--duration", type=float, default=5.0, help="알고리즘별 측정 시간 (초)")
+    p.add_argument("--timeout", type=float, default=10.0, help="요청 하나 응답 대기 한도 (초)")
+    p.add_argument("--workers", type=int, default=1, help="LB 워커 프로세스 수 (pre-fork)")
+    p.add_argument("--hedge", action="store_true", help="LB 헤징 켜기 (p95 초과 시 두 번째 요청)")
+    p.add_argument("--retries", type=int, default=1, help="LB 연결 실패 재시도 횟수")
+    p.add_argument("--adaptive", action="store_true",
+                   help="LB 적응형 동시성 한도 (넘치면 즉시 503 + Retry-After)")
+    p.add_argument("--port", type=int, default=18888, help="LB 포트 (백엔드는 +1부터)")
+    p.add_argument("--json", help="결과를 JSON 파일로 저장 (회귀 추적용)")
+
+    args = parser.parse_args()
+    if args.command == "pick":
+        bench_pick(args.sizes, args.duration, args.in_flight)
+    elif args.command == "ring":
+        bench_ring(args.backends, args.keys, args.vnodes)
+    elif args.command == "metrics":
+        bench_metrics(args.threads, args.requests)
+    elif args.command == "load":
+        bench_load(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,23 +2,128 @@
 """
 Lab 09 - 로드 밸런서 직접 구현
 
-Round Robin, Weighted Round Robin, Least Connections 알고리즘
-헬스체크 + 자동 서버 제외/복구
+Round Robin, (Smooth) Weighted Round Robin, Weighted Random, Least Connections,
+Power of Two Choices, Peak EWMA, Least Outstanding × Latency, Consistent Hash 알고리즘
+헬스체크(동시 프로브 + 수동 감지) + 자동 서버 제외/복구
 
 실행:
-    python3 load_balancer.py
+    python3 load_balancer.py                # 기본: ThreadingHTTPServer 데이터 플레인
+    python3 load_balancer.py --mode async   # asyncio 이벤트 루프 데이터 플레인
+    python3 load_balancer.py --workers 4    # 워커 프로세스 4개 (SO_REUSEPORT, 공유 메모리 카운터)
+    python3 load_balancer.py --cache 64     # 응답 캐시 64MB (Cache-Control/ETag, single-flight)
+    python3 load_balancer.py --adaptive     # 적응형 동시성 한도, 과부하 시 즉시 503 + Retry-After
+    python3 load_balancer.py --breaker      # 백엔드별 서킷 브레이커 (circuit_breaker.py)
+    curl -s http://localhost:8888/admin/backends   # 관리 API (백엔드 추가/drain/삭제, 가중치, 루프백에서만)
 
 다른 터미널에서 테스트:
     for i in $(seq 1 20); do curl -s http://localhost:8888/; done
+    curl -s http://localhost:8888/metrics   # Prometheus 형식 지표 (p50/p95/p99 포함)
 """
 
+import argparse
+import asyncio
+import http.client
 import http.server
-import urllib.request
 import threading
 import time
 import random
+import bisect
+import concurrent.futures
+import functools
+import hashlib
+import ipaddress
+import itertools
+import math
 import json
-from collections import deque
+import multiprocessing
+import select
+import socket
+import sys
+from collections import OrderedDict, deque
+
+from circuit_breaker import BreakerRegistry, CircuitBreaker, State
+
+
+# ── 지연 히스토그램 ───────────────────────────────────────
+#
+# 구간 경계가 로그 간격(2배마다 8칸, 구간 폭 약 9%)이라
+# 10µs부터 수 분까지를 고정 크기 배열 하나로 담으면서 상대 오차가 일정하다.
+# 기록 = 경계 이진 탐색(C 구현 bisect) + 락 안에서 값 세 개 갱신 → 요청마다 호출해도 부담이 작다.
+
+class LatencyHistogram:
+    MIN = 1e-5          # 10µs 이하는 첫 칸
+    SUB = 8             # 2배 구간 하나를 나누는 칸 수
+    OCTAVES = 24        # 10µs × 2^24 ≈ 168초까지 (넘으면 마지막 칸)
+    BOUNDS: list[float] = []     # 칸 i의 상한 = MIN × 2^(i/SUB) (클래스 정의 뒤에 채움)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        i = bisect.bisect_left(self.BOUNDS, seconds)
+        with self._lock:
+            self.counts[i] += 1
+            self.count += 1
+            self.sum += seconds
+
+    def snapshot(self) -> tuple[list[int], int, float]:
+        with self._lock:
+            return self.counts[:], self.count, self.sum
+
+    @staticmethod
+    def merge(hists) -> tuple[list[int], int, float]:
+        """여러 히스토그램을 합친 스냅샷 (quantile(q, snap)에 그대로 넘길 수 있음)"""
+        counts, count, total = [0] * (len(LatencyHistogram.BOUNDS) + 1), 0, 0.0
+        for h in hists:
+            c, n, s = h.snapshot()
+            counts = [a + b for a, b in zip(counts, c)]
+            count += n
+            total += s
+        return counts, count, total
+
+    def quantile(self, q: float, snap=None) -> float:
+        """q 분위수 (칸 상한으로 근사, 상대 오차 ≤ 약 9%). 기록이 없으면 0"""
+        return self.quantile_of(snap or self.snapshot(), q)
+
+    @classmethod
+    def quantile_of(cls, snap: tuple[list[int], int, float], q: float) -> float:
+        counts, count, _ = snap
+        if count == 0:
+            return 0.0
+        rank = q * count
+        seen = 0
+        for i, c in enumerate(counts):
+            seen += c
+            if seen >= rank and c:
+                break
+        return cls.BOUNDS[min(i, len(cls.BOUNDS) - 1)]   # 범위 초과 칸은 마지막 경계로
+
+    def buckets(self, snap=None) -> list[tuple[float, int]]:
+        """Prometheus용 누적 구간 [(le, 누적 개수)] — 2배 경계로 묶어 노출"""
+        counts, _, _ = snap or self.snapshot()
+        out, seen = [], 0
+        for i, bound in enumerate(self.BOUNDS):
+            seen += counts[i]
+            if i % self.SUB == 0:
+                out.append((bound, seen))
+        return out
+
+
+LatencyHistogram.BOUNDS = [LatencyHistogram.MIN * 2 ** (i / LatencyHistogram.SUB)
+                           for i in range(LatencyHistogram.SUB * LatencyHistogram.OCTAVES + 1)]
+
+
+def format_percentiles(hist: LatencyHistogram) -> str:
+    snap = hist.snapshot()
+    return " ".join(f"p{int(q * 100)}={hist.quantile(q, snap) * 1000:.1f}ms"
+                    for q in (0.5, 0.95, 0.99))
+
+
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+CIRCUIT_GAUGE = {State.CLOSED: 0, State.HALF_OPEN: 1, State.OPEN: 2}
 
 
 # ── 백엔드 서버 정의 ──────────────────────────────────────
@@ -27,166 +132,2794 @@ class Backend:
     def __init__(self, host: str, port: int, weight: int = 1):
         self.host = host
         self.port = port
-        self.weight = weight
-        self.active_connections = 0
-        self.total_requests = 0
-        self.total_errors = 0
-        self.healthy = True
+        self._weight = weight
+        # 카운터 [처리 중, 누적 요청, 누적 에러, 건강(1/0)]
+        # 평소엔 리스트, --workers 모드에선 공유 메모리 뷰 (share() 참고)
+        self._counters = [0, 0, 0, 1]
+        self._healthy = True
+        self._draining = False             # 관리 API drain: 새 요청만 받지 않음
         self.last_check = 0
-        self._lock = threading.Lock()
+        self._lock = threading.Lock()      # 요청 카운터 보호 (begin/end_request, record_error)
+        # keep-alive 커넥션 풀 (LoadBalancer가 연결: 스레드용 / asyncio용)
+        self.pool: 'ConnectionPool | None' = None
+        self.apool: 'AsyncConnectionPool | None' = None
+        # 상태 변화 구독자 (LoadBalancer) — on_health_change / on_load_change
+        self._watchers: list = []
+        # 응답 시간 추적 (초) — 지연 인지 알고리즘용
+        self.latency_ewma = 0.0           # 일반 EWMA: 최근 응답일수록 비중 큼
+        self._peak_ewma = 0.0             # Peak EWMA: 튀면 즉시 올라가고 천천히 내려옴
+        self._peak_stamp = time.monotonic()
+        self.latency = LatencyHistogram()  # p50/p95/p99 용 (/metrics, status)
+        # 동시성 한도 (LoadBalancer(adaptive=True)가 연결, None = 제한 없음)
+        self.limit: AdaptiveLimit | None = None
+        # 서킷 브레이커 (LoadBalancer(breaker=True)가 연결) — OPEN이면 선택 후보에서 빠진다
+        self.breaker: CircuitBreaker | None = None
+        self._breaker_seen = State.CLOSED   # 이 프로세스가 마지막으로 반영한 서킷 상태
+
+    @property
+    def healthy(self) -> bool:
+        return self._healthy
+
+    @healthy.setter
+    def healthy(self, value: bool):
+        # 실제로 바뀔 때만 알림 → 건강한 백엔드 목록은 상태가 뒤집힐 때만 다시 만든다
+        if value != self._healthy:
+            self._healthy = value
+            self._counters[HEALTHY] = int(value)
+            for w in self._watchers:
+                w.on_health_change(self)
+
+    @property
+    def draining(self) -> bool:
+        return self._draining
+
+    @draining.setter
+    def draining(self, value: bool):
+        if value != self._draining:
+            self._draining = value
+            for w in self._watchers:
+                w.on_health_change(self)    # 선택 후보에서 빠지는 것은 장애와 같다
+
+    @property
+    def available(self) -> bool:
+        """새 요청을 받을 수 있는가 (건강 + drain 중 아님 + 서킷 OPEN 아님)"""
+        return (self._healthy and not self._draining
+                and (self.breaker is None or self.breaker.state != State.OPEN))
+
+    def on_breaker_change(self, old: State, new: State):
+        """CircuitBreaker.on_state_change — OPEN에 들어가거나 나올 때만 후보 집합이 바뀐다"""
+        self._breaker_seen = new
+        if (old == State.OPEN) != (new == State.OPEN):
+            for w in self._watchers:
+                w.on_health_change(self)
+        if new == State.OPEN:
+            # OPEN 백엔드에는 요청이 오지 않으므로 HALF_OPEN 전환은 타이머가 깨운다
+            timer = threading.Timer(self.breaker.timeout + 0.01, self.breaker.poll)
+            timer.daemon = True
+            timer.start()
+
+    def release_trial(self):
+        """LoadBalancer.pick이 예약한 서킷 허가를 결과 없이 반납 (보내지 않았거나 응답을 버린 요청)"""
+        if self.breaker is not None:
+            self.breaker.release()
+
+    def sync_breaker(self):
+        """다른 워커가 바꾼 서킷 상태(공유 레지스트리)를 이 프로세스의 후보 집합에 반영"""
+        state = self.breaker.state
+        if state != self._breaker_seen:
+            self.on_breaker_change(self._breaker_seen, state)
+
+    @property
+    def weight(self) -> int:
+        return self._weight
+
+    @weight.setter
+    def weight(self, value: int):
+        if value < 0:
+            raise ValueError(f"weight must be >= 0 (got {value})")
+        if value != self._weight:
+            self._weight = value
+            for w in self._watchers:
+                w.on_weight_change(self)
+
+    @property
+    def active_connections(self) -> int:
+        return self._counters[ACTIVE]
+
+    @active_connections.setter
+    def active_connections(self, value: int):
+        self._counters[ACTIVE] = value
+        for w in self._watchers:
+            w.on_load_change(self)
+
+    @property
+    def total_requests(self) -> int:
+        return self._counters[REQUESTS]
+
+    @total_requests.setter
+    def total_requests(self, value: int):
+        self._counters[REQUESTS] = value
+
+    @property
+    def total_errors(self) -> int:
+        return self._counters[ERRORS]
+
+    @total_errors.setter
+    def total_errors(self, value: int):
+        self._counters[ERRORS] = value
+
+    def share(self, shared: 'SharedBackendStats', slot: int):
+        """카운터와 건강 상태를 공유 메모리로 옮긴다 (fork 전에 호출 → 모든 워커가 같은 값을 본다)"""
+        view = shared.slot(slot)
+        for i, v in enumerate(self._counters):
+            view[i] = v
+        self._counters = view
+        self._lock = shared.locks[slot]     # 프로세스 간 락 (스레드끼리도 그대로 동작)
+
+    # ── 요청 카운터 (데이터 플레인에서 호출) ──
+    # `b.active_connections += 1`은 읽기 → 더하기 → 쓰기라 스레드 사이에서 갱신이 유실된다.
+    # 카운터 변경은 백엔드마다 하나인 락 안에서, 구독자 알림은 락 밖에서 한다.
+    # (구독자는 알림을 받으면 현재 값을 다시 읽으므로 알림 순서가 뒤바뀌어도 결과가 같다)
+
+    def begin_request(self):
+        """요청 시작: 처리 중 연결 +1, 누적 요청 +1"""
+        c = self._counters
+        with self._lock:
+            c[ACTIVE] += 1
+            c[REQUESTS] += 1
+        for w in self._watchers:
+            w.on_load_change(self)
+
+    def end_request(self):
+        """요청 종료: 처리 중 연결 -1"""
+        with self._lock:
+            self._counters[ACTIVE] -= 1
+        for w in self._watchers:
+            w.on_load_change(self)
+
+    def record_error(self):
+        with self._lock:
+            self._counters[ERRORS] += 1
+        if self.limit is not None:
+            self.limit.drop()
+
+    # EWMA 계수: 새 측정값 비중 30%
+    LATENCY_ALPHA = 0.3
+    # Peak EWMA 감쇠 시간 상수 (초): 이 시간 동안 측정이 없으면 약 63% 잊는다
+    PEAK_DECAY = 10.0
+
+    def record_latency(self, seconds: float):
+        """백엔드 응답 시간 기록 (요청 전송 ~ 응답 헤더 수신)"""
+        self.latency.record(seconds)
+        if self.limit is not None:
+            self.limit.update(seconds, self.active_connections)
+        if self.latency_ewma == 0.0:
+            self.latency_ewma = seconds
+        else:
+            self.latency_ewma += self.LATENCY_ALPHA * (seconds - self.latency_ewma)
+
+        now = time.monotonic()
+        decayed = self._decayed_peak(now)
+        # 느려지면 즉시 반영(peak), 빨라지면 시간에 따라 서서히 반영
+        if seconds > decayed:
+            self._peak_ewma = seconds
+        else:
+            w = math.exp(-(now - self._peak_stamp) / self.PEAK_DECAY)
+            self._peak_ewma = decayed * w + seconds * (1 - w)
+        self._peak_stamp = now
+
+    def _decayed_peak(self, now: float) -> float:
+        return self._peak_ewma * math.exp(-(now - self._peak_stamp) / self.PEAK_DECAY)
+
+    @property
+    def peak_ewma(self) -> float:
+        """측정이 끊기면 0으로 감쇠 → 한동안 안 쓰인 백엔드도 다시 시험받는다"""
+        return self._decayed_peak(time.monotonic())
 
     @property
     def addr(self):
         return f"{self.host}:{self.port}"
 
     def __repr__(self):
-        status = "✅" if self.healthy else "❌"
-        return (f"{status} {self.addr} "
+        status = ("⏳" if self.draining else "✅") if self.healthy else "❌"
+        circuit = f", cb={self.breaker.state.name}" if self.breaker is not None else ""
+        return (f"{status} {self.addr}{circuit} "
                 f"(conn={self.active_connections}, "
                 f"req={self.total_requests}, "
-                f"err={self.total_errors})")
+                f"err={self.total_errors}, "
+                f"ewma={self.latency_ewma * 1000:.1f}ms)")
+
+
+# ── 멀티 프로세스 공유 상태 (--workers) ───────────────────
+#
+# 워커 프로세스마다 LoadBalancer가 따로 있으면 LeastConnections는 자기 프로세스의
+# 연결 수만 보고 고른다. 카운터를 공유 메모리에 두면 모든 워커가 전체 연결 수를 본다.
+# 공유 메모리의 변화는 로컬 구독자에게 알림이 가지 않으므로
+# LoadBalancer.sync_shared()가 주기적으로 다시 읽어 선택 알고리즘에 반영한다.
+
+ACTIVE, REQUESTS, ERRORS, HEALTHY = range(4)
+
+
+class SharedBackendStats:
+    """백엔드마다 int64 4칸 [처리 중, 요청, 에러, 건강] + 프로세스 간 락 하나"""
+    FIELDS = 4
+
+    def __init__(self, n: int):
+        ctx = multiprocessing.get_context("fork")
+        self._array = ctx.RawArray("q", n * self.FIELDS)
+        self.locks = [ctx.Lock() for _ in range(n)]
+
+    def slot(self, i: int) -> memoryview:
+        """i번째 백엔드 칸의 뷰 (인덱스 읽기/쓰기가 공유 메모리에 바로 반영)"""
+        view = memoryview(self._array).cast("B").cast("q")
+        return view[i * self.FIELDS:(i + 1) * self.FIELDS]
+
+
+# ── 백엔드 커넥션 풀 (HTTP/1.1 keep-alive) ────────────────
+#
+# 요청마다 새 TCP 연결 = 매번 3-way handshake + 종료 시 TIME_WAIT
+# 한 번 맺은 연결을 반납받아 다음 요청에 재사용하면 connect() 비용이 사라진다.
+#
+#   max_idle        : 풀에 보관할 유휴 연결 최대 개수 (초과분은 닫음)
+#   max_per_backend : 백엔드 하나에 동시에 열 수 있는 연결 최대 개수 (대여 중 + 유휴)
+#   idle_timeout    : 이 시간 이상 놀던 연결은 서버가 이미 닫았을 수 있으므로 버림
+
+class _PoolBase:
+    """유휴 연결 보관/만료 처리와 통계 (스레드용/asyncio용 풀의 공통 부분)"""
+
+    def __init__(self, host: str, port: int, max_idle: int = 8,
+                 max_per_backend: int = 64, idle_timeout: float = 30.0):
+        self.host = host
+        self.port = port
+        self.max_idle = max_idle
+        self.max_per_backend = max_per_backend
+        self.idle_timeout = idle_timeout
+
+        self._idle: deque = deque()   # (연결, 반납 시각) — 오른쪽이 가장 최근
+        self._in_use = 0
+        self.hits = 0        # 유휴 연결 재사용
+        self.misses = 0      # 새 연결 생성
+        self.evicted = 0     # idle_timeout 만료 / 끊긴 연결 폐기
+
+    def _alive(self, conn) -> bool:
+        return True
+
+    def _close(self, conn):
+        raise NotImplementedError
+
+    def _take(self):
+        """유휴 연결 하나를 대여 (없으면 None). 만료/끊긴 연결은 여기서 정리"""
+        now = time.monotonic()
+        while self._idle and now - self._idle[0][1] >= self.idle_timeout:
+            self._close(self._idle.popleft()[0])
+            self.evicted += 1
+        while self._idle:
+            # LIFO: 가장 최근에 반납된 연결이 살아있을 가능성이 가장 높다
+            conn, _ = self._idle.pop()
+            if self._alive(conn):
+                self._in_use += 1
+                self.hits += 1
+                return conn
+            self._close(conn)
+            self.evicted += 1
+        return None
+
+    def _reserve_new(self) -> bool:
+        """새 연결을 열 자리가 있으면 예약"""
+        if self._in_use + len(self._idle) >= self.max_per_backend:
+            return False
+        self._in_use += 1
+        self.misses += 1
+        return True
+
+    def _put_back(self, conn, reusable: bool):
+        self._in_use -= 1
+        if reusable and len(self._idle) < self.max_idle:
+            self._idle.append((conn, time.monotonic()))
+        else:
+            self._close(conn)
+
+    def _retire(self):
+        """백엔드가 빠질 때: 유휴 연결을 닫고 이후 반납되는 연결도 닫는다"""
+        self.max_idle = 0
+        while self._idle:
+            self._close(self._idle.popleft()[0])
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits, "misses": self.misses, "evicted": self.evicted,
+            "idle": len(self._idle), "in_use": self._in_use,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+class ConnectionPool(_PoolBase):
+    """스레드 데이터 플레인(LBHandler)용 http.client 커넥션 풀"""
+
+    def __init__(self, host: str, port: int, connect_timeout: float = 5.0, **limits):
+        super().__init__(host, port, **limits)
+        self.connect_timeout = connect_timeout
+        self._cond = threading.Condition()
+
+    def _alive(self, conn: http.client.HTTPConnection) -> bool:
+        # 유휴 소켓이 "읽을 게 있다" = 서버가 FIN을 보냈다 (keep-alive 타임아웃 등)
+        if conn.sock is None:
+            return True
+        readable, _, _ = select.select([conn.sock], [], [], 0)
+        return not readable
+
+    def _close(self, conn: http.client.HTTPConnection):
+        conn.close()
+
+    def acquire(self, timeout: float = 5.0) -> tuple[http.client.HTTPConnection, bool]:
+        """(연결, 재사용 여부) 반환. max_per_backend에 걸리면 반납될 때까지 대기"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                conn = self._take()
+                if conn is not None:
+                    return conn, True
+                if self._reserve_new():
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._cond.wait(remaining):
+                    raise TimeoutError(f"connection pool exhausted ({self.host}:{self.port})")
+        # 실제 connect()는 첫 request() 때 일어난다
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.connect_timeout), False
+
+    def release(self, conn: http.client.HTTPConnection, reusable: bool):
+        with self._cond:
+            self._put_back(conn, reusable)
+            self._cond.notify()
+
+    def retire(self):
+        with self._cond:
+            self._retire()
+
+
+class AsyncConnectionPool(_PoolBase):
+    """asyncio 데이터 플레인(AsyncLBServer)용 (StreamReader, StreamWriter) 풀
+
+    이벤트 루프 스레드 안에서만 쓰이므로 lock 없이 대기자 Future 큐만 둔다.
+    """
+
+    def __init__(self, host: str, port: int, **limits):
+        super().__init__(host, port, **limits)
+        self._waiters: deque[asyncio.Future] = deque()
+        self._loop: asyncio.AbstractEventLoop | None = None   # 이 풀을 쓰는 루프 (retire용)
+
+    def _alive(self, conn) -> bool:
+        reader, writer = conn
+        return not (reader.at_eof() or writer.is_closing())
+
+    def _close(self, conn):
+        conn[1].close()
+
+    async def acquire(self, timeout: float = 5.0):
+        """((reader, writer), 재사용 여부) 반환"""
+        loop = self._loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            conn = self._take()
+            if conn is not None:
+                return conn, True
+            if self._reserve_new():
+                break
+            waiter = loop.create_future()
+            self._waiters.append(waiter)
+            try:
+                await asyncio.wait_for(waiter, deadline - loop.time())
+            except asyncio.TimeoutError:
+                raise TimeoutError(f"connection pool exhausted ({self.host}:{self.port})") from None
+            finally:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+        try:
+            return await asyncio.open_connection(self.host, self.port), False
+        except BaseException:
+            self._in_use -= 1
+            self._wake()
+            raise
+
+    def release(self, conn, reusable: bool):
+        self._put_back(conn, reusable)
+        self._wake()
+
+    def retire(self):
+        """다른 스레드(관리 API)에서 호출 → 연결 정리는 루프 스레드에서"""
+        self.max_idle = 0
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._retire)
+
+    def _wake(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+
+
+# ── 건강한 백엔드 목록 ────────────────────────────────────
+#
+# 예전에는 pick()마다 [b for b in backends if b.healthy] 로 리스트를 새로 만들었다.
+# → 요청마다 O(N) + 리스트 할당. 백엔드 1만 개면 요청 하나에 1만 번 검사
+# 건강 상태는 헬스체크가 뒤집을 때만 바뀌므로, 그때만 튜플을 새로 만들어 교체한다.
+# (copy-on-write: 읽는 쪽은 참조 하나만 읽으면 되므로 lock이 필요 없다)
+
+class HealthySet:
+    def __init__(self, backends: tuple[Backend, ...]):
+        self._backends = backends
+        self._lock = threading.Lock()          # 쓰기(재구성)끼리만 직렬화
+        self.members: tuple[Backend, ...] = tuple(b for b in backends if b.available)
+        self.version = 0
+
+    def refresh(self):
+        with self._lock:
+            self.members = tuple(b for b in self._backends if b.available)
+            self.version += 1
+
+    def replace(self, backends: tuple[Backend, ...]):
+        """백엔드 구성 자체가 바뀜 (관리 API 추가/삭제)"""
+        with self._lock:
+            self._backends = backends
+        self.refresh()
+
+
+# ── 로드 밸런싱 알고리즘 ──────────────────────────────────
+#
+# pick()은 HealthySet을 받는다. 상태 변화가 필요한 알고리즘은
+# on_health_change / on_load_change 로 알림을 받아 자료구조를 갱신한다.
+
+class RequestInfo:
+    """알고리즘이 참고할 수 있는 요청 정보 (두 데이터 플레인 공통)"""
+    __slots__ = ("method", "path", "client_ip", "_headers")
+
+    def __init__(self, method: str, path: str, client_ip: str, headers):
+        self.method = method
+        self.path = path
+        self.client_ip = client_ip
+        self._headers = headers     # http.server의 Message 또는 [(이름, 값), ...]
+
+    def header(self, name: str) -> str | None:
+        if isinstance(self._headers, list):
+            return header_value(self._headers, name)
+        return self._headers.get(name)
+
+
+class Picker:
+    def reset(self, healthy: HealthySet):
+        """LoadBalancer에 연결될 때 한 번 호출"""
+
+    def on_health_change(self, backend: Backend):
+        pass
+
+    def on_load_change(self, backend: Backend):
+        pass
+
+    def on_weight_change(self, backend: Backend):
+        pass
+
+    def pick(self, healthy: HealthySet, req: 'RequestInfo | None' = None) -> Backend | None:
+        raise NotImplementedError
+
+
+class RoundRobin(Picker):
+    """순서대로 돌아가며 분배 — lock 없이 O(1)"""
+    def __init__(self):
+        # itertools.count의 next()는 C 구현이라 GIL 아래에서 원자적
+        self._counter = itertools.count()
+
+    def pick(self, healthy: HealthySet, req: 'RequestInfo | None' = None) -> Backend | None:
+        members = healthy.members          # 스냅샷 참조 하나만 읽음
+        if not members:
+            return None
+        return members[next(self._counter) % len(members)]
+
+
+class WeightedRoundRobin(Picker):
+    """가중치에 비례해서 분배 — nginx smooth weighted round-robin
+
+    가중치 A:3 B:2 C:1 → A B A C B A  (A A A B B C 처럼 한 서버로 몰리지 않음)
+    선택할 때마다: 모든 백엔드 current += weight → current가 가장 큰 백엔드 선택
+                   → 선택된 백엔드 current -= 가중치 총합
+    큐를 미리 만들지 않으므로 가중치/헬스 변화가 바로 다음 선택부터 반영된다.
+    선택 비용 O(N), 할당 없음 (백엔드가 수천 개면 WeightedRandom의 O(1)이 유리)
+    """
+    def __init__(self):
+        self._members: tuple[Backend, ...] = ()
+        self._weights: list[int] = []      # members와 같은 순서
+        self._current: list[int] = []
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def _sync(self, members: tuple[Backend, ...]):
+        """헬스 상태가 바뀌어 스냅샷이 교체됐을 때만 호출 (lock 안에서)"""
+        old = dict(zip(self._members, self._current))
+        self._members = members
+        self._weights = [b.weight for b in members]
+        # 계속 살아있던 백엔드는 current 유지, 복구된 백엔드는 0부터 (몰아받지 않도록)
+        self._current = [old.get(b, 0) for b in members]
+        self._total = sum(self._weights)
+
+    def on_weight_change(self, backend: Backend):
+        with self._lock:
+            if backend in self._members:
+                self._weights[self._members.index(backend)] = backend.weight
+                self._total = sum(self._weights)
+
+    def pick(self, healthy: HealthySet, req: 'RequestInfo | None' = None) -> Backend | None:
+        members = healthy.members
+        if not members:
+            return None
+        with self._lock:
+            if members is not self._members:
+                self._sync(members)
+            current, weights = self._current, self._weights
+            best, best_cw = 0, current[0] + weights[0]
+            current[0] = best_cw
+            for i in range(1, len(current)):
+                cw = current[i] + weights[i]
+                current[i] = cw
+                if cw > best_cw:
+                    best, best_cw = i, cw
+            current[best] = best_cw - self._total
+        return members[best]
+
+
+class WeightedRandom(Picker):
+    """가중치 비례 무작위 선택 — Vose alias table: 선택 O(1), 재구성 O(N)
+
+    백엔드마다 "자기 자신 확률 prob[i] / 나머지는 alias[i]" 칸을 하나씩 만든다.
+    선택 = 칸 하나를 균등하게 고르고 동전 한 번 던지기.
+    헬스/가중치가 바뀔 때만 표를 다시 만들어 통째로 교체한다.
+    """
+    def __init__(self):
+        self._healthy: HealthySet | None = None
+        self._table: tuple = ((), (), ())
+        self._lock = threading.Lock()
+
+    def reset(self, healthy: HealthySet):
+        self._healthy = healthy
+        self._rebuild()
+
+    def on_health_change(self, backend: Backend):
+        self._rebuild()
+
+    def on_weight_change(self, backend: Backend):
+        self._rebuild()
+
+    def _rebuild(self):
+        with self._lock:
+            members = self._healthy.members
+            n = len(members)
+            total = sum(b.weight for b in members)
+            if n == 0 or total == 0:
+                # 가중치가 전부 0이면 균등 분배
+                self._table = (members, [1.0] * n, list(range(n)))
+                return
+            scaled = [b.weight * n / total for b in members]
+            prob, alias = [1.0] * n, list(range(n))
+            small = [i for i, p in enumerate(scaled) if p < 1.0]
+            large = [i for i, p in enumerate(scaled) if p >= 1.0]
+            while small and large:
+                s, g = small.pop(), large.pop()
+                prob[s], alias[s] = scaled[s], g
+                scaled[g] -= 1.0 - scaled[s]
+                (small if scaled[g] < 1.0 else large).append(g)
+            self._table = (members, prob, alias)
+
+    def pick(self, healthy: HealthySet, req: 'RequestInfo | None' = None) -> Backend | None:
+        members, prob, alias = self._table     # 표 스냅샷 (lock 없음)
+        n = len(members)
+        if not n:
+            return None
+        u = random.random() * n
+        i = int(u)
+        return members[i] if u - i < prob[i] else members[alias[i]]
+
+
+class LeastConnections(Picker):
+    """현재 연결 수가 가장 적은 서버 선택 — 선택/갱신 모두 O(1)
+
+    연결 수는 요청마다 ±1씩만 변한다. "연결 수 → 백엔드들" 버킷과 최소 연결 수만
+    기억하면 힙 없이도 최솟값을 바로 찾을 수 있다.
+    버킷 안에서는 먼저 들어온 백엔드부터 고르므로 동점끼리는 돌아가며 선택된다.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets: dict[int, dict[Backend, None]] = {}   # 연결 수 → {백엔드} (삽입 순서 유지)
+        self._count: dict[Backend, int] = {}                 # 백엔드 → 현재 속한 버킷
+        self._min = 0
+
+    def reset(self, healthy: HealthySet):
+        with self._lock:
+            self._buckets.clear()
+            self._count.clear()
+            for b in healthy.members:
+                self._insert(b)
+
+    def _insert(self, b: Backend):
+        c = b.active_connections
+        self._buckets.setdefault(c, {})[b] = None
+        self._count[b] = c
+        if len(self._count) == 1 or c < self._min:
+            self._min = c
+
+    def _discard(self, b: Backend) -> int | None:
+        c = self._count.pop(b, None)
+        if c is not None:
+            bucket = self._buckets[c]
+            del bucket[b]
+            if not bucket:
+                del self._buckets[c]
+        return c
+
+    def on_health_change(self, backend: Backend):
+        with self._lock:
+            if backend.available:
+                if backend not in self._count:
+                    self._insert(backend)
+            elif self._discard(backend) == self._min and self._buckets:
+                self._min = min(self._buckets)    # 드문 경우(장애)에만 O(버킷 수)
+
+    def on_load_change(self, backend: Backend):
+        with self._lock:
+            old = self._count.get(backend)
+            new = backend.active_connections
+            if old is None or old == new:
+                return
+            self._discard(backend)
+            self._buckets.setdefault(new, {})[backend] = None
+            self._count[backend] = new
+            if new < self._min:
+                self._min = new
+            elif old == self._min and old not in self._buckets:
+                # 최소 버킷이 비었다: ±1 변화라면 방금 옮긴 버킷이 새 최솟값
+                self._min = new if new == old + 1 else min(self._buckets)
+
+    def pick(self, healthy: HealthySet, req: 'RequestInfo | None' = None) -> Backend | None:
+        with self._lock:
+            bucket = self._buckets.get(self._min)
+            return next(iter(bucket)) if bucket else None
+
+
+def _two_random(members: tuple[Backend, ...]) -> tuple[Backend, Backend]:
+    """서로 다른 두 백엔드를 무작위로 (O(1), 할당 없음)"""
+    n = len(members)
+    i = random.randrange(n)
+    j = random.randrange(n - 1)
+    if j >= i:
+        j += 1
+    return members[i], members[j]
+
+
+class PowerOfTwoChoices(Picker):
+    """Power of Two Choices (P2C) — 무작위로 둘을 뽑아 연결 수가 적은 쪽
+
+    전체를 훑지 않고(O(1)) 둘만 비교해도 최악의 쏠림이 지수적으로 줄어든다.
+    전체 최솟값을 고르는 least_conn과 달리 모든 LB 인스턴스가
+    같은 "가장 한가한" 서버로 동시에 몰리는 현상(herding)도 없다.
+    """
+    def pick(self, healthy: HealthySet, req: 'RequestInfo | None' = None) -> Backend | None:
+        members = healthy.members
+        if len(members) < 2:
+            return members[0] if members else None
+        a, b = _two_random(members)
+        return a if a.active_connections <= b.active_connections else b
+
+
+class PeakEWMA(Picker):
+    """P2C + Peak EWMA 비용 (Finagle/Linkerd 방식)
+
+    비용 = 응답 시간 peak EWMA × (처리 중 요청 + 1)
+    느린 응답 한 번에 비용이 즉시 뛰어오르므로 Server-C 같은 느린 서버를 빠르게 피한다.
+    """
+    def pick(self, healthy: HealthySet, req: 'RequestInfo | None' = None) -> Backend | None:
+        members = healthy.members
+        if len(members) < 2:
+            return members[0] if members else None
+        a, b = _two_random(members)
+        ca = a.peak_ewma * (a.active_connections + 1)
+        cb = b.peak_ewma * (b.active_connections + 1)
+        if ca == cb:
+            return a if a.active_connections <= b.active_connections else b
+        return a if ca < cb else b
+
+
+class LeastLatencyWeighted(Picker):
+    """처리 중 요청 수 × 평균 응답 시간이 가장 작은 서버 (전체 탐색 O(N))
+
+    least_conn은 "연결 1개짜리 느린 서버"와 "연결 1개짜리 빠른 서버"를 구분하지 못한다.
+    응답 시간으로 가중하면 예상 대기 시간이 가장 짧은 서버를 고르게 된다.
+    아직 측정값이 없는 서버(ewma=0)는 처리 중 요청 수만으로 비교된다.
+    """
+    def pick(self, healthy: HealthySet, req: 'RequestInfo | None' = None) -> Backend | None:
+        best, best_cost, best_active = None, 0.0, 0
+        for b in healthy.members:
+            active = b.active_connections
+            cost = b.latency_ewma * (active + 1)
+            if (best is None or cost < best_cost
+                    or (cost == best_cost and active < best_active)):
+                best, best_cost, best_active = b, cost, active
+        return best
+
+
+def stable_hash(key: str) -> int:
+    """프로세스/재시작과 무관하게 같은 값 (내장 hash()는 실행마다 달라진다)"""
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+class ConsistentHash(Picker):
+    """일관 해시 + 부하 상한 (Consistent Hashing with Bounded Loads)
+
+    링 위에 백엔드마다 가상 노드(vnodes)개의 점을 찍고,
+    요청 키의 해시에서 시계 방향으로 처음 만나는 백엔드로 보낸다.
+      - 같은 키 → 같은 백엔드 (캐시 적중률 ↑)
+      - 백엔드 하나가 빠지면 그 백엔드 몫의 키(약 1/N)만 다음 백엔드로 옮겨 간다
+        복구되면 같은 자리에 다시 점이 찍히므로 키도 원래 백엔드로 돌아온다
+      - 인기 키 하나가 한 서버를 터뜨리지 않도록, 처리 중 요청이
+        평균 × load_factor 를 넘는 백엔드는 건너뛰고 다음 점으로 넘긴다
+
+    key: "path" | "client_ip" | "header:<이름>" (헤더가 없으면 path 사용)
+    load_factor: None이면 부하 상한 없이 순수 일관 해시
+    조회: bisect로 O(log(N × vnodes))
+    """
+    def __init__(self, key: str = "path", vnodes: int = 160,
+                 load_factor: float | None = 1.25):
+        if not (key in ("path", "client_ip") or key.startswith("header:")):
+            raise ValueError(f"unknown hash key: {key!r}")
+        self.key = key
+        self.vnodes = vnodes
+        self.load_factor = load_factor
+        self._lock = threading.Lock()
+        # 링 스냅샷 (hashes 정렬, owners는 같은 인덱스의 백엔드) — 통째로 교체
+        self._ring: tuple[list[int], list[Backend]] = ([], [])
+        self._points: dict[Backend, list[int]] = {}   # 백엔드별 점 (계산 결과 캐시)
+        self._load: dict[Backend, int] = {}           # 링에 있는 백엔드의 처리 중 요청
+        self._total_load = 0
+
+    def _points_of(self, b: Backend) -> list[int]:
+        pts = self._points.get(b)
+        if pts is None:
+            pts = self._points[b] = [stable_hash(f"{b.addr}#{i}") for i in range(self.vnodes)]
+        return pts
+
+    def _build(self, members):
+        ring = sorted(((h, b) for b in members for h in self._points_of(b)),
+                      key=lambda p: p[0])
+        self._ring = ([h for h, _ in ring], [b for _, b in ring])
+
+    def reset(self, healthy: HealthySet):
+        with self._lock:
+            self._build(healthy.members)
+            self._load = {b: b.active_connections for b in healthy.members}
+            self._total_load = sum(self._load.values())
+
+    def on_health_change(self, backend: Backend):
+        with self._lock:
+            hashes, owners = self._ring
+            if backend.available:
+                if backend in self._load:
+                    return
+                # 이미 정렬된 두 목록 합치기 (Timsort가 O(n)에 병합)
+                ring = sorted(list(zip(hashes, owners))
+                              + [(h, backend) for h in self._points_of(backend)],
+                              key=lambda p: p[0])
+                self._ring = ([h for h, _ in ring], [b for _, b in ring])
+                self._load[backend] = backend.active_connections
+                self._total_load += backend.active_connections
+            elif backend in self._load:
+                keep = [i for i, b in enumerate(owners) if b is not backend]
+                self._ring = ([hashes[i] for i in keep], [owners[i] for i in keep])
+                self._total_load -= self._load.pop(backend)
+
+    def on_load_change(self, backend: Backend):
+        with self._lock:
+            old = self._load.get(backend)
+            if old is not None:
+                new = backend.active_connections
+                self._load[backend] = new
+                self._total_load += new - old
+
+    def request_key(self, req: 'RequestInfo | None') -> str:
+        if req is None:
+            return ""
+        if self.key == "client_ip":
+            return req.client_ip
+        if self.key.startswith("header:"):
+            value = req.header(self.key[7:])
+            if value is not None:
+                return value
+        return req.path
+
+    def pick(self, healthy: HealthySet, req: 'RequestInfo | None' = None) -> Backend | None:
+        hashes, owners = self._ring
+        n_points = len(hashes)
+        if not n_points:
+            return None
+        i = bisect.bisect(hashes, stable_hash(self.request_key(req)))
+        first = owners[i % n_points]
+        if self.load_factor is None:
+            return first
+
+        n_backends = len(self._load)
+        # 상한 = ceil(평균 부하 × load_factor), 이번 요청 포함
+        cap = math.ceil((self._total_load + 1) * self.load_factor / max(n_backends, 1))
+        if first.active_connections < cap:
+            return first
+        # 상한 초과 → 시계 방향으로 다음 백엔드 (같은 백엔드의 다른 점은 건너뜀)
+        seen = {first}
+        for step in range(1, n_points):
+            b = owners[(i + step) % n_points]
+            if b in seen:
+                continue
+            if b.active_connections < cap:
+                return b
+            seen.add(b)
+            if len(seen) == n_backends:
+                break
+        return first
+
+
+# ── 헬스체크 ──────────────────────────────────────────────
+
+class HealthChecker(threading.Thread):
+    """능동 + 수동 헬스체크
+
+    능동: 전용 스레드의 이벤트 루프에서 백엔드마다 프로브 코루틴을 돌린다.
+          → 백엔드가 100개여도 한 바퀴 = 타임아웃 1번 (예전: 순차 2초 × 100 = 200초)
+          간격에 ±jitter를 줘서 모든 프로브가 같은 순간에 몰리지 않게 한다.
+    수동: 데이터 플레인이 실제 요청에서 본 5xx/연결 실패를 observe()로 넘긴다.
+          트래픽이 있는 백엔드는 다음 프로브를 기다리지 않고 바로 제외된다.
+
+    rise/fall: 연속 rise번 성공해야 복구, 연속 fall번 실패해야 제외 (한 번 튄 걸로 뒤집지 않음)
+    상태가 불안정하거나(연속 실패 중) 제외된 백엔드는 fast_interval로 더 자주 확인한다.
+    """
+
+    def __init__(self, backends: list[Backend], interval: float = 5, timeout: float = 1.0,
+                 rise: int = 2, fall: int = 3, jitter: float = 0.2,
+                 fast_interval: float = 1.0, max_concurrency: int = 256,
+                 path: str = "/health", lb: 'LoadBalancer | None' = None):
+        super().__init__(daemon=True)
+        self.backends = backends
+        self.interval = interval
+        self.timeout = timeout
+        self.rise = rise
+        self.fall = fall
+        self.jitter = jitter
+        self.fast_interval = min(fast_interval, interval)
+        self.max_concurrency = max_concurrency   # 동시에 열 프로브 연결 수 상한
+        self.path = path
+        self._lock = threading.Lock()
+        self._streaks: dict[Backend, list[int]] = {}   # 백엔드 → [연속 성공, 연속 실패]
+        self._stopped = False
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._tasks: dict[Backend, asyncio.Task] = {}
+        if lb is not None:
+            lb.health = self        # 데이터 플레인의 수동 관찰을 이쪽으로
+
+    def run(self):
+        asyncio.run(self._run())
+
+    def stop(self):
+        self._stopped = True
+
+    async def _run(self):
+        self._sem = asyncio.Semaphore(self.max_concurrency)
+        self._loop = asyncio.get_running_loop()
+        # 시작 시점도 흩어 놓는다 (모든 백엔드를 동시에 찌르지 않도록)
+        for b in self.backends:
+            self._start_probe(b, random.uniform(0, self.interval))
+        while not self._stopped:
+            await asyncio.sleep(self.fast_interval)
+
+    # 관리 API로 백엔드가 추가/삭제될 때 (다른 스레드에서 호출)
+    def watch(self, b: Backend):
+        """새 백엔드 프로브를 바로 시작 (첫 결과 전까지는 Backend 기본값인 건강 상태)"""
+        self.backends = (*self.backends, b)
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._start_probe, b, 0.0)
+
+    def unwatch(self, b: Backend):
+        self.backends = tuple(x for x in self.backends if x is not b)
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._stop_probe, b)
+
+    def _start_probe(self, b: Backend, delay: float):
+        if b not in self._tasks:
+            self._tasks[b] = asyncio.ensure_future(self._probe_loop(b, delay))
+
+    def _stop_probe(self, b: Backend):
+        task = self._tasks.pop(b, None)
+        if task is not None:
+            task.cancel()
+        with self._lock:
+            self._streaks.pop(b, None)
+
+    async def _probe_loop(self, b: Backend, delay: float):
+        await asyncio.sleep(delay)
+        while not self._stopped:
+            async with self._sem:
+                ok = await self._probe(b)
+            b.last_check = time.time()
+            self.observe(b, ok)
+            await asyncio.sleep(self._next_delay(b))
+
+    def _next_delay(self, b: Backend) -> float:
+        streak = self._streaks.get(b)
+        stable = b.healthy and (streak is None or streak[1] == 0)
+        base = self.interval if stable else self.fast_interval
+        return base * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    async def _probe(self, b: Backend) -> bool:
+        try:
+            return await asyncio.wait_for(self._request(b), self.timeout)
+        except (OSError, asyncio.TimeoutError, ValueError):
+            return False
+
+    async def _request(self, b: Backend) -> bool:
+        reader, writer = await asyncio.open_connection(b.host, b.port)
+        try:
+            writer.write(f"GET {self.path} HTTP/1.1\r\nHost: {b.addr}\r\n"
+                         f"Connection: close\r\n\r\n".encode())
+            status_line = await reader.readline()
+        finally:
+            writer.close()
+        parts = status_line.split()
+        return len(parts) >= 2 and parts[1] == b"200"
+
+    def observe(self, b: Backend, ok: bool, passive: bool = False):
+        """프로브 또는 실제 요청 결과 반영. rise/fall 임계에 닿으면 상태 전환"""
+        with self._lock:
+            streak = self._streaks.setdefault(b, [0, 0])
+            if ok:
+                streak[0] += 1
+                streak[1] = 0
+                # 제외된 백엔드는 실제 요청을 받지 않으므로 복구 판단은 능동 프로브로만
+                flip = not b.healthy and not passive and streak[0] >= self.rise
+            else:
+                streak[0] = 0
+                streak[1] += 1
+                flip = b.healthy and streak[1] >= self.fall
+            if not flip:
+                return
+            b.healthy = not b.healthy
+
+        if b.healthy:
+            print(f"  [헬스체크] ✅ {b.addr} 복구됨")
+        else:
+            how = "수동 감지" if passive else f"프로브 {self.fall}회 연속 실패"
+            print(f"  [헬스체크] ❌ {b.addr} 장애 감지 ({how}) → 제외")
+
+
+# ── 재시도 예산 ───────────────────────────────────────────
+
+class RetryBudget:
+    """재시도·헤징에 쓰는 토큰 버킷
+
+    원래 요청마다 ratio개씩 토큰이 쌓이고 재시도/헤징 한 번에 1개를 쓴다.
+    → 추가 요청은 전체의 ratio 비율을 넘지 못한다 (장애 때 재시도가 부하를 몇 배로 키우지 않음)
+    트래픽이 적을 때도 재시도할 수 있게 초당 min_per_sec개는 시간에 따라 채운다.
+    """
+
+    def __init__(self, ratio: float = 0.2, min_per_sec: float = 10.0, burst: float = 100.0):
+        self.ratio = ratio
+        self.min_per_sec = min_per_sec
+        self.burst = burst
+        self.tokens = min_per_sec
+        self.spent = 0          # 예산 안에서 허용한 재시도/헤징
+        self.denied = 0         # 예산이 없어 거절한 재시도/헤징
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self.tokens = min(self.burst, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self._stamp) * self.min_per_sec)
+            self._stamp = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                self.spent += 1
+                return True
+            self.denied += 1
+            return False
+
+
+# 연결 실패 시 다시 보내도 되는 메서드 / 헤징(동시에 두 번 보내기)해도 되는 메서드
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+SAFE_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+
+# ── 동시성 한도 (부하 차단) ───────────────────────────────
+#
+# 한도가 없으면 과부하 때 모든 요청이 줄을 서서 백엔드 타임아웃(5초)까지 기다린다.
+# 처리 중인 요청 수를 한도로 묶고, 넘치면 즉시 503 + Retry-After로 거절한다.
+# 한도 값은 고정하지 않고 지연 변화를 보고 스스로 조정한다.
+
+class AdaptiveLimit:
+    """지연 기울기(gradient)로 조정하는 동시성 한도 (Netflix concurrency-limits Gradient2 단순화)
+
+    평소 지연(long: 천천히 오르고 빨리 내려가는 EWMA)과 이번 지연(rtt)을 비교한다.
+        gradient = clamp(tolerance × long / rtt, 0.5, 1)
+        새 한도  = 한도 × gradient + √한도     (√한도 = 줄 서도 되는 여유)
+    지연이 평소 수준이면 gradient=1 → 한도가 조금씩 늘고,
+    줄이 쌓여 지연이 늘면 gradient<1 → 한도가 줄어 더 일찍 거절한다.
+    5xx/연결 실패는 즉시 backoff배로 줄인다 (AIMD의 곱셈 감소).
+    """
+
+    def __init__(self, initial: int = 20, min_limit: int = 4, max_limit: int = 500,
+                 tolerance: float = 2.0, smoothing: float = 0.2, backoff: float = 0.9):
+        self._limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.tolerance = tolerance
+        self.smoothing = smoothing
+        self.backoff = backoff
+        self._long_rtt = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    def _clamp(self, value: float) -> float:
+        return max(self.min_limit, min(self.max_limit, value))
+
+    def update(self, rtt: float, inflight: int):
+        """정상 응답 하나의 지연(초)과 그때 처리 중이던 요청 수"""
+        with self._lock:
+            if self._long_rtt == 0.0 or rtt < self._long_rtt:
+                self._long_rtt += 0.5 * (rtt - self._long_rtt)      # 빨라지면 빨리 따라감
+            else:
+                self._long_rtt += 0.01 * (rtt - self._long_rtt)     # 과부하 지연에 길들지 않게
+            # 한도의 절반도 안 쓰는 중이면 지연이 한도 때문이 아니다 → 늘리지 않음
+            if inflight * 2 < self._limit:
+                return
+            gradient = max(0.5, min(1.0, self.tolerance * self._long_rtt / max(rtt, 1e-6)))
+            target = self._limit * gradient + math.sqrt(self._limit)
+            self._limit = self._clamp(self._limit + self.smoothing * (target - self._limit))
+
+    def drop(self):
+        """실패 (5xx/연결 실패/타임아웃)"""
+        with self._lock:
+            self._limit = self._clamp(self._limit * self.backoff)
+
+
+# 경로별 우선순위: CRITICAL은 한도와 무관하게 통과, SHEDDABLE은 한도의 SHED_AT 비율부터 거절
+CRITICAL, NORMAL, SHEDDABLE = range(3)
+SHED_AT = 0.8
+
+
+# ── 응답 캐시 ─────────────────────────────────────────────
+#
+# 백엔드가 Cache-Control로 허락한 GET 응답을 LB 메모리에 보관한다.
+#   - max-age(s-maxage) 동안은 신선(HIT) → 백엔드에 가지 않는다
+#   - 그 뒤 stale-while-revalidate 초 동안은 옛 응답을 바로 주고(STALE)
+#     백그라운드에서 If-None-Match로 재검증한다 (304면 본문 재사용)
+#   - 같은 키의 미스가 동시에 몰리면 한 요청만 백엔드로 보낸다 (single-flight)
+# 용량은 본문+헤더 바이트 합으로 제한하고 가장 오래 안 쓴 항목부터 버린다 (LRU).
+
+FRESH, STALE = "HIT", "STALE"   # X-Cache 헤더 값으로도 쓴다
+
+
+def cache_directives(value: str | None) -> dict[str, str]:
+    """'public, max-age=60' → {'public': '', 'max-age': '60'}"""
+    out = {}
+    for part in (value or "").split(","):
+        name, _, arg = part.strip().partition("=")
+        if name:
+            out[name.lower()] = arg.strip().strip('"')
+    return out
+
+
+class CachedResponse:
+    __slots__ = ("status", "reason", "headers", "length", "etag", "served_by",
+                 "ttl", "swr", "body", "stored", "size")
+
+    def __init__(self, status: int, reason: str, headers: list[tuple[str, str]],
+                 length: int, etag: str | None, served_by: str, ttl: int, swr: int):
+        self.status = status
+        self.reason = reason
+        self.headers = headers      # hop-by-hop / Content-Length / Age 제외
+        self.length = length
+        self.etag = etag
+        self.served_by = served_by
+        self.ttl = ttl              # 신선한 기간 (초)
+        self.swr = swr              # ttl 이후 옛 응답을 줘도 되는 기간 (초)
+        self.body = b""
+        self.stored = 0.0
+        self.size = 0
+
+
+class ResponseCache:
+    """LRU + 용량 제한 응답 캐시 (두 데이터 플레인 공통)
+
+    single-flight 대기 객체는 데이터 플레인이 정한다
+    (스레드 모드 threading.Event, asyncio 모드 Future).
+    """
+
+    flight_wait = 5.0   # 리더 응답을 기다리는 한도 (백엔드 타임아웃과 동일)
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, max_entry_bytes: int = 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes   # 이보다 큰 응답은 저장하지 않고 중계만
+        self.bytes = 0
+        self._entries: OrderedDict[str, CachedResponse] = OrderedDict()
+        self._flights = {}
+        self._revalidating = set()
+        self._lock = threading.Lock()
+
+        # 적중률 = (hits + stale_hits + coalesced) / (hits + stale_hits + misses)
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0       # 미스였지만 리더가 받아 온 응답을 재사용
+        self.revalidations = 0
+        self.not_modified = 0    # 재검증 결과 304
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def hit_rate(self) -> float:
+        total = self.hits + self.stale_hits + self.misses
+        return (self.hits + self.stale_hits + self.coalesced) / total if total else 0.0
+
+    def eligible(self, req: RequestInfo) -> bool:
+        """캐시를 거쳐도 되는 요청인가 (본문 없는 GET, 인증 없음, no-cache/no-store 아님)"""
+        if req.method != "GET" or req.header("Authorization") is not None:
+            return False
+        if req.header("Content-Length") not in (None, "0") or req.header("Transfer-Encoding"):
+            return False
+        cc = cache_directives(req.header("Cache-Control"))
+        return "no-cache" not in cc and "no-store" not in cc
+
+    def lookup(self, key: str, coalesced: bool = False) -> tuple[CachedResponse | None, str | None]:
+        """(항목, FRESH/STALE) 또는 (None, None). coalesced=True는 single-flight 대기 후 재조회"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            state = None
+            if entry is not None:
+                if now < entry.stored + entry.ttl:
+                    state = FRESH
+                elif now < entry.stored + entry.ttl + entry.swr:
+                    state = STALE
+            if state is None:
+                if not coalesced:
+                    self.misses += 1
+                return None, None
+            self._entries.move_to_end(key)
+            if coalesced:
+                self.coalesced += 1
+            elif state is FRESH:
+                self.hits += 1
+            else:
+                self.stale_hits += 1
+            return entry, state
+
+    def join_flight(self, key: str, new) -> tuple[bool, object]:
+        """(리더 여부, 대기 객체). 리더는 응답을 받아 온 뒤 finish_flight로 대기자를 깨운다"""
+        with self._lock:
+            waiter = self._flights.get(key)
+            if waiter is not None:
+                return False, waiter
+            waiter = self._flights[key] = new()
+            return True, waiter
+
+    def finish_flight(self, key: str):
+        with self._lock:
+            return self._flights.pop(key)
+
+    def admit(self, status: int, reason: str, headers: list[tuple[str, str]],
+              served_by: str) -> CachedResponse | None:
+        """저장해도 되는 응답이면 본문이 빈 CachedResponse, 아니면 None"""
+        if status != 200:
+            return None
+        cc = cache_directives(header_value(headers, "Cache-Control"))
+        if "no-store" in cc or "no-cache" in cc or "private" in cc:
+            return None
+        # 사용자별 응답일 수 있는 것은 키(경로)만으로 구분할 수 없다
+        if header_value(headers, "Set-Cookie") is not None or header_value(headers, "Vary"):
+            return None
+        try:
+            ttl = int(cc.get("s-maxage") or cc["max-age"])
+            swr = int(cc.get("stale-while-revalidate") or 0)
+            length = int(header_value(headers, "Content-Length"))
+        except (KeyError, TypeError, ValueError):
+            return None     # 수명 표시가 없거나 길이를 모름 (chunked)
+        if ttl <= 0 or length > self.max_entry_bytes:
+            return None
+        kept = [(k, v) for k, v in headers
+                if k.lower() not in HOP_BY_HOP and k.lower() not in ("content-length", "age")]
+        return CachedResponse(status, reason, kept, length, header_value(headers, "ETag"),
+                              served_by, ttl, max(swr, 0))
+
+    def put(self, key: str, entry: CachedResponse, body: bytes):
+        if len(body) != entry.length:
+            return          # 중계 도중 끊김
+        entry.body = body
+        entry.stored = time.monotonic()
+        entry.size = len(body) + sum(len(k) + len(v) + 4 for k, v in entry.headers)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old.size
+            self._entries[key] = entry
+            self.bytes += entry.size
+            while self.bytes > self.max_bytes:
+                _, old = self._entries.popitem(last=False)
+                self.bytes -= old.size
+                self.evictions += 1
+
+    def response(self, entry: CachedResponse, state: str,
+                 if_none_match: str | None) -> tuple[int, str, list[tuple[str, str]], bytes]:
+        """캐시 항목으로 보낼 (상태, 사유, 헤더, 본문). 클라이언트 ETag가 같으면 304"""
+        headers = entry.headers + [
+            ("Age", str(int(time.monotonic() - entry.stored))),
+            ("X-Cache", state),
+            ("X-Served-By", entry.served_by),
+        ]
+        if entry.etag is not None and if_none_match is not None:
+            tags = [t.strip() for t in if_none_match.split(",")]
+            if "*" in tags or entry.etag in tags:
+                return 304, "Not Modified", headers, b""
+        return entry.status, entry.reason, headers + [("Content-Length", str(entry.length))], entry.body
+
+    def revalidate(self, lb: 'LoadBalancer', key: str, entry: CachedResponse):
+        """STALE 응답을 준 뒤 백그라운드에서 갱신 (키마다 한 번에 하나)"""
+        with self._lock:
+            if key in self._revalidating:
+                return
+            self._revalidating.add(key)
+        threading.Thread(target=self._revalidate, args=(lb, key, entry), daemon=True).start()
+
+    def _revalidate(self, lb: 'LoadBalancer', key: str, entry: CachedResponse):
+        # 데이터 플레인과 무관하게 스레드 모드 풀(http.client)로 보낸다
+        try:
+            backend = lb.pick(RequestInfo("GET", key, "", []))
+            if backend is None:
+                return
+            headers = {"Host": backend.addr}
+            if entry.etag is not None:
+                headers["If-None-Match"] = entry.etag
+            backend.begin_request()
+            reusable = False
+            try:
+                conn, _ = backend.pool.acquire()
+                try:
+                    conn.request("GET", key, headers=headers)
+                    resp = conn.getresponse()
+                    body = resp.read()
+                    reusable = not resp.will_close
+                finally:
+                    backend.pool.release(conn, reusable)
+            except Exception:
+                backend.record_error()
+                lb.report(backend, False)
+                return      # 옛 항목은 stale 기간이 끝나면 자연히 미스가 된다
+            finally:
+                backend.end_request()
+            lb.report(backend, resp.status < 500)     # pick이 예약한 서킷 허가도 여기서 끝난다
+
+            with self._lock:
+                self.revalidations += 1
+                if resp.status == 304 and self._entries.get(key) is entry:
+                    self.not_modified += 1
+                    entry.stored = time.monotonic()     # 본문 그대로, 수명만 다시 시작
+                    return
+            fresh = self.admit(resp.status, resp.reason, resp.getheaders(), backend.addr)
+            if fresh is not None:
+                self.put(key, fresh, body)
+        finally:
+            with self._lock:
+                self._revalidating.discard(key)
+
+
+# ── HTTP 메시지 중계 (스트리밍) ───────────────────────────
+#
+# 본문을 통째로 read() 해서 메모리에 올린 뒤 보내면
+#   - 1GB 응답 = 요청 하나당 1GB 메모리
+#   - 마지막 바이트가 올 때까지 클라이언트는 첫 바이트도 못 받음
+# RELAY_BUFFER 크기씩 읽는 즉시 내보내면 요청당 메모리는 버퍼 하나로 고정된다.
+# 쓰기가 막히면(클라이언트가 느리면) 읽기도 멈추므로 TCP 윈도우가 백엔드까지
+# 그대로 역압(back-pressure)을 전달한다.
+
+RELAY_BUFFER = 64 * 1024
+
+# 프록시가 그대로 전달하면 안 되는 연결 단위(hop-by-hop) 헤더
+HOP_BY_HOP = frozenset({
+    "connection", "keep-alive", "proxy-connection", "proxy-authenticate",
+    "proxy-authorization", "te", "trailer", "transfer-encoding", "upgrade",
+})
+
+
+def is_chunked(te: str | None) -> bool:
+    return te is not None and "chunked" in te.lower()
 
 
-# ── 로드 밸런싱 알고리즘 ──────────────────────────────────
+def iter_chunked(fp, bufsize: int = RELAY_BUFFER):
+    """chunked 인코딩된 요청 본문을 디코딩하며 bufsize 이하 조각으로 내보낸다"""
+    while True:
+        line = fp.readline(1024)
+        if not line:
+            raise ConnectionError("connection closed mid-body")
+        size = int(line.split(b";", 1)[0], 16)
+        if size == 0:
+            break
+        while size:
+            data = fp.read(min(bufsize, size))
+            if not data:
+                raise ConnectionError("connection closed mid-body")
+            size -= len(data)
+            yield data
+        fp.readline(1024)          # 데이터 뒤 CRLF
+    while fp.readline(1024) not in (b"\r\n", b"\n", b""):
+        pass                       # trailer 헤더는 버린다
 
-class RoundRobin:
-    """순서대로 돌아가며 분배"""
-    def __init__(self):
-        self._index = 0
-        self._lock = threading.Lock()
 
-    def pick(self, backends: list[Backend]) -> Backend | None:
-        healthy = [b for b in backends if b.healthy]
-        if not healthy:
-            return None
-        with self._lock:
-            b = healthy[self._index % len(healthy)]
-            self._index += 1
-        return b
+def iter_exact(fp, length: int, bufsize: int = RELAY_BUFFER):
+    """Content-Length 만큼의 본문을 bufsize 이하 조각으로 내보낸다"""
+    while length:
+        data = fp.read(min(bufsize, length))
+        if not data:
+            raise ConnectionError("connection closed mid-body")
+        length -= len(data)
+        yield data
 
 
-class WeightedRoundRobin:
-    """가중치에 비례해서 분배"""
-    def __init__(self):
-        self._queue: deque = deque()
-        self._lock = threading.Lock()
+# ── 로드 밸런서 HTTP 핸들러 ───────────────────────────────
 
-    def pick(self, backends: list[Backend]) -> Backend | None:
-        healthy = [b for b in backends if b.healthy]
-        if not healthy:
-            return None
-        with self._lock:
-            if not self._queue:
-                # 가중치만큼 반복해서 큐 채우기
-                for b in healthy:
-                    self._queue.extend([b] * b.weight)
-                random.shuffle(self._queue)  # 섞기
-            return self._queue.popleft() if self._queue else healthy[0]
-
-
-class LeastConnections:
-    """현재 연결 수가 가장 적은 서버 선택"""
-    def pick(self, backends: list[Backend]) -> Backend | None:
-        healthy = [b for b in backends if b.healthy]
-        if not healthy:
-            return None
-        return min(healthy, key=lambda b: b.active_connections)
+def is_loopback(host: str) -> bool:
+    """클라이언트 주소가 127.0.0.0/8, ::1 (또는 IPv4-mapped 127.x)인가"""
+    try:
+        ip = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    if ip.version == 6 and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    return ip.is_loopback
 
 
-# ── 헬스체크 ──────────────────────────────────────────────
+def listen_socket(host: str, port: int, reuse_port: bool = False,
+                  backlog: int = 1024) -> socket.socket:
+    """리슨 소켓. reuse_port=True면 워커마다 같은 포트에 따로 bind → 커널이 연결을 나눠 준다"""
+    # proto를 명시해야 asyncio가 accept한 소켓에 TCP_NODELAY를 켠다 (0이면 TCP로 보지 않음)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    return sock
 
-class HealthChecker(threading.Thread):
-    def __init__(self, backends: list[Backend], interval: int = 5):
-        super().__init__(daemon=True)
-        self.backends = backends
-        self.interval = interval
 
-    def run(self):
-        while True:
-            for b in self.backends:
-                self._check(b)
-            time.sleep(self.interval)
+class LBServer(http.server.ThreadingHTTPServer):
+    """연결마다 스레드 하나 (느린 백엔드가 다른 클라이언트를 막지 않도록)"""
+    daemon_threads = True
+    request_queue_size = 1024
 
-    def _check(self, b: Backend):
-        try:
-            url = f"http://{b.addr}/health"
-            req = urllib.request.urlopen(url, timeout=2)
-            was_healthy = b.healthy
-            b.healthy = req.status == 200
-            b.last_check = time.time()
-            if not was_healthy and b.healthy:
-                print(f"  [헬스체크] ✅ {b.addr} 복구됨")
-        except Exception:
-            was_healthy = b.healthy
-            b.healthy = False
-            if was_healthy:
-                print(f"  [헬스체크] ❌ {b.addr} 장애 감지 → 제외")
+    @classmethod
+    def on_socket(cls, sock: socket.socket, handler) -> 'LBServer':
+        """이미 listen 중인 소켓으로 서버 생성 (--workers)"""
+        server = cls(sock.getsockname(), handler, bind_and_activate=False)
+        server.socket.close()
+        server.socket = sock
+        return server
 
 
-# ── 로드 밸런서 HTTP 핸들러 ───────────────────────────────
+def discard_response(backend: Backend, future: concurrent.futures.Future):
+    """헤징에서 진 요청 정리: 본문을 읽지 않았으므로 연결은 재사용하지 않고 닫는다"""
+    if future.exception() is None:
+        conn, resp = future.result()
+        resp.close()
+        backend.pool.release(conn, False)
+        backend.end_request()
+        backend.release_trial()
+
 
 class LBHandler(http.server.BaseHTTPRequestHandler):
     lb: 'LoadBalancer' = None  # 클래스 변수로 LB 참조
 
+    # chunked 응답을 전달하려면 HTTP/1.1이 필요하다.
+    # 단, 응답마다 연결을 닫는다 (keep-alive 클라이언트가 스레드를 하나씩 붙잡고 있지 않도록)
+    protocol_version = "HTTP/1.1"
+    # 헤더와 본문을 따로 write → Nagle + 상대의 delayed ACK가 겹쳐 응답마다 ~40ms 지연
+    disable_nagle_algorithm = True
+
     def do_GET(self):
-        backend = self.lb.pick()
+        if self.command == "GET" and self.path == self.lb.metrics_path:
+            self._send_body(200, self.lb.metrics_text().encode(), METRICS_CONTENT_TYPE)
+            return
+        if self.lb.is_admin_path(self.path):
+            body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            self._send_json(*self.lb.admin_request(self.command, self.path, body,
+                                                   self.client_address[0]))
+            return
+        self._proxy()
 
-        if backend is None:
-            self.send_response(503)
-            self.end_headers()
-            self.wfile.write(b'{"error": "No healthy backends"}')
+    do_HEAD = do_POST = do_PUT = do_DELETE = do_PATCH = do_GET
+
+    def _proxy(self):
+        start = time.monotonic()
+        req = RequestInfo(self.command, self.path, self.client_address[0], self.headers)
+        cache = self.lb.cache
+        if cache is None or not cache.eligible(req):
+            self._admitted(start, req, None)
             return
 
-        with threading.Lock():
-            backend.active_connections += 1
-            backend.total_requests += 1
+        entry, state = cache.lookup(self.path)
+        if entry is None:
+            leader, done = cache.join_flight(self.path, threading.Event)
+            if leader:
+                try:
+                    self._admitted(start, req, cache)
+                finally:
+                    cache.finish_flight(self.path).set()
+                return
+            # 같은 키를 받아 오는 요청이 이미 있음 → 끝나길 기다렸다가 그 응답을 재사용
+            done.wait(cache.flight_wait)
+            entry, state = cache.lookup(self.path, coalesced=True)
+            if entry is None:           # 저장할 수 없는 응답이었음 → 직접 보낸다
+                self._admitted(start, req, cache)
+                return
+
+        if state is STALE:
+            cache.revalidate(self.lb, self.path, entry)
+        self._send_cached(cache, entry, state)
+        self.lb.latency.record(time.monotonic() - start)
+        if self.lb.verbose:
+            print(f"  [{self.command} {self.path}] → cache {state}")
 
+    def _admitted(self, start: float, req: RequestInfo, cache: ResponseCache | None):
+        """전역 동시성 한도 안에서만 백엔드로 보낸다. 넘치면 즉시 503 + Retry-After"""
+        if not self.lb.admit(req):
+            self._send_overloaded()
+            return
+        ok = False
         try:
-            # 백엔드에 요청 포워딩
-            url = f"http://{backend.addr}{self.path}"
-            req = urllib.request.urlopen(url, timeout=5)
-            body = req.read()
+            ok = self._forward(start, req, cache)
+        finally:
+            self.lb.release(time.monotonic() - start, ok)
 
-            self.send_response(req.status)
-            self.send_header("Content-Type", "application/json")
-            self.send_header("X-Served-By", backend.addr)
-            self.end_headers()
-            self.wfile.write(body)
+    def _forward(self, start: float, req: RequestInfo, cache: ResponseCache | None) -> bool:
+        """백엔드로 중계. 5xx 없이 끝까지 전달했으면 True"""
+        backend = self.lb.pick(req)
 
-            print(f"  [{self.path}] → {backend.addr} ({self.lb.algo_name})")
+        if backend is None:
+            if self.lb.shedding(req):       # 적응형 동시성 한도가 거절
+                self.lb.incr("shed")
+                self._send_overloaded()
+                return False
+            if self.lb.healthy.members:     # 건강한 백엔드는 있지만 서킷 브레이커가 모두 거절
+                self.lb.incr("unavailable")
+                self._send_json(503, {"error": "No available backends"})
+                return False
+            self.lb.incr("no_backend")
+            self._send_json(503, {"error": "No healthy backends"})
+            return False
 
+        # 백엔드에 요청 포워딩 (풀에서 빌린 keep-alive 연결 사용, 본문은 스트리밍)
+        try:
+            backend, conn, resp = self._first_response(backend, req)
         except Exception as e:
-            backend.total_errors += 1
-            self.send_response(502)
-            self.end_headers()
-            self.wfile.write(json.dumps({"error": str(e), "backend": backend.addr}).encode())
+            self._send_json(502, {"error": str(e), "backend": backend.addr})
+            self.lb.latency.record(time.monotonic() - start)
+            return False
+
+        ok = False
+        try:
+            reusable = False
+            try:
+                if resp.status >= 500:
+                    backend.record_error()
+                self.lb.report(backend, resp.status < 500)
+                self._relay_response(backend, resp, cache)
+                resp.close()    # 본문을 끝까지 읽었음 → 연결을 다음 요청에 쓸 수 있는 상태로
+                reusable = not resp.will_close
+                ok = resp.status < 500
+            except Exception:
+                # 응답 헤더가 이미 나간 뒤라 502로 바꿀 수 없다 → 연결을 끊어 클라이언트에 알린다
+                backend.record_error()
+            finally:
+                backend.pool.release(conn, reusable)
+
+            if self.lb.verbose:
+                print(f"  [{self.command} {self.path}] → {backend.addr} ({self.lb.algo_name})")
         finally:
-            backend.active_connections -= 1
+            backend.end_request()
+            self.lb.latency.record(time.monotonic() - start)
+        return ok
+
+    def _has_body(self) -> bool:
+        return (is_chunked(self.headers.get("Transfer-Encoding"))
+                or int(self.headers.get("Content-Length") or 0) > 0)
+
+    def _attempt(self, backend: Backend):
+        """백엔드 한 곳에 전송 → (conn, 응답). 성공하면 end_request는 호출한 쪽이 책임진다"""
+        backend.begin_request()
+        t0 = time.monotonic()
+        try:
+            conn, resp = self._send_upstream(backend)
+        except Exception:
+            backend.record_error()
+            self.lb.report(backend, False)
+            backend.end_request()
+            raise
+        backend.record_latency(time.monotonic() - t0)
+        return conn, resp
+
+    def _first_response(self, backend: Backend, req: RequestInfo):
+        """(백엔드, conn, 응답). 본문 없는 멱등 요청은 연결 실패 시 재시도, 안전한 요청은 헤징"""
+        lb = self.lb
+        lb.retry_budget.deposit()
+        # 본문은 스트리밍이라 한 번 읽으면 다시 보낼 수 없다
+        replayable = self.command in IDEMPOTENT_METHODS and not self._has_body()
+        hedge = lb.hedge and replayable and self.command in SAFE_METHODS
+        tried = [backend]
+        while True:
+            try:
+                if hedge:
+                    return self._hedged(backend, req, tried)
+                return (backend, *self._attempt(backend))
+            except Exception:
+                if not replayable or len(tried) > lb.max_retries:
+                    raise
+                other = lb.pick_other(req, tried)
+                if other is None:
+                    raise
+                if not lb.retry_budget.withdraw():
+                    other.release_trial()
+                    raise
+                lb.incr("retries")
+                tried.append(other)
+                backend = other
+
+    def _hedged(self, backend: Backend, req: RequestInfo, tried: list[Backend]):
+        """hedge_delay(p95)가 지나도 응답 헤더가 없으면 다른 백엔드에도 보내고 먼저 온 쪽을 쓴다"""
+        lb = self.lb
+        delay = lb.hedge_delay()
+        if delay is None:
+            return (backend, *self._attempt(backend))
+
+        primary = lb.hedge_pool.submit(self._attempt, backend)
+        try:
+            return (backend, *primary.result(timeout=delay))
+        except concurrent.futures.TimeoutError:
+            pass
+        other = lb.pick_other(req, tried)
+        if other is not None and not lb.retry_budget.withdraw():
+            other.release_trial()
+            other = None
+        if other is None:
+            return (backend, *primary.result())
+        lb.incr("hedges")
+        tried.append(other)
+        owners = {primary: backend, lb.hedge_pool.submit(self._attempt, other): other}
+
+        winner, error, pending = None, None, set(owners)
+        while pending and winner is None:
+            done, pending = concurrent.futures.wait(
+                pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for f in done:
+                if f.exception() is not None:
+                    error = f.exception()
+                elif winner is None:
+                    winner = f
+                else:
+                    discard_response(owners[f], f)
+        # 진 쪽은 끝나는 대로 응답을 버린다 (스레드는 중간에 취소할 수 없음)
+        for f in pending:
+            f.add_done_callback(functools.partial(discard_response, owners[f]))
+        if winner is None:
+            raise error
+        if winner is not primary:
+            lb.incr("hedge_wins")
+        return (owners[winner], *winner.result())
+
+    def _request_body(self):
+        """클라이언트 요청 본문 (없으면 None, chunked 여부)"""
+        if is_chunked(self.headers.get("Transfer-Encoding")):
+            return iter_chunked(self.rfile), True
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            return iter_exact(self.rfile, length), False
+        return None, False
+
+    def _send_upstream(self, backend: Backend):
+        """요청 헤더 + 본문을 백엔드로 보내고 (conn, 응답) 반환. conn은 응답을 다 읽은 뒤 반납"""
+        body, chunked = self._request_body()
+        conn, reused = backend.pool.acquire()
+        try:
+            try:
+                resp = self._exchange(conn, body, chunked)
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                # 풀에서 꺼낸 사이 서버가 연결을 닫음 → 새 연결로 한 번만 재시도
+                # (본문은 이미 소비됐을 수 있으므로 본문 없는 요청만)
+                if not reused or body is not None:
+                    raise
+                conn.close()
+                resp = self._exchange(conn, None, False)
+        except BaseException:
+            backend.pool.release(conn, False)
+            raise
+        return conn, resp
+
+    def _exchange(self, conn: http.client.HTTPConnection, body, chunked: bool):
+        conn.putrequest(self.command, self.path, skip_accept_encoding=True)
+        for k, v in self.headers.items():
+            if k.lower() not in HOP_BY_HOP and k.lower() != "host":
+                conn.putheader(k, v)
+        if chunked:
+            conn.putheader("Transfer-Encoding", "chunked")
+        conn.endheaders(body, encode_chunked=chunked)
+        return conn.getresponse()
+
+    def _relay_response(self, backend: Backend, resp: http.client.HTTPResponse,
+                        cache: ResponseCache | None = None):
+        # http.client가 chunked를 디코딩해 주므로, HTTP/1.1 클라이언트에는 다시 chunked로 감싼다
+        chunked = resp.chunked and self.request_version == "HTTP/1.1"
+        # 캐시해도 되는 응답이면 중계하면서 본문을 모아 둔다
+        entry = None
+        if cache is not None:
+            entry = cache.admit(resp.status, resp.reason, resp.getheaders(), backend.addr)
+        parts = []
+
+        self.send_response_only(resp.status, resp.reason)
+        for k, v in resp.getheaders():
+            if k.lower() not in HOP_BY_HOP:
+                self.send_header(k, v)          # Content-Length는 그대로 유지
+        if chunked:
+            self.send_header("Transfer-Encoding", "chunked")
+        if cache is not None:
+            self.send_header("X-Cache", "MISS")
+        self.send_header("X-Served-By", backend.addr)
+        self.send_header("Connection", "close")
+        self.end_headers()
+
+        if self.command == "HEAD":
+            return
+        while True:
+            data = resp.read1(RELAY_BUFFER)   # 도착한 만큼만 (최대 RELAY_BUFFER)
+            if not data:
+                break
+            # wfile.write는 클라이언트 소켓 송신 버퍼가 찰 때까지만 진행 → 자연스러운 역압
+            if chunked:
+                self.wfile.write(b"%X\r\n%b\r\n" % (len(data), data))
+            else:
+                self.wfile.write(data)
+            if entry is not None:
+                parts.append(data)
+        if chunked:
+            self.wfile.write(b"0\r\n\r\n")
+        if entry is not None:
+            cache.put(self.path, entry, b"".join(parts))
+
+    def _send_cached(self, cache: ResponseCache, entry: CachedResponse, state: str):
+        status, reason, headers, body = cache.response(entry, state, self.headers.get("If-None-Match"))
+        self.send_response_only(status, reason)
+        for k, v in headers:
+            self.send_header(k, v)
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_overloaded(self):
+        self._send_json(503, {"error": "Overloaded"},
+                        [("Retry-After", str(self.lb.RETRY_AFTER))])
+
+    def _send_json(self, status: int, payload: dict, headers=()):
+        self._send_body(status, json.dumps(payload).encode(), "application/json", headers)
+
+    def _send_body(self, status: int, body: bytes, content_type: str, headers=()):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in headers:
+            self.send_header(k, v)
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(body)
 
     def log_message(self, format, *args):
         pass
 
 
 class LoadBalancer:
-    def __init__(self, port: int, backends: list[Backend], algo="round_robin"):
+    def __init__(self, port: int, backends: list[Backend], algo="round_robin",
+                 verbose: bool = True, hash_key: str = "path", pool_max_idle: int = 8,
+                 pool_max_per_backend: int = 64, pool_idle_timeout: float = 30.0,
+                 metrics_path: str | None = "/metrics", hedge: bool = False,
+                 max_retries: int = 1, retry_budget: RetryBudget | None = None,
+                 cache: ResponseCache | None = None, adaptive: bool = False,
+                 critical_paths: tuple[str, ...] = ("/health",),
+                 sheddable_paths: tuple[str, ...] = (), admin_path: str | None = None,
+                 breaker: bool = False):
         self.port = port
-        self.backends = backends
+        # 튜플 스냅샷 — 관리 API는 새 튜플로 통째로 교체한다 (읽는 쪽은 락 없음)
+        self.backends: tuple[Backend, ...] = tuple(backends)
         self.algo_name = algo
+        self.verbose = verbose   # 요청마다 로그 출력 (부하 테스트 시 False)
+
+        # LB 자체 지표: 요청 전체 소요 시간 (선택 ~ 응답 중계 끝), 백엔드가 없어 거절한 수
+        # metrics_path로 오는 GET은 백엔드로 넘기지 않고 LB가 직접 답한다 (None = 끔)
+        self.metrics_path = metrics_path
+        # admin_path 아래는 백엔드 구성 변경 API (None = 끔).
+        # 인증이 없고 데이터 플레인 포트를 같이 쓰므로 루프백 클라이언트만 받는다
+        # (아무 host:port나 백엔드로 추가할 수 있어 열어 두면 오픈 프록시가 된다)
+        self.admin_path = admin_path
+        self.latency = LatencyHistogram()
+        self.no_backend = 0
+        self.unavailable = 0        # 건강한 백엔드는 있지만 서킷 브레이커가 모두 거절
+        self._lock = threading.Lock()
+
+        # 연결 실패 재시도(다른 백엔드로 최대 max_retries번) + 헤징, 둘 다 retry_budget 안에서
+        self.hedge = hedge
+        self.max_retries = max_retries
+        self.retry_budget = retry_budget or RetryBudget()
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0          # 헤징으로 보낸 쪽이 먼저 응답한 횟수
+        self._hedge_delay: float | None = None
+        self._hedge_stamp = 0.0
+        self._hedge_pool: concurrent.futures.ThreadPoolExecutor | None = None
+
+        # 백엔드 앞 응답 캐시 (None = 끔). --workers에서는 프로세스마다 따로 가진다
+        self.cache = cache
+
+        # 부하 차단: 전역/백엔드별 적응형 동시성 한도 (adaptive=False면 제한 없음)
+        # 경로 접두사로 우선순위를 정한다 — critical_paths는 절대 거절하지 않는다
+        self.limit = AdaptiveLimit(initial=100, max_limit=2000) if adaptive else None
+        self.critical_paths = tuple(critical_paths)
+        self.sheddable_paths = tuple(sheddable_paths)
+        self.inflight = 0
+        self.shed = 0               # 한도 초과로 503 거절한 요청
+
+        # 백엔드별 서킷 브레이커: 연속 실패 시 즉시 후보에서 제외 (헬스체크 주기를 기다리지 않음)
+        # 브레이커 이름 = 백엔드 주소. --workers면 start_workers가 공유 레지스트리로 바꾼다
+        self.breaker = breaker
+        self.breakers = BreakerRegistry()
+
+        # 백엔드별 keep-alive 커넥션 풀
+        self.pool_limits = {
+            "max_idle": pool_max_idle,
+            "max_per_backend": pool_max_per_backend,
+            "idle_timeout": pool_idle_timeout,
+        }
+        for b in backends:
+            self._attach_pools(b)
 
         algorithms = {
-            "round_robin": RoundRobin(),
-            "weighted":    WeightedRoundRobin(),
-            "least_conn":  LeastConnections(),
+            "round_robin":     RoundRobin(),
+            "weighted":        WeightedRoundRobin(),
+            "weighted_random": WeightedRandom(),
+            "least_conn":      LeastConnections(),
+            "p2c":             PowerOfTwoChoices(),
+            "peak_ewma":       PeakEWMA(),
+            "least_latency":   LeastLatencyWeighted(),
+            "consistent_hash": ConsistentHash(key=hash_key),
         }
         self._algo = algorithms.get(algo, RoundRobin())
 
-    def pick(self) -> Backend | None:
-        return self._algo.pick(self.backends)
+        # 수동 헬스체크 결과를 받을 HealthChecker (HealthChecker(lb=...)가 연결)
+        self.health: HealthChecker | None = None
+
+        # 건강한 백엔드 목록은 Backend 상태가 바뀔 때만 갱신
+        self.healthy = HealthySet(self.backends)
+        self._algo.reset(self.healthy)
+        for b in self.backends:
+            b._watchers.append(self)
+        self._admin_lock = threading.Lock()     # 구성 변경끼리만 직렬화
+        self.shared: SharedBackendStats | None = None   # --workers (start_workers가 설정)
+
+    def _attach_pools(self, b: Backend):
+        b.pool = ConnectionPool(b.host, b.port, **self.pool_limits)
+        b.apool = AsyncConnectionPool(b.host, b.port, **self.pool_limits)
+        if self.limit is not None and b.limit is None:
+            b.limit = AdaptiveLimit()
+        if self.breaker and b.breaker is None:
+            self._attach_breaker(b)
+
+    def _attach_breaker(self, b: Backend):
+        b.breaker = self.breakers.get(b.addr, **self.BREAKER_OPTIONS,
+                                      on_state_change=b.on_breaker_change)
+
+    def on_health_change(self, b: Backend):
+        self.healthy.refresh()
+        self._algo.on_health_change(b)
+
+    def on_load_change(self, b: Backend):
+        self._algo.on_load_change(b)
+
+    def on_weight_change(self, b: Backend):
+        self._algo.on_weight_change(b)
+
+    def find(self, addr: str) -> Backend | None:
+        for b in self.backends:
+            if b.addr == addr:
+                return b
+        return None
+
+    def _get(self, addr: str) -> Backend:
+        b = self.find(addr)
+        if b is None:
+            raise KeyError(f"unknown backend: {addr}")
+        return b
+
+    def set_weight(self, addr: str, weight: int) -> Backend:
+        """런타임 가중치 변경 (0 = 새 요청을 보내지 않음). 다음 선택부터 바로 반영"""
+        self._check_reconfigurable()
+        b = self._get(addr)
+        b.weight = weight
+        return b
+
+    # ── 백엔드 구성 변경 (무중단) ──
+    # backends와 healthy.members는 새 튜플을 만들어 참조만 바꿔 끼운다 (copy-on-write).
+    # 선택 경로는 참조 하나를 읽을 뿐이라 락이 없고, 구성 변경끼리만 _admin_lock으로 직렬화한다.
+
+    def _check_reconfigurable(self):
+        # 공유 메모리 슬롯은 fork 전에 정해지고, 가중치/drain은 워커 프로세스마다 따로 들고 있다
+        # → 요청을 받은 워커 하나만 바뀌어 워커마다 구성이 달라져 버린다
+        if self.shared is not None:
+            raise RuntimeError("--workers 모드에서는 백엔드 구성(추가/삭제/가중치/drain)을 바꿀 수 없음")
+
+    def add_backend(self, host: str, port: int, weight: int = 1) -> Backend:
+        """백엔드 추가. 다음 선택부터 후보에 들어가고 헬스체크도 바로 시작"""
+        self._check_reconfigurable()
+        with self._admin_lock:
+            if self.find(f"{host}:{port}") is not None:
+                raise ValueError(f"backend already exists: {host}:{port}")
+            b = Backend(host, port, weight=weight)
+            self._attach_pools(b)
+            b._watchers.append(self)
+            self.backends = (*self.backends, b)
+            self.healthy.replace(self.backends)
+            self._algo.on_health_change(b)
+        if self.health is not None:
+            self.health.watch(b)
+        if self.verbose:
+            print(f"  [관리] ➕ {b.addr} 추가 (weight={weight})")
+        return b
+
+    def drain(self, addr: str, timeout: float = 30.0) -> bool:
+        """새 요청을 보내지 않고 처리 중 요청이 0이 될 때까지 대기. timeout 안에 비면 True"""
+        self._check_reconfigurable()
+        b = self._get(addr)
+        b.draining = True
+        deadline = time.monotonic() + timeout
+        while b.active_connections > 0:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def undrain(self, addr: str) -> Backend:
+        """drain 취소 → 다시 새 요청을 받는다"""
+        self._check_reconfigurable()
+        b = self._get(addr)
+        b.draining = False
+        return b
+
+    def remove_backend(self, addr: str, timeout: float = 30.0) -> bool:
+        """drain 후 제거. timeout이 지나면 처리 중 요청이 남아 있어도 제거 (그 요청은 끝까지 진행)"""
+        self._check_reconfigurable()
+        drained = self.drain(addr, timeout)
+        with self._admin_lock:
+            b = self._get(addr)
+            self.backends = tuple(x for x in self.backends if x is not b)
+            self.healthy.replace(self.backends)
+            b._watchers.remove(self)
+        if self.health is not None:
+            self.health.unwatch(b)
+        b.pool.retire()
+        b.apool.retire()
+        self.breakers.discard(b.addr)
+        if self.verbose:
+            print(f"  [관리] ➖ {b.addr} 제거" + ("" if drained else " (drain 시간 초과)"))
+        return drained
+
+    @staticmethod
+    def describe(b: Backend) -> dict:
+        return {"addr": b.addr, "weight": b.weight, "healthy": b.healthy,
+                "draining": b.draining, "active": b.active_connections,
+                "requests": b.total_requests, "errors": b.total_errors}
+
+    def is_admin_path(self, path: str) -> bool:
+        """admin_path 자체이거나 그 아래 경로인가 (/administrator 같은 데이터 경로는 아님)"""
+        if not self.admin_path:
+            return False
+        path = path.split("?", 1)[0]
+        return path == self.admin_path or path.startswith(self.admin_path + "/")
+
+    def admin_request(self, method: str, path: str, body: bytes,
+                      client_ip: str) -> tuple[int, dict]:
+        """관리 API 요청 하나 → (상태 코드, JSON). drain/삭제는 백그라운드에서 진행하고 202
+        루프백이 아닌 클라이언트는 403
+
+            GET    {admin}/backends                     목록
+            POST   {admin}/backends          {"addr": "host:port", "weight": 1}
+            GET    {admin}/backends/<addr>
+            PATCH  {admin}/backends/<addr>   {"weight": 3}
+            DELETE {admin}/backends/<addr>              drain 후 제거
+            POST   {admin}/backends/<addr>/drain        drain 시작
+            DELETE {admin}/backends/<addr>/drain        drain 취소
+        """
+        if not is_loopback(client_ip):
+            return 403, {"error": "admin API is only served to loopback clients"}
+        parts = path[len(self.admin_path):].split("?", 1)[0].strip("/").split("/")
+        try:
+            data = json.loads(body) if body else {}
+            if parts[0] != "backends" or len(parts) > 3:
+                return 404, {"error": "Not Found"}
+            if len(parts) == 1:
+                if method == "GET":
+                    return 200, {"backends": [self.describe(b) for b in self.backends]}
+                if method == "POST":
+                    host, _, port = str(data.get("addr", "")).rpartition(":")
+                    if not host or not port.isdigit():
+                        raise ValueError("addr must be host:port")
+                    return 201, self.describe(self.add_backend(host, int(port),
+                                                                int(data.get("weight", 1))))
+            elif len(parts) == 2:
+                addr = parts[1]
+                if method == "GET":
+                    return 200, self.describe(self._get(addr))
+                if method == "PATCH":
+                    if "weight" not in data:
+                        raise ValueError("weight is required")
+                    return 200, self.describe(self.set_weight(addr, int(data["weight"])))
+                if method == "DELETE":
+                    self._check_reconfigurable()
+                    self._get(addr)
+                    threading.Thread(target=self.remove_backend, args=(addr,), daemon=True).start()
+                    return 202, {"removing": addr}
+            elif parts[2] == "drain":
+                addr = parts[1]
+                if method == "POST":
+                    self._check_reconfigurable()
+                    self._get(addr)
+                    threading.Thread(target=self.drain, args=(addr,), daemon=True).start()
+                    return 202, {"draining": addr}
+                if method == "DELETE":
+                    return 200, self.describe(self.undrain(addr))
+            else:
+                return 404, {"error": "Not Found"}
+            return 405, {"error": "Method Not Allowed"}
+        except KeyError as e:       # _get: 없는 백엔드
+            return 404, {"error": e.args[0]}
+        except (ValueError, TypeError) as e:
+            return 400, {"error": str(e)}
+        except RuntimeError as e:
+            return 409, {"error": str(e)}
+
+    # 백엔드 서킷 브레이커 설정: 5연속 실패 → OPEN 5초 → HALF_OPEN 시험은 0.5초에 하나, 2연속 성공 → CLOSED
+    BREAKER_OPTIONS = {"failure_threshold": 5, "success_threshold": 2,
+                       "timeout": 5.0, "half_open_interval": 0.5}
+
+    def pick(self, req: RequestInfo | None = None,
+             exclude: tuple[Backend, ...] | list[Backend] = ()) -> Backend | None:
+        """알고리즘이 고른 백엔드가 받을 수 없으면 받을 수 있는 다른 백엔드, 하나도 없으면 None
+
+        돌려준 백엔드 하나만 서킷 브레이커 허가(HALF_OPEN 시험 자리)를 예약한다.
+        받은 쪽은 report()로 결과를 알리거나, 요청을 보내지 않으면 release_trial()로 반납할 것.
+        """
+        b = self._algo.pick(self.healthy, req)
+        if b is None:
+            return None
+        if b not in exclude and self._accepts(b, req) and self._reserve(b):
+            return b
+        for other in self.healthy.members:
+            if (other is not b and other not in exclude
+                    and self._accepts(other, req) and self._reserve(other)):
+                return other
+        return None
+
+    def _accepts(self, b: Backend, req: RequestInfo | None) -> bool:
+        """동시성 한도에 여유가 있고 서킷 브레이커가 허락할 상태인가 (살펴보기만 — 예약 없음)"""
+        if self._at_limit(b, req):
+            return False
+        return b.breaker is None or b.breaker.is_call_permitted()
+
+    def _at_limit(self, b: Backend, req: RequestInfo | None) -> bool:
+        return (b.limit is not None and b.active_connections >= b.limit.limit
+                and not (req is not None and self.priority(req.path) == CRITICAL))
+
+    def shedding(self, req: RequestInfo | None) -> bool:
+        """pick이 None일 때: 백엔드별 적응형 한도에 걸린 백엔드가 있어서인가 (→ shed 503 + Retry-After)
+        False면 건강한 백엔드가 없거나 서킷 브레이커가 모두 거절한 것"""
+        return any(self._at_limit(b, req) for b in self.healthy.members)
+
+    @staticmethod
+    def _reserve(b: Backend) -> bool:
+        # 살펴본 뒤 다른 요청이 시험 자리를 먼저 가져갔으면 False → 다음 후보로
+        return b.breaker is None or b.breaker.allow_request()
+
+    # 거절 응답의 Retry-After (초)
+    RETRY_AFTER = 1
+
+    def priority(self, path: str) -> int:
+        if path.startswith(self.critical_paths):
+            return CRITICAL
+        if path.startswith(self.sheddable_paths):
+            return SHEDDABLE
+        return NORMAL
+
+    def admit(self, req: RequestInfo) -> bool:
+        """전역 한도 안이면 처리 중 +1 하고 True (끝나면 release). CRITICAL은 항상 통과"""
+        if self.limit is None:
+            return True
+        prio = self.priority(req.path)
+        with self._lock:
+            if prio != CRITICAL:
+                cap = self.limit.limit * (SHED_AT if prio == SHEDDABLE else 1)
+                if self.inflight >= cap:
+                    self.shed += 1
+                    return False
+            self.inflight += 1
+            return True
+
+    def release(self, seconds: float, ok: bool):
+        """admit으로 들어온 요청 종료 — 결과로 전역 한도를 조정"""
+        if self.limit is None:
+            return
+        with self._lock:
+            inflight = self.inflight
+            self.inflight -= 1
+        if ok:
+            self.limit.update(seconds, inflight)
+        else:
+            self.limit.drop()
+
+    def report(self, b: Backend, ok: bool):
+        """데이터 플레인이 실제 요청에서 본 결과 (수동 헬스체크 + 서킷 브레이커)"""
+        if b.breaker is not None:
+            if ok:
+                b.breaker.record_success()
+            else:
+                b.breaker.record_failure()
+        if self.health is not None:
+            self.health.observe(b, ok, passive=True)
+
+    @staticmethod
+    def pool_stats(b: Backend) -> dict:
+        """스레드/asyncio 풀 통계 합산 (실제로는 실행 중인 데이터 플레인 쪽만 쓰인다)"""
+        a, c = b.pool.stats(), b.apool.stats()
+        total = {k: a[k] + c[k] for k in ("hits", "misses", "evicted", "idle", "in_use")}
+        n = total["hits"] + total["misses"]
+        total["hit_rate"] = total["hits"] / n if n else 0.0
+        return total
+
+    def incr(self, counter: str):
+        """LB 자체 카운터 +1 (no_backend, unavailable, shed, retries, hedges, hedge_wins)"""
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def pick_other(self, req: RequestInfo | None, exclude: list[Backend]) -> Backend | None:
+        """재시도/헤징용: exclude에 없고 받을 수 있는 백엔드 (pick과 같이 돌려준 쪽만 예약)"""
+        return self.pick(req, exclude)
+
+    # 헤징 대기 시간 = 전체 백엔드 응답 시간의 HEDGE_QUANTILE 분위수 (HEDGE_REFRESH초마다 갱신)
+    HEDGE_QUANTILE = 0.95
+    HEDGE_REFRESH = 1.0
+    HEDGE_MIN_SAMPLES = 50
+
+    def hedge_delay(self) -> float | None:
+        """표본이 적으면 None (헤징 안 함)"""
+        now = time.monotonic()
+        if now - self._hedge_stamp >= self.HEDGE_REFRESH:
+            snap = LatencyHistogram.merge(b.latency for b in self.backends)
+            self._hedge_delay = (LatencyHistogram.quantile_of(snap, self.HEDGE_QUANTILE)
+                                 if snap[1] >= self.HEDGE_MIN_SAMPLES else None)
+            self._hedge_stamp = now
+        return self._hedge_delay
+
+    @property
+    def hedge_pool(self) -> concurrent.futures.ThreadPoolExecutor:
+        """스레드 모드 헤징용 (원래 요청과 헤징 요청을 동시에 기다리려면 둘 다 다른 스레드에서)"""
+        if self._hedge_pool is None:
+            with self._lock:
+                if self._hedge_pool is None:
+                    self._hedge_pool = concurrent.futures.ThreadPoolExecutor(
+                        max_workers=256, thread_name_prefix="hedge")
+        return self._hedge_pool
+
+    def sync_shared(self):
+        """공유 메모리(다른 워커가 바꾼 값)를 로컬 상태와 선택 알고리즘에 반영"""
+        for b in self.backends:
+            shared_healthy = bool(b._counters[HEALTHY])
+            if shared_healthy != b.healthy:
+                b.healthy = shared_healthy        # → HealthySet/알고리즘 갱신
+            self._algo.on_load_change(b)          # 버킷/부하 표를 전체 연결 수로
+            if b.breaker is not None:
+                b.sync_breaker()                  # 다른 워커가 연/닫은 서킷
+
+    def sync_forever(self, interval: float = 0.02):
+        while True:
+            time.sleep(interval)
+            self.sync_shared()
 
     def status(self):
         print(f"\n  [로드 밸런서 현황 - {self.algo_name}]")
+        print(f"    전체: {self.latency.count}건, {format_percentiles(self.latency)}, "
+              f"백엔드 없음 503: {self.no_backend}건, 서킷 거절 503: {self.unavailable}건")
+        budget = self.retry_budget
+        print(f"    재시도: {self.retries}건, 헤징: {self.hedges}건 (먼저 응답 {self.hedge_wins}건), "
+              f"예산 부족: {budget.denied}건, 남은 토큰 {budget.tokens:.1f}")
+        if self.limit is not None:
+            print(f"    부하 차단: 전역 한도 {self.limit.limit} (처리 중 {self.inflight}), "
+                  f"503 거절 {self.shed}건")
+        if self.cache is not None:
+            c = self.cache
+            print(f"    캐시: 적중률 {c.hit_rate()*100:.0f}% (hit={c.hits} stale={c.stale_hits} "
+                  f"합류={c.coalesced} miss={c.misses}), 재검증 {c.revalidations}건 "
+                  f"(304 {c.not_modified}건), {len(c)}개 {c.bytes/1e6:.1f}/{c.max_bytes/1e6:.0f}MB, "
+                  f"축출 {c.evictions}건")
         for b in self.backends:
             print(f"    {b}")
+            print(f"      latency: {format_percentiles(b.latency)}"
+                  + (f", limit={b.limit.limit}" if b.limit is not None else ""))
+            p = self.pool_stats(b)
+            print(f"      pool: hit={p['hits']} miss={p['misses']} "
+                  f"({p['hit_rate']*100:.0f}%) idle={p['idle']} "
+                  f"in_use={p['in_use']} evicted={p['evicted']}")
+
+    def metrics_text(self) -> str:
+        """Prometheus 텍스트 형식 지표 (/metrics)"""
+        algo = f'algorithm="{self.algo_name}"'
+        out = []
+
+        def metric(name, kind, help_text):
+            out.append(f"# HELP {name} {help_text}")
+            out.append(f"# TYPE {name} {kind}")
+
+        def histogram(name, labels, hist):
+            snap = hist.snapshot()
+            for le, n in hist.buckets(snap):
+                out.append(f'{name}_bucket{{{labels},le="{le:.6g}"}} {n}')
+            out.append(f'{name}_bucket{{{labels},le="+Inf"}} {snap[1]}')
+            out.append(f"{name}_sum{{{labels}}} {snap[2]:.6f}")
+            out.append(f"{name}_count{{{labels}}} {snap[1]}")
+
+        def quantiles(name, labels, hist):
+            snap = hist.snapshot()
+            for q in (0.5, 0.95, 0.99):
+                out.append(f'{name}{{{labels},quantile="{q}"}} {hist.quantile(q, snap):.6f}')
+
+        labeled = [(f'{algo},backend="{b.addr}"', b) for b in self.backends]
+
+        metric("lb_request_duration_seconds", "histogram",
+               "요청 전체 소요 시간 (백엔드 선택 ~ 응답 중계 끝)")
+        histogram("lb_request_duration_seconds", algo, self.latency)
+        metric("lb_request_duration_quantile_seconds", "gauge", "요청 소요 시간 분위수")
+        quantiles("lb_request_duration_quantile_seconds", algo, self.latency)
+        for name, help_text, value in [
+            ("lb_no_backend_total", "건강한 백엔드가 없어 503으로 거절한 요청", self.no_backend),
+            ("lb_unavailable_total", "건강한 백엔드의 서킷 브레이커가 모두 거절해 503으로 거절한 요청",
+             self.unavailable),
+            ("lb_shed_total", "동시성 한도 초과로 503 + Retry-After 거절한 요청", self.shed),
+            ("lb_retries_total", "연결 실패 후 다른 백엔드로 재시도", self.retries),
+            ("lb_hedges_total", "p95 초과로 보낸 헤징 요청", self.hedges),
+            ("lb_hedge_wins_total", "헤징 요청이 먼저 응답한 횟수", self.hedge_wins),
+            ("lb_retry_budget_denied_total", "예산이 없어 보내지 않은 재시도/헤징",
+             self.retry_budget.denied),
+        ]:
+            metric(name, "counter", help_text)
+            out.append(f"{name}{{{algo}}} {value}")
+
+        if self.limit is not None:
+            for name, help_text, value in [
+                ("lb_concurrency_limit", "전역 적응형 동시성 한도", self.limit.limit),
+                ("lb_inflight", "전역 한도 안에서 처리 중인 요청", self.inflight),
+            ]:
+                metric(name, "gauge", help_text)
+                out.append(f"{name}{{{algo}}} {value}")
+
+        if self.cache is not None:
+            c = self.cache
+            metric("lb_cache_requests_total", "counter",
+                   "캐시 대상 요청 (coalesced = miss 중 다른 요청의 응답을 재사용)")
+            for result, value in [("hit", c.hits), ("stale", c.stale_hits),
+                                  ("miss", c.misses), ("coalesced", c.coalesced)]:
+                out.append(f'lb_cache_requests_total{{{algo},result="{result}"}} {value}')
+            for name, kind, help_text, value in [
+                ("lb_cache_revalidations_total", "counter", "stale 항목 백그라운드 재검증", c.revalidations),
+                ("lb_cache_not_modified_total", "counter", "재검증 결과 304", c.not_modified),
+                ("lb_cache_evictions_total", "counter", "용량 초과로 버린 항목", c.evictions),
+                ("lb_cache_entries", "gauge", "저장된 항목 수", len(c)),
+                ("lb_cache_bytes", "gauge", "저장된 본문+헤더 바이트", c.bytes),
+            ]:
+                metric(name, kind, help_text)
+                out.append(f"{name}{{{algo}}} {value}")
+
+        for name, kind, help_text, value in [
+            ("lb_backend_requests_total", "counter", "백엔드로 보낸 요청", lambda b: b.total_requests),
+            ("lb_backend_errors_total", "counter", "연결 실패/5xx/중계 실패", lambda b: b.total_errors),
+            ("lb_backend_active_connections", "gauge", "처리 중인 요청", lambda b: b.active_connections),
+            ("lb_backend_healthy", "gauge", "1 = 헬스체크 통과", lambda b: int(b.healthy)),
+            ("lb_backend_available", "gauge", "1 = 새 요청을 받는 중 (건강 + drain 아님 + 서킷 OPEN 아님)",
+             lambda b: int(b.available)),
+            ("lb_backend_weight", "gauge", "가중치", lambda b: b.weight),
+            ("lb_backend_concurrency_limit", "gauge", "적응형 동시성 한도 (0 = 제한 없음)",
+             lambda b: b.limit.limit if b.limit is not None else 0),
+            ("lb_backend_circuit_state", "gauge", "서킷 브레이커 0 = CLOSED, 1 = HALF_OPEN, 2 = OPEN",
+             lambda b: CIRCUIT_GAUGE[b.breaker.state] if b.breaker is not None else 0),
+        ]:
+            metric(name, kind, help_text)
+            for labels, b in labeled:
+                out.append(f"{name}{{{labels}}} {value(b)}")
+
+        metric("lb_backend_latency_seconds", "histogram", "백엔드 응답 시간 (요청 전송 ~ 응답 헤더)")
+        for labels, b in labeled:
+            histogram("lb_backend_latency_seconds", labels, b.latency)
+        metric("lb_backend_latency_quantile_seconds", "gauge", "백엔드 응답 시간 분위수")
+        for labels, b in labeled:
+            quantiles("lb_backend_latency_quantile_seconds", labels, b.latency)
+        return "\n".join(out) + "\n"
+
+
+# ── asyncio 데이터 플레인 ─────────────────────────────────
+#
+# 스레드 모드는 동시 연결 하나마다 스레드 하나가 필요하다.
+# → 느린 Server-C 응답(0.1~0.5초)을 기다리는 연결이 쌓이면 스레드도 그만큼 쌓임
+# 이벤트 루프는 소켓 I/O를 기다리는 동안 다른 연결을 처리하므로
+# 스레드 없이 연결 수천 개를 동시에 다룰 수 있다.
+
+async def read_head(reader: asyncio.StreamReader) -> tuple[str, list[tuple[str, str]]] | None:
+    """빈 줄까지 읽어 (시작줄, [(헤더, 값), ...]) 반환. 헤더 전에 연결이 닫히면 None"""
+    try:
+        raw = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError as e:
+        if not e.partial:
+            return None
+        raise
+    lines = raw.decode("latin-1").split("\r\n")
+    headers = []
+    for line in lines[1:]:
+        if line:
+            name, _, value = line.partition(":")
+            headers.append((name.strip(), value.strip()))
+    return lines[0], headers
+
+
+def header_value(headers: list[tuple[str, str]], name: str) -> str | None:
+    name = name.lower()
+    for k, v in headers:
+        if k.lower() == name:
+            return v
+    return None
+
+
+def wants_keep_alive(version: str, headers: list[tuple[str, str]]) -> bool:
+    """HTTP/1.1은 기본 keep-alive, HTTP/1.0은 명시적으로 요청해야 유지"""
+    conn = (header_value(headers, "Connection") or "").lower()
+    if version == "HTTP/1.1":
+        return "close" not in conn
+    return "keep-alive" in conn
+
+
+async def relay_exact(src: asyncio.StreamReader, dst: asyncio.StreamWriter,
+                      length: int, timeout: float, capture: list | None = None):
+    """정확히 length 바이트를 RELAY_BUFFER 단위로 중계 (drain = 역압 대기)
+
+    capture 리스트를 주면 중계한 조각을 거기에도 담는다 (응답 캐시).
+    """
+    while length:
+        data = await asyncio.wait_for(src.read(min(RELAY_BUFFER, length)), timeout)
+        if not data:
+            raise ConnectionError("connection closed mid-body")
+        length -= len(data)
+        dst.write(data)
+        if capture is not None:
+            capture.append(data)
+        await dst.drain()
+
+
+async def relay_chunked(src: asyncio.StreamReader, dst: asyncio.StreamWriter,
+                        timeout: float, decode: bool = False):
+    """chunked 본문 중계. decode=False면 인코딩 그대로, True면 데이터만 (HTTP/1.0 클라이언트용)"""
+    while True:
+        line = await asyncio.wait_for(src.readuntil(b"\r\n"), timeout)
+        size = int(line.split(b";", 1)[0], 16)
+        if not decode:
+            dst.write(line)
+        if size == 0:
+            break
+        await relay_exact(src, dst, size, timeout)
+        crlf = await asyncio.wait_for(src.readexactly(2), timeout)
+        if not decode:
+            dst.write(crlf)
+    while True:   # trailer 헤더 + 빈 줄
+        line = await asyncio.wait_for(src.readuntil(b"\r\n"), timeout)
+        if not decode:
+            dst.write(line)
+        if line == b"\r\n":
+            break
+    await dst.drain()
+
+
+async def relay_until_eof(src: asyncio.StreamReader, dst: asyncio.StreamWriter, timeout: float):
+    while True:
+        data = await asyncio.wait_for(src.read(RELAY_BUFFER), timeout)
+        if not data:
+            return
+        dst.write(data)
+        await dst.drain()
+
+
+def discard_upstream(backend: Backend, task: asyncio.Future):
+    """헤징에서 진 요청 정리 (asyncio): 응답 본문을 읽지 않은 연결은 닫는다"""
+    if not task.cancelled() and task.exception() is None:
+        conn, _ = task.result()
+        backend.apool.release(conn, False)
+        backend.end_request()
+        backend.release_trial()
+
+
+class AsyncLBServer:
+    """asyncio 이벤트 루프 기반 프록시 (요청당 스레드 없음)
+
+    백엔드 선택(pick)과 Backend 카운터는 LBHandler와 동일하게 LoadBalancer를 사용한다.
+    요청/응답 본문은 RELAY_BUFFER 단위로 스트리밍한다.
+    """
+
+    def __init__(self, lb: 'LoadBalancer', host: str = "localhost", port: int | None = None,
+                 backend_timeout: float = 5.0, idle_timeout: float = 30.0,
+                 backlog: int = 4096, sock: socket.socket | None = None):
+        self.lb = lb
+        self.host = host
+        self.port = lb.port if port is None else port
+        self.sock = sock                         # 이미 listen 중인 소켓 (--workers)
+        self.backend_timeout = backend_timeout   # 백엔드 응답 대기 한도 (LBHandler와 동일 5초)
+        self.idle_timeout = idle_timeout         # 클라이언트 keep-alive 유휴 한도
+        self.backlog = backlog                   # listen 큐 (HTTPServer 기본값은 5)
+        self._server: asyncio.AbstractServer | None = None
+
+    async def start(self):
+        if self.sock is not None:
+            self._server = await asyncio.start_server(self._handle_client, sock=self.sock)
+        else:
+            self._server = await asyncio.start_server(
+                self._handle_client, self.host, self.port, backlog=self.backlog)
+        # port=0 으로 띄운 경우 실제 할당된 포트 기록
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    def close(self):
+        if self._server is not None:
+            self._server.close()
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                head = await asyncio.wait_for(read_head(reader), self.idle_timeout)
+                if head is None:
+                    break
+                start_line, headers = head
+                parts = start_line.split(" ", 2)
+                if len(parts) != 3:
+                    await self._send_json(writer, 400, {"error": "Bad Request"}, False)
+                    break
+                method, target, version = parts
+                keep_alive = wants_keep_alive(version, headers)
+                if method == "GET" and target == self.lb.metrics_path:
+                    await self._send_body(writer, 200, self.lb.metrics_text().encode(),
+                                          METRICS_CONTENT_TYPE, keep_alive)
+                    if not keep_alive:
+                        break
+                    continue
+                if self.lb.is_admin_path(target):
+                    length = int(header_value(headers, "Content-Length") or 0)
+                    body = await asyncio.wait_for(reader.readexactly(length), self.idle_timeout)
+                    peer = writer.get_extra_info("peername")
+                    status, result = self.lb.admin_request(method, target, body,
+                                                           peer[0] if peer else "")
+                    await self._send_json(writer, status, result, keep_alive)
+                    if not keep_alive:
+                        break
+                    continue
+                if not await self._proxy(reader, writer, method, target, version,
+                                         headers, keep_alive):
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError,
+                asyncio.LimitOverrunError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _proxy(self, reader, writer, method, target, version, headers,
+                     keep_alive) -> bool:
+        """요청 하나 처리. 클라이언트 연결을 계속 쓸 수 있으면 True"""
+        # 본문이 남아 있는 채로 에러 응답을 보내면 다음 요청 경계를 알 수 없다 → 연결 종료
+        has_body = (is_chunked(header_value(headers, "Transfer-Encoding"))
+                    or int(header_value(headers, "Content-Length") or 0) > 0)
+
+        start = time.monotonic()
+        peer = writer.get_extra_info("peername")
+        req = RequestInfo(method, target, peer[0] if peer else "", headers)
+        cache = self.lb.cache
+        if cache is None or not cache.eligible(req):
+            return await self._admitted(reader, writer, req, version, headers, keep_alive,
+                                        has_body, start, None)
+
+        entry, state = cache.lookup(target)
+        if entry is None:
+            leader, done = cache.join_flight(target, asyncio.get_running_loop().create_future)
+            if leader:
+                try:
+                    return await self._admitted(reader, writer, req, version, headers,
+                                                keep_alive, has_body, start, cache)
+                finally:
+                    cache.finish_flight(target).set_result(None)
+            # 같은 키를 받아 오는 요청이 이미 있음 → 끝나길 기다렸다가 그 응답을 재사용
+            try:
+                await asyncio.wait_for(asyncio.shield(done), cache.flight_wait)
+            except asyncio.TimeoutError:
+                pass
+            entry, state = cache.lookup(target, coalesced=True)
+            if entry is None:           # 저장할 수 없는 응답이었음 → 직접 보낸다
+                return await self._admitted(reader, writer, req, version, headers,
+                                            keep_alive, has_body, start, cache)
+
+        if state is STALE:
+            cache.revalidate(self.lb, target, entry)
+        status, reason, out_headers, body = cache.response(
+            entry, state, header_value(headers, "If-None-Match"))
+        out = [f"HTTP/1.1 {status} {reason}"] + [f"{k}: {v}" for k, v in out_headers]
+        out.append(f"Connection: {'keep-alive' if keep_alive else 'close'}")
+        writer.write(("\r\n".join(out) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+        self.lb.latency.record(time.monotonic() - start)
+        if self.lb.verbose:
+            print(f"  [{method} {target}] → cache {state} (async)")
+        return keep_alive
+
+    async def _admitted(self, reader, writer, req: RequestInfo, version, headers, keep_alive,
+                        has_body, start, cache: ResponseCache | None) -> bool:
+        """전역 동시성 한도 안에서만 백엔드로 보낸다. 넘치면 즉시 503 + Retry-After"""
+        if not self.lb.admit(req):
+            keep_alive = keep_alive and not has_body
+            await self._send_overloaded(writer, keep_alive)
+            return keep_alive
+        ok = False
+        try:
+            keep_alive, ok = await self._forward(reader, writer, req, version, headers,
+                                                 keep_alive, has_body, start, cache)
+            return keep_alive
+        finally:
+            self.lb.release(time.monotonic() - start, ok)
+
+    async def _forward(self, reader, writer, req: RequestInfo, version, headers, keep_alive,
+                       has_body, start, cache: ResponseCache | None) -> tuple[bool, bool]:
+        """백엔드로 중계 → (클라이언트 연결 유지, 5xx 없이 끝까지 전달).
+        cache가 있으면 저장 가능한 응답을 모아 둔다"""
+        method, target = req.method, req.path
+        backend = self.lb.pick(req)
+
+        if backend is None:
+            keep_alive = keep_alive and not has_body
+            if self.lb.shedding(req):       # 적응형 동시성 한도가 거절
+                self.lb.incr("shed")
+                await self._send_overloaded(writer, keep_alive)
+                return keep_alive, False
+            if self.lb.healthy.members:     # 건강한 백엔드는 있지만 서킷 브레이커가 모두 거절
+                self.lb.incr("unavailable")
+                await self._send_json(writer, 503, {"error": "No available backends"}, keep_alive)
+                return keep_alive, False
+            self.lb.incr("no_backend")
+            await self._send_json(writer, 503, {"error": "No healthy backends"}, keep_alive)
+            return keep_alive, False
+
+        def send(b: Backend):
+            return self._attempt(b, reader, method, target, headers, has_body)
+
+        try:
+            backend, conn, resp = await self._first_response(backend, req, send, has_body)
+        except Exception as e:
+            keep_alive = keep_alive and not has_body
+            await self._send_json(writer, 502, {"error": str(e) or type(e).__name__,
+                                                "backend": backend.addr}, keep_alive)
+            self.lb.latency.record(time.monotonic() - start)
+            return keep_alive, False
+
+        reusable = ok = False
+        try:
+            status_line, resp_headers = resp
+            resp_version, status, reason = (status_line.split(" ", 2) + [""])[:3]
+            status = int(status)
+            if status >= 500:
+                backend.record_error()
+            self.lb.report(backend, status < 500)
+
+            # 응답 본문 길이를 정하는 방식 (framing)
+            length = header_value(resp_headers, "Content-Length")
+            if method == "HEAD" or status in (204, 304) or status < 200:
+                framing = "none"
+            elif is_chunked(header_value(resp_headers, "Transfer-Encoding")):
+                framing = "chunked"
+            elif length is not None:
+                framing = "length"
+            else:
+                framing = "eof"         # 백엔드가 연결을 닫아야 끝을 알 수 있음
+            # HTTP/1.0 클라이언트에는 chunked를 풀어서 보내고 연결 종료로 끝을 알린다
+            decode = framing == "chunked" and version != "HTTP/1.1"
+            if framing == "eof" or decode:
+                keep_alive = False
+
+            out = [f"HTTP/1.1 {status} {reason}"]
+            for k, v in resp_headers:
+                if k.lower() not in HOP_BY_HOP:
+                    out.append(f"{k}: {v}")     # Content-Length는 그대로 유지
+            if framing == "chunked" and not decode:
+                out.append("Transfer-Encoding: chunked")
+            entry = None
+            if cache is not None:
+                out.append("X-Cache: MISS")
+                if framing == "length":
+                    entry = cache.admit(status, reason, resp_headers, backend.addr)
+            out.append(f"X-Served-By: {backend.addr}")
+            out.append(f"Connection: {'keep-alive' if keep_alive else 'close'}")
+            writer.write(("\r\n".join(out) + "\r\n\r\n").encode("latin-1"))
+
+            upstream = conn[0]
+            if framing == "chunked":
+                await relay_chunked(upstream, writer, self.backend_timeout, decode)
+            elif framing == "length":
+                parts = [] if entry is not None else None
+                await relay_exact(upstream, writer, int(length), self.backend_timeout, parts)
+                if entry is not None:
+                    cache.put(target, entry, b"".join(parts))
+            elif framing == "eof":
+                await relay_until_eof(upstream, writer, self.backend_timeout)
+            await writer.drain()
+
+            conn_hdr = (header_value(resp_headers, "Connection") or "").lower()
+            reusable = (framing != "eof" and resp_version == "HTTP/1.1"
+                        and "close" not in conn_hdr)
+            ok = status < 500
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            # 응답 헤더가 이미 나간 뒤라 502로 바꿀 수 없다 → 연결을 끊어 클라이언트에 알린다
+            backend.record_error()
+            return False, False
+        finally:
+            backend.apool.release(conn, reusable)
+            backend.end_request()
+            self.lb.latency.record(time.monotonic() - start)
+
+        if self.lb.verbose:
+            print(f"  [{method} {target}] → {backend.addr} ({self.lb.algo_name}, async)")
+        return keep_alive, ok
+
+    async def _attempt(self, backend: Backend, client, method, target, headers, has_body):
+        """백엔드 한 곳에 전송 → (conn, 응답 헤더). 성공하면 end_request는 호출한 쪽이 책임진다"""
+        backend.begin_request()
+        t0 = time.monotonic()
+        try:
+            conn, resp = await asyncio.wait_for(
+                self._send_upstream(backend, client, method, target, headers, has_body),
+                self.backend_timeout)
+        except asyncio.CancelledError:
+            backend.end_request()       # 헤징에서 져서 취소됨 — 에러 아님
+            backend.release_trial()
+            raise
+        except Exception:
+            backend.record_error()
+            self.lb.report(backend, False)
+            backend.end_request()
+            raise
+        backend.record_latency(time.monotonic() - t0)
+        return conn, resp
+
+    async def _first_response(self, backend: Backend, req: RequestInfo, send, has_body: bool):
+        """(백엔드, conn, 응답 헤더). LBHandler._first_response와 같은 재시도/헤징 규칙"""
+        lb = self.lb
+        lb.retry_budget.deposit()
+        replayable = req.method in IDEMPOTENT_METHODS and not has_body
+        hedge = lb.hedge and replayable and req.method in SAFE_METHODS
+        tried = [backend]
+        while True:
+            try:
+                if hedge:
+                    return await self._hedged(backend, req, tried, send)
+                return (backend, *await send(backend))
+            except Exception:
+                if not replayable or len(tried) > lb.max_retries:
+                    raise
+                other = lb.pick_other(req, tried)
+                if other is None:
+                    raise
+                if not lb.retry_budget.withdraw():
+                    other.release_trial()
+                    raise
+                lb.incr("retries")
+                tried.append(other)
+                backend = other
+
+    async def _hedged(self, backend: Backend, req: RequestInfo, tried: list[Backend], send):
+        """hedge_delay(p95)가 지나도 응답 헤더가 없으면 다른 백엔드에도 보내고 진 쪽은 취소"""
+        lb = self.lb
+        delay = lb.hedge_delay()
+        if delay is None:
+            return (backend, *await send(backend))
+
+        primary = asyncio.ensure_future(send(backend))
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done:
+            return (backend, *primary.result())
+        other = lb.pick_other(req, tried)
+        if other is not None and not lb.retry_budget.withdraw():
+            other.release_trial()
+            other = None
+        if other is None:
+            return (backend, *await primary)
+        lb.incr("hedges")
+        tried.append(other)
+        owners = {primary: backend, asyncio.ensure_future(send(other)): other}
+
+        winner, error, pending = None, None, set(owners)
+        try:
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for t in done:
+                    if t.exception() is not None:
+                        error = t.exception()
+                    elif winner is None:
+                        winner = t
+                    else:       # 둘이 동시에 도착 → 나중 것은 버림
+                        discard_upstream(owners[t], t)
+        finally:
+            for t in pending:
+                # 취소되면 _send_upstream이 연결을 닫고 _attempt가 카운터를 정리한다.
+                # 취소 직전에 응답이 와 버렸으면 wait_for가 결과를 돌려주므로 그때는 여기서 버림
+                t.cancel()
+                t.add_done_callback(functools.partial(discard_upstream, owners[t]))
+        if winner is None:
+            raise error
+        if winner is not primary:
+            lb.incr("hedge_wins")
+        return (owners[winner], *winner.result())
+
+    async def _send_upstream(self, backend: Backend, client: asyncio.StreamReader,
+                             method, target, headers, has_body):
+        """요청을 백엔드로 보내고 (conn, 응답 헤더) 반환. conn은 본문 중계 후 반납"""
+        conn, reused = await backend.apool.acquire(self.backend_timeout)
+        try:
+            try:
+                resp = await self._exchange(conn, backend, client, method, target, headers)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                # 풀에서 꺼낸 사이 백엔드가 연결을 닫음 → 새 연결로 한 번만 재시도
+                # (본문은 이미 소비됐으므로 본문 없는 요청만)
+                if not reused or has_body:
+                    raise
+                conn[1].close()
+                conn = await asyncio.open_connection(backend.host, backend.port)
+                resp = await self._exchange(conn, backend, client, method, target, headers)
+        except BaseException:
+            backend.apool.release(conn, False)
+            raise
+        return conn, resp
+
+    async def _exchange(self, conn, backend: Backend, client: asyncio.StreamReader,
+                        method, target, headers):
+        reader, writer = conn
+        lines = [f"{method} {target} HTTP/1.1", f"Host: {backend.addr}"]
+        for k, v in headers:
+            if k.lower() not in HOP_BY_HOP and k.lower() != "host":
+                lines.append(f"{k}: {v}")   # Content-Length는 그대로 유지
+        te = header_value(headers, "Transfer-Encoding")
+        if is_chunked(te):
+            lines.append("Transfer-Encoding: chunked")
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+
+        # 요청 본문 스트리밍 (chunked는 인코딩 그대로 전달)
+        length = int(header_value(headers, "Content-Length") or 0)
+        if is_chunked(te):
+            await relay_chunked(client, writer, self.backend_timeout)
+        elif length:
+            await relay_exact(client, writer, length, self.backend_timeout)
+        await writer.drain()
+
+        head = await read_head(reader)
+        if head is None:
+            raise ConnectionError("backend closed connection")
+        return head
+
+    async def _send_overloaded(self, writer, keep_alive: bool):
+        await self._send_json(writer, 503, {"error": "Overloaded"}, keep_alive,
+                              [("Retry-After", str(self.lb.RETRY_AFTER))])
+
+    async def _send_json(self, writer, status: int, payload: dict, keep_alive: bool,
+                         headers=()):
+        await self._send_body(writer, status, json.dumps(payload).encode(),
+                              "application/json", keep_alive, headers)
+
+    async def _send_body(self, writer, status: int, body: bytes, content_type: str,
+                         keep_alive: bool, headers=()):
+        reason = http.HTTPStatus(status).phrase
+        extra = "".join(f"{k}: {v}\r\n" for k, v in headers)
+        writer.write((f"HTTP/1.1 {status} {reason}\r\n"
+                      f"Content-Type: {content_type}\r\n"
+                      f"Content-Length: {len(body)}\r\n"
+                      f"{extra}"
+                      f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+                      f"\r\n").encode() + body)
+        await writer.drain()
+
+
+def raise_fd_limit():
+    """연결 수천 개 = 소켓 fd 수천 개. soft limit(보통 1024)을 hard limit까지 올린다"""
+    try:
+        import resource
+    except ImportError:   # Windows
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft == resource.RLIM_INFINITY:
+        return
+    target = 65536 if hard == resource.RLIM_INFINITY else hard
+    if soft < target:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+        except (ValueError, OSError):
+            pass
+
+
+# ── 멀티 프로세스 워커 (--workers) ────────────────────────
+#
+# CPython 프로세스 하나는 GIL 때문에 코어 하나만 쓴다.
+# 워커 N개를 fork해서 같은 포트로 연결을 받고, 백엔드 카운터/건강 상태는
+# SharedBackendStats로, 서킷 브레이커는 BreakerRegistry(shared=True)로 공유한다.
+# 능동 헬스체크는 부모 프로세스 하나만 돌린다.
+# (지연 히스토그램/EWMA와 커넥션 풀은 워커별로 따로)
+
+def serve_worker(lb: 'LoadBalancer', mode: str, sock: socket.socket | None, port: int):
+    """워커 프로세스 본체. sock이 None이면 SO_REUSEPORT로 직접 bind"""
+    if sock is None:
+        sock = listen_socket("localhost", port, reuse_port=True)
+    # 수동 헬스체크만 (프로브는 부모가) — 제외 판단은 공유 메모리로 다른 워커에게 전달
+    HealthChecker(lb.backends, lb=lb)
+    threading.Thread(target=lb.sync_forever, daemon=True).start()
+    try:
+        if mode == "thread":
+            LBHandler.lb = lb
+            LBServer.on_socket(sock, LBHandler).serve_forever()
+        else:
+            raise_fd_limit()
+            asyncio.run(AsyncLBServer(lb, sock=sock).serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+def start_workers(lb: 'LoadBalancer', n: int, mode: str, port: int) -> list:
+    """백엔드 상태를 공유 메모리로 옮기고 워커 n개를 fork"""
+    shared = lb.shared = SharedBackendStats(len(lb.backends))
+    for i, b in enumerate(lb.backends):
+        b.share(shared, i)
+    if lb.breaker:
+        # 한 워커가 연 서킷을 모든 워커가 바로 본다 (워커마다 failure_threshold번씩 겪지 않음)
+        lb.breakers = BreakerRegistry(shared=True, capacity=len(lb.backends))
+        for b in lb.backends:
+            lb._attach_breaker(b)
+
+    # SO_REUSEPORT가 없으면 부모가 만든 소켓 하나를 물려받아 함께 accept
+    reuse_port = hasattr(socket, "SO_REUSEPORT")
+    sock = None if reuse_port else listen_socket("localhost", port)
+
+    ctx = multiprocessing.get_context("fork")
+    workers = [ctx.Process(target=serve_worker, args=(lb, mode, sock, port), daemon=True)
+               for _ in range(n)]
+    for w in workers:
+        w.start()
+    threading.Thread(target=lb.sync_forever, daemon=True).start()
+    return workers
 
 
 # ── 더미 백엔드 서버들 ────────────────────────────────────
@@ -195,11 +2928,15 @@ def start_dummy_backend(port: int, name: str, slow: bool = False):
     """LB 뒤에서 응답하는 더미 서버"""
 
     class DummyHandler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"   # keep-alive (LB 커넥션 풀이 연결 재사용)
+        disable_nagle_algorithm = True  # keep-alive에서 헤더/본문 분할 전송 시 ~40ms 지연 방지
+
         def do_GET(self):
             if self.path == '/health':
                 body = b'{"status":"UP"}'
                 self.send_response(200)
                 self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
                 self.end_headers()
                 self.wfile.write(body)
                 return
@@ -207,6 +2944,25 @@ def start_dummy_backend(port: int, name: str, slow: bool = False):
             if slow:
                 time.sleep(random.uniform(0.1, 0.5))  # 느린 서버
 
+            if self.path.startswith('/cache/'):
+                # 캐시 실습용: 5초 신선 + 10초 stale-while-revalidate, 경로별 고정 ETag
+                body = json.dumps({"server": name, "path": self.path}).encode()
+                etag = f'"{stable_hash(self.path):x}"'
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.send_header("Cache-Control", "public, max-age=5, stale-while-revalidate=10")
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("ETag", etag)
+                self.send_header("Cache-Control", "public, max-age=5, stale-while-revalidate=10")
+                self.end_headers()
+                self.wfile.write(body)
+                return
+
             body = json.dumps({
                 "server": name,
                 "port": port,
@@ -216,13 +2972,46 @@ def start_dummy_backend(port: int, name: str, slow: bool = False):
 
             self.send_response(200)
             self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            # 본문은 버퍼 단위로 읽고 버림 (받은 바이트 수만 응답)
+            if is_chunked(self.headers.get("Transfer-Encoding")):
+                chunks = iter_chunked(self.rfile)
+            else:
+                chunks = iter_exact(self.rfile, int(self.headers.get("Content-Length") or 0))
+            received = sum(len(d) for d in chunks)
+            body = json.dumps({
+                "server": name,
+                "port": port,
+                "method": self.command,
+                "path": self.path,
+                "received": received,
+            }).encode()
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
             self.end_headers()
             self.wfile.write(body)
 
+        do_PUT = do_POST
+
         def log_message(self, f, *a):
             pass
 
-    s = http.server.HTTPServer(('localhost', port), DummyHandler)
+    # 백엔드도 요청별 스레드로 처리 (단일 스레드면 LB가 동시에 보낸 요청이 줄을 선다)
+    class DummyServer(http.server.ThreadingHTTPServer):
+        request_queue_size = 1024   # listen backlog (기본값 5면 동시 연결 시 SYN 유실)
+
+        def handle_error(self, request, client_address):
+            # LB가 헤징에서 진 요청을 취소하며 연결을 끊으면 응답 쓰기가 실패한다 — 정상 상황
+            if not isinstance(sys.exc_info()[1], ConnectionError):
+                super().handle_error(request, client_address)
+
+    s = DummyServer(('localhost', port), DummyHandler)
     t = threading.Thread(target=s.serve_forever, daemon=True)
     t.start()
     return s
@@ -231,6 +3020,27 @@ def start_dummy_backend(port: int, name: str, slow: bool = False):
 # ── 메인 ──────────────────────────────────────────────────
 
 def main():
+    parser = argparse.ArgumentParser(description="Lab 09 - 로드 밸런서")
+    parser.add_argument("--mode", choices=["thread", "async"], default="thread",
+                        help="데이터 플레인: thread=ThreadingHTTPServer, async=asyncio 이벤트 루프")
+    parser.add_argument("--hash-key", default="path",
+                        help="consistent_hash 키: path | client_ip | header:<이름>")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="워커 프로세스 수 (2 이상이면 pre-fork + 공유 메모리 카운터)")
+    parser.add_argument("--hedge", action="store_true",
+                        help="응답이 p95보다 늦으면 다른 백엔드에 한 번 더 보내고 빠른 쪽 사용")
+    parser.add_argument("--retries", type=int, default=1,
+                        help="연결 실패 시 다른 백엔드로 재시도할 횟수 (멱등 요청만, 예산 20%%)")
+    parser.add_argument("--cache", type=int, default=0, metavar="MB",
+                        help="응답 캐시 용량 (0 = 끔). Cache-Control이 허락한 GET만 저장")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="적응형 동시성 한도 (전역 + 백엔드별), 넘치면 즉시 503 + Retry-After")
+    parser.add_argument("--sheddable", action="append", default=[], metavar="PREFIX",
+                        help="먼저 거절할 경로 접두사 (여러 번 지정 가능, /health는 항상 통과)")
+    parser.add_argument("--breaker", action="store_true",
+                        help="백엔드별 서킷 브레이커 (5연속 실패 시 즉시 후보에서 제외)")
+    args = parser.parse_args()
+
     # 백엔드 서버 3개 실행
     backends_config = [
         (9010, "Server-A", False, 3),   # 빠름, 가중치 3
@@ -246,6 +3056,10 @@ def main():
         backends.append(b)
         print(f"  {name}: :{port} (weight={weight}{', 느림' if slow else ''})")
 
+    # 관리 API로 추가해 볼 예비 서버 (처음엔 LB에 등록하지 않음)
+    start_dummy_backend(9013, "Server-D")
+    print("  Server-D: :9013 (예비 — 관리 API로 추가)")
+
     time.sleep(0.3)
 
     # 알고리즘 선택
@@ -253,25 +3067,51 @@ def main():
     print("  1. Round Robin (기본)")
     print("  2. Weighted Round Robin")
     print("  3. Least Connections")
-    choice = input("선택 (1-3, 기본=1): ").strip() or "1"
-    algo = {"1": "round_robin", "2": "weighted", "3": "least_conn"}.get(choice, "round_robin")
+    print("  4. Weighted Random (alias table)")
+    print("  5. Power of Two Choices")
+    print("  6. Peak EWMA (지연 인지 P2C)")
+    print("  7. Least Outstanding × Latency")
+    print(f"  8. Consistent Hash (키: {args.hash_key})")
+    choice = input("선택 (1-8, 기본=1): ").strip() or "1"
+    algo = {"1": "round_robin", "2": "weighted", "3": "least_conn",
+            "4": "weighted_random", "5": "p2c", "6": "peak_ewma",
+            "7": "least_latency", "8": "consistent_hash"}.get(choice, "round_robin")
 
     # 로드 밸런서 시작
-    lb = LoadBalancer(port=8888, backends=backends, algo=algo)
+    lb = LoadBalancer(port=8888, backends=backends, algo=algo, hash_key=args.hash_key,
+                      hedge=args.hedge, max_retries=args.retries,
+                      cache=ResponseCache(args.cache * 1024 * 1024) if args.cache else None,
+                      adaptive=args.adaptive, sheddable_paths=tuple(args.sheddable),
+                      admin_path="/admin", breaker=args.breaker)
+
+    workers = []
+    if args.workers > 1:
+        # 헬스체크 스레드보다 먼저 fork (다른 스레드가 쥔 락은 자식에서 영영 풀리지 않는다)
+        workers = start_workers(lb, args.workers, args.mode, 8888)
+    elif args.mode == "thread":
+        # HTTP 핸들러에 LB 연결
+        LBHandler.lb = lb
+        server = LBServer(('localhost', 8888), LBHandler)
+    else:
+        raise_fd_limit()
+        proxy = AsyncLBServer(lb, port=8888)
 
     # 헬스체크 시작
-    hc = HealthChecker(backends, interval=5)
+    hc = HealthChecker(backends, interval=5, lb=lb)
     hc.start()
 
-    # HTTP 핸들러에 LB 연결
-    LBHandler.lb = lb
-    server = http.server.HTTPServer(('localhost', 8888), LBHandler)
-
     print(f"""
 ╔══════════════════════════════════════════════╗
 ║       로드 밸런서 실행 중 (:{8888})           ║
 ╠══════════════════════════════════════════════╣
 ║  알고리즘: {algo:<35}║
+║  데이터 플레인: {args.mode:<30}║
+║  워커 프로세스: {args.workers:<30}║
+║  헤징: {'p95 초과 시' if args.hedge else '끔':<38}║
+║  재시도: 연결 실패 시 최대 {args.retries}회 (예산 20%)          ║
+║  캐시: {f'{args.cache}MB' if args.cache else '끔':<38}║
+║  부하 차단: {'적응형 동시성 한도' if args.adaptive else '끔':<33}║
+║  서킷 브레이커: {'백엔드별' if args.breaker else '끔':<30}║
 ║                                              ║
 ║  테스트 (다른 터미널):                        ║
 ║    curl -s http://localhost:8888/ | python3 -m json.tool
@@ -281,7 +3121,18 @@ def main():
 ║      curl -s http://localhost:8888/ | \\     ║
 ║      python3 -m json.tool; done             ║
 ║                                              ║
-║  헬스체크: 5초마다 자동 실행                  ║
+║  지표: curl -s http://localhost:8888/metrics  ║
+║  캐시: curl -si http://localhost:8888/cache/a ║
+║                                              ║
+║  관리 API (백엔드 추가/drain/삭제):           ║
+║    curl -s localhost:8888/admin/backends     ║
+║    curl -s -X POST localhost:8888/admin/backends \\
+║      -d '{{"addr": "localhost:9013"}}'          ║
+║    curl -s -X DELETE \\                       ║
+║      localhost:8888/admin/backends/localhost:9012
+║                                              ║
+║  헬스체크: 5초(±20%)마다 동시 프로브          ║
+║           + 실제 요청의 5xx/연결 실패 감지     ║
 ║  종료: Ctrl+C                                ║
 ╚══════════════════════════════════════════════╝
 """)
@@ -296,7 +3147,13 @@ def main():
     t.start()
 
     try:
-        server.serve_forever()
+        if workers:
+            for w in workers:
+                w.join()
+        elif args.mode == "thread":
+            server.serve_forever()
+        else:
+            asyncio.run(proxy.serve_forever())
     except KeyboardInterrupt:
         print("\n\n종료. 최종 통계:")
         for b in backends: